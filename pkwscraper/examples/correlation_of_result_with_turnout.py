@@ -1,4 +1,6 @@
 
+from functools import partial
+
 import numpy as np
 
 from pkwscraper.lib.controller import Controller
@@ -119,7 +121,8 @@ def main():
     # get whole-country lists
     lists = get_whole_country_lists()
 
-    # iterate over committees
+    # prepare function and image name for each committee
+    tasks = []
     for list_id, list_record in lists.items():
         # determine name of image
         shortname = list_record["committee_shortname"]
@@ -127,15 +130,16 @@ def main():
         image_name = f"correlation_turnout_to_result_of_{shortname}.png"
 
         # prepare concrete function
-        function_i = lambda db: function(db, list_id)
+        function_i = partial(function, list_id=list_id)
 
-        # prepare
-        ctrl_i = Controller(
-            ("Sejm", 2015), function_i, colormap, granularity="powiaty",
-            outlines_granularity="constituencies", normalization=False,
-            output_filename=image_name
-        )
-        ctrl_i.run()
+        tasks.append((function_i, colormap, image_name))
+
+    # evaluate all committees in one pass over units
+    ctrl = Controller(
+        ("Sejm", 2015), None, colormap, granularity="powiaty",
+        outlines_granularity="constituencies", normalization=False
+    )
+    ctrl.run_many(tasks)
 
 
 if __name__ == "__main__":
@@ -47,14 +47,10 @@ def function(db):
 
     # iterate over constituencies
     for table_name in table_names:
-        voting_results = db[table_name].find({})
-        for result_i in voting_results.values():
-            for cand_id in result_i:
-                if cand_id in ["_id", "obwod", "candidates_count"]:
-                    continue
-                list_no = candidate_to_list[cand_id]
-                votes = int(result_i[cand_id])
-                results[list_no] += votes
+        votes_sums = db[table_name].aggregate(sums=list(candidate_to_list))
+        for cand_id, votes in votes_sums.items():
+            list_no = candidate_to_list[cand_id]
+            results[list_no] += votes
 
     # get winner
     winner_no = max(results, key=results.get)
@@ -26,18 +26,9 @@ def function(db):
     female_votes = 0
     male_votes = 0
     for table_name in table_names:
-        results = db[table_name].find({})
-        for result in results.values():
-            for cand_id in female_ids:
-                try:
-                    female_votes += int(result[cand_id])
-                except KeyError:
-                    pass
-            for cand_id in male_ids:
-                try:
-                    male_votes += int(result[cand_id])
-                except KeyError:
-                    pass
+        votes_sums = db[table_name].aggregate(sums=female_ids + male_ids)
+        female_votes += sum(votes_sums[cand_id] for cand_id in female_ids)
+        male_votes += sum(votes_sums[cand_id] for cand_id in male_ids)
 
     # return females result
     return female_votes / (female_votes + male_votes)
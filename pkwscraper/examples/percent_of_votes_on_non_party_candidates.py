@@ -39,18 +39,12 @@ def function(db):
     political_party_votes = 0
 
     for table_name in table_names:
-        results = db[table_name].find({})
-        for result in results.values():
-            for cand_id in non_party_candidates_ids:
-                try:
-                    non_party_votes += int(result[cand_id])
-                except KeyError:
-                    pass
-            for cand_id in political_party_candidates:
-                try:
-                    political_party_votes += int(result[cand_id])
-                except KeyError:
-                    pass
+        votes_sums = db[table_name].aggregate(
+            sums=non_party_candidates_ids + political_party_candidates)
+        non_party_votes += sum(votes_sums[cand_id]
+                               for cand_id in non_party_candidates_ids)
+        political_party_votes += sum(
+            votes_sums[cand_id] for cand_id in political_party_candidates)
 
     # return non-party result
     return non_party_votes / (non_party_votes + political_party_votes)
@@ -49,27 +49,13 @@ def function(db, list_id):
         else:
             further_candidates.append(_id)
 
-    # determine results table names
-    constituency_nos = db["okręgi"].find({}, fields="number")
-    table_names = [f"wyniki_{const_no}" for const_no in constituency_nos]
-
-    # get votes sum for categories
-    top3_votes = 0
-    further_votes = 0
-
-    for table_name in table_names:
-        results = db[table_name].find({})
-        for result in results.values():
-            for cand_id in top3_candidates_ids:
-                try:
-                    top3_votes += int(result[cand_id])
-                except KeyError:
-                    pass
-            for cand_id in further_candidates:
-                try:
-                    further_votes += int(result[cand_id])
-                except KeyError:
-                    pass
+    # get votes sum for categories, from votes of unit precomputed
+    # by controller
+    candidates_votes = db.votes.candidates()
+    top3_votes = sum(candidates_votes[cand_id]
+                     for cand_id in top3_candidates_ids)
+    further_votes = sum(candidates_votes[cand_id]
+                        for cand_id in further_candidates)
 
     # return non-party result
     return top3_votes / (top3_votes + further_votes)
@@ -65,14 +65,10 @@ def main():
 
     # iterate over constituencies
     for table_name in table_names:
-        voting_results = db[table_name].find({})
-        for result_i in voting_results.values():
-            for cand_id in result_i:
-                if cand_id in ["_id", "obwod", "candidates_count"]:
-                    continue
-                party = candidate_to_party[cand_id]
-                votes = int(result_i[cand_id])
-                party_results[party]["votes"] += votes
+        votes_sums = db[table_name].aggregate(sums=list(candidate_to_party))
+        for cand_id, votes in votes_sums.items():
+            party = candidate_to_party[cand_id]
+            party_results[party]["votes"] += votes
 
     # sort results
     sorted_parties = sorted(
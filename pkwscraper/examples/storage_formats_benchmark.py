@@ -0,0 +1,84 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from pkwscraper.examples.elections_winners import function
+from pkwscraper.lib.dbdriver import DbDriver
+
+"""
+This example measures time of reading DB saved in each of storage
+formats - `csv`, `npt` and `sqlite`. The DB is copied to temporary
+directory and converted to each format, then it is opened for reading
+and queried like in analysis of territorial units:
+- load: opening DB and loading all tables used by queries
+- queries: finding polling districts of each commune and summing their
+  votes from results table of constituency
+- winners: the whole country function of `elections_winners` example
+
+DB directory can be given as command line argument, the preprocessed
+data of Sejm 2015 elections is used by default.
+"""
+
+SEJM_2015_DATA_DIRECTORY = "./pkwscraper/data/sejm/2015/preprocessed/"
+STORAGE_FORMATS = ["csv", "npt", "sqlite"]
+LAYOUTS = ["rows", "columns"]
+
+
+def load(db):
+    for name in ["gminy", "obwody", "okręgi", "kandydaci", "listy"]:
+        db[name]
+
+
+def queries(db):
+    constituencies = {_id: number for _id, number in db["okręgi"].find(
+        {}, fields=["_id", "number"])}
+    results = {}
+    for gmina_id in db["gminy"].find({}, fields="_id"):
+        districts = db["obwody"].find(
+            {"gmina": gmina_id}, fields=["_id", "constituency"])
+        if not districts:
+            continue
+        number = constituencies[districts[0][1]]
+        results[gmina_id] = db[f"wyniki_{number}"].aggregate(
+            sums=["candidates_count"], count=True,
+            query={"obwod": {"$in": [_id for _id, _ in districts]}})
+    return results
+
+
+def measure(db_directory, layout):
+    timings = {}
+    db = DbDriver(db_directory, read_only=True, layout=layout)
+    start = time.perf_counter()
+    load(db)
+    timings["load"] = time.perf_counter() - start
+    start = time.perf_counter()
+    queries(db)
+    timings["queries"] = time.perf_counter() - start
+    start = time.perf_counter()
+    function(db)
+    timings["winners"] = time.perf_counter() - start
+    return timings
+
+
+def main(db_directory=SEJM_2015_DATA_DIRECTORY):
+    temp_directory = tempfile.mkdtemp()
+    try:
+        directory = os.path.join(temp_directory, "db")
+        shutil.copytree(db_directory, directory)
+        print("format  layout   load [s]  queries [s]  winners [s]")
+        for storage_format in STORAGE_FORMATS:
+            DbDriver(directory).convert_tables(storage_format)
+            # SQLite tables are read from file for both layouts
+            layouts = ["rows"] if storage_format == "sqlite" else LAYOUTS
+            for layout in layouts:
+                timings = measure(directory, layout)
+                print(f"{storage_format:8}{layout:9}{timings['load']:8.2f}"
+                      f"{timings['queries']:13.2f}{timings['winners']:13.2f}")
+    finally:
+        shutil.rmtree(temp_directory)
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
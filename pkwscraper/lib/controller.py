@@ -1,11 +1,19 @@
 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import functools
 import json
+import multiprocessing
 import os
+import threading
 
-from pkwscraper.lib.dbdriver import DbDriver
+import numpy as np
+
+from pkwscraper.lib.dbdriver import DbDriver, DbView, EXECUTORS
 from pkwscraper.lib.elections import Elections
 from pkwscraper.lib.region import Region
+from pkwscraper.lib.results_cache import DEFAULT_CACHE_SIZE, ResultsCache
 from pkwscraper.lib.visualizer import Visualizer
+from pkwscraper.lib.vote_cube import VOTE_CUBE_FILENAME, VoteCube
 
 """
 Concepts explained:
@@ -32,6 +40,26 @@ GRANULARITY_DICT = {
     "communes": "gminy",
 }
 
+# functions and DBs of units evaluated by worker process, set when
+# the worker starts
+_worker_units = None
+
+
+def _set_worker_units(functions, dbs):
+    global _worker_units
+    _worker_units = (functions, dbs)
+
+
+def _evaluate_unit(functions, db):
+    """ Return list of values of all functions for DB of one unit. """
+    return [function(db) for function in functions]
+
+
+def _evaluate_units(indexes):
+    """ Evaluate functions for units with given indexes in worker process. """
+    functions, dbs = _worker_units
+    return [_evaluate_unit(functions, dbs[i]) for i in indexes]
+
 
 class Controller:
     """
@@ -44,7 +72,8 @@ class Controller:
                  unit=None, outlines_granularity=None,
                  normalization=True, title=None, show_legend=False,
                  show_grid=False, output_filename=None,
-                 interpolation='linear'):
+                 interpolation='linear', workers=1, executor="process",
+                 cache=False, cache_size=DEFAULT_CACHE_SIZE):
         """
         Constructor does basic checks and creates class attributes.
 
@@ -75,7 +104,20 @@ class Controller:
             image file saved to given filenam in default visualizing
             directory,
         interpolation: str - method of interpolation of colors in the
-            colormap.
+            colormap,
+        workers: int/None - number of parallel workers evaluating
+            function for units, by default units are evaluated one by
+            one, if None - the number of processors,
+        executor: str - "process" or "thread", kind of workers; worker
+            processes are forked, so they share loaded DB with main
+            process instead of receiving its copy, and function has
+            to return values that can be pickled; where forking is not
+            available (e.g. on Windows) threads are used instead,
+        cache: bool - whether or not to save values of function for
+            units on harddrive and use them when the same function is
+            evaluated again for the same units and version of DB,
+        cache_size: int/None - maximum size of saved values in bytes,
+            least recently used values are removed first.
         """
         # unpack unit
         if unit is None:
@@ -110,7 +152,15 @@ class Controller:
                 '"constituencies", "districts" or "communes"')
 
         if not isinstance(elections, tuple) or len(elections) != 2:
-            raise TypeError("Please, provide elections identifier: (type, year).")
+            raise TypeError(
+                "Please, provide elections identifier: (type, year).")
+
+        if executor not in EXECUTORS:
+            raise ValueError(
+                '`executor` should be one of: "process" or "thread"')
+
+        if workers is None:
+            workers = os.cpu_count() or 1
 
         # assing arguments
         elections_type, year = elections
@@ -127,8 +177,16 @@ class Controller:
         self.show_grid = show_grid
         self.output_filename = output_filename
         self.interpolation = interpolation
+        self.workers = workers
+        self.executor = executor
+        self.cache = ResultsCache(self.elections.cached_dir, cache_size) \
+            if cache else None
         self.vis = None
         self.source_db = None
+        # relations of units and their votes, loaded when needed
+        self._db_refs = None
+        self._vote_cube = None
+        self._vote_cube_lock = threading.Lock()
 
     def _scrape(self):
         _ScraperClass = self.elections.get_scraper_class()
@@ -153,8 +211,9 @@ class Controller:
                 self._scrape()
             # rescribed db present, run preprocessing
             self._preprocess()
-        # preprocessed db present, load it
-        self.source_db = DbDriver(self.elections.preprocessed_dir, read_only=True)
+        # preprocessed db present, load it (memory-mapped if possible)
+        self.source_db = DbDriver(self.elections.preprocessed_dir,
+                                  read_only=True, layout="columns")
 
     def _split_db(self):
         """
@@ -165,6 +224,8 @@ class Controller:
         """
         # prepare indexes
         db_refs = DbReferences(self.source_db, self.granularity)
+        self._db_refs = db_refs
+        self._vote_cube = None
 
         # prepare units list
         if self.unit_granularity is None:
@@ -205,48 +266,151 @@ class Controller:
             }
             tables_and_ids.update(wyniki_ids)
 
-            # create db driver instance
-            db = DbDriver.__new__(DbDriver)
-            db._DbDriver__read_only = False
-            db._DbDriver__tables = {}
-            db._DbDriver__dropped_tables = []
+            # make read only view of records, without copying them
+            votes = functools.partial(self._unit_votes, unit_id)
+            yield DbView(self.source_db, tables_and_ids, votes=votes)
 
-            # copy records
-            for table_name, ids_list in tables_and_ids.items():
-                db.create_table(table_name)
-                for _id in ids_list:
-                    record = self.source_db[table_name][_id]
-                    db[table_name].put(dict(record), _id=_id)
+    def _unit_votes(self, unit_id):
+        """ Return votes of unit of granularity level with given ID. """
+        return self._get_vote_cube().unit_votes(self.granularity, unit_id)
 
-            # freeze db and conclude iteration
-            db._DbDriver__read_only = True
-            yield db
+    def _get_vote_cube(self):
+        """
+        Return votes of all units. They are loaded when they are needed
+        for the first time, so they are not read if user function does
+        not use them.
+        """
+        with self._vote_cube_lock:
+            if self._vote_cube is None:
+                self._vote_cube = self._load_vote_cube(self._db_refs)
+        return self._vote_cube
 
-    def _visualize(self):
-        # split db into units
-        dbs = self._split_db()
+    def _load_vote_cube(self, db_refs):
+        """
+        Load votes of territorial units, saved at the end of
+        preprocessing. They are computed and saved again if there are
+        no saved votes or DB changed after computing them.
+        """
+        filepath = os.path.join(self.elections.cached_dir, VOTE_CUBE_FILENAME)
+        db_version = self.source_db.version()
+        if os.path.exists(filepath):
+            vote_cube = VoteCube.load(filepath)
+            if vote_cube.db_version == db_version:
+                return vote_cube
+
+        print("Computing votes of territorial units...")
+        vote_cube = VoteCube.from_db(self.source_db, db_refs, db_version)
+        if not os.path.exists(self.elections.cached_dir):
+            os.makedirs(self.elections.cached_dir)
+        vote_cube.save(filepath)
+        print("Votes of territorial units saved.")
+        print()
+        return vote_cube
 
-        # process data
+    def _evaluate(self, dbs, functions):
+        """
+        Evaluate functions for DBs of all units, in parallel if more
+        workers are set. Returns list of values of all functions for
+        each unit, in order of units. Worker processes are used only
+        if they can be forked - other processes would get pickled copy
+        of whole DB, which is slow and fails for functions that cannot
+        be pickled, like lambdas - threads are used otherwise.
+        """
+        if self.workers == 1 or len(dbs) < 2:
+            return [_evaluate_unit(functions, db) for db in dbs]
+
+        can_fork = "fork" in multiprocessing.get_all_start_methods()
+        if self.executor == "thread" or not can_fork:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                return list(pool.map(
+                    lambda db: _evaluate_unit(functions, db), dbs))
+
+        # votes of units are loaded before forking, so workers get them
+        # instead of loading or computing them each
+        if self._db_refs is not None:
+            self._get_vote_cube()
+
+        # give units to worker processes when they start, so with
+        # forking they are not pickled, and send only their indexes
+        chunk_size = -(-len(dbs) // (4 * self.workers))
+        chunks = [range(start, min(start + chunk_size, len(dbs)))
+                  for start in range(0, len(dbs), chunk_size)]
+        with ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=_set_worker_units,
+                initargs=(functions, dbs)) as pool:
+            return [values
+                    for chunk_values in pool.map(_evaluate_units, chunks)
+                    for values in chunk_values]
+
+    def _evaluate_cached(self, unit_ids, dbs, functions):
+        """
+        Evaluate functions like `_evaluate`, taking values saved in
+        cache if it is used. Functions are evaluated only for units
+        that do not have saved values, and new values are saved.
+        """
+        if self.cache is None:
+            return self._evaluate(dbs, functions)
+
+        key = (self.elections.election_type, self.elections.year,
+               self.granularity, self.source_db.version())
+        saved = []
+        uncached = set()
+        for j, function in enumerate(functions):
+            try:
+                saved.append(self.cache.get(function, key))
+            except TypeError:
+                # function without fingerprint, e.g. with closure that
+                # cannot be pickled, is evaluated without cache
+                saved.append({})
+                uncached.add(j)
+
+        # group functions by units without saved values
+        groups = {}
+        for j, values in enumerate(saved):
+            missing = tuple(i for i, unit_id in enumerate(unit_ids)
+                            if unit_id not in values)
+            if missing:
+                groups.setdefault(missing, []).append(j)
+
+        # evaluate and save them
+        for missing, function_indexes in groups.items():
+            new_values = self._evaluate(
+                [dbs[i] for i in missing],
+                [functions[j] for j in function_indexes])
+            for k, j in enumerate(function_indexes):
+                function_values = {
+                    unit_ids[i]: unit_values[k]
+                    for i, unit_values in zip(missing, new_values)}
+                saved[j].update(function_values)
+                if j not in uncached:
+                    self.cache.update(functions[j], key, function_values)
+
+        return [[values[unit_id] for values in saved] for unit_id in unit_ids]
+
+    def _split_units(self):
+        """ Return lists of IDs, DBs and regions of units. """
+        dbs = list(self._split_db())
+        unit_ids = []
         regions = []
-        values = []
-
         for db in dbs:
-            # make region
-            geo = db[self.granularity].find_one({}, fields="geo")
+            unit_id, geo = db[self.granularity].find_one(
+                {}, fields=["_id", "geo"])
             region = Region.from_json(geo)
+            unit_ids.append(unit_id)
             regions.append(region)
+        return unit_ids, dbs, regions
 
-            # evaluate value
-            value = self.function(db)
-            values.append(value)
-
+    def _render(self, regions, values, colormap, output_filename):
+        """ Make plot of values of units and show it or save to file. """
         # determine outline units
         outline_geos = self.source_db[self.outlines_granularity].find({}, fields="geo")
         outline_regions = [Region.from_json(geo) for geo in outline_geos]
 
         # make visualizer object
         self.vis = Visualizer(
-            regions, values, self.colormap, contours=outline_regions,
+            regions, values, colormap, contours=outline_regions,
             interpolation=self.interpolation, title=self.title,
             color_legend=self.show_legend, grid=self.show_grid
         )
@@ -264,16 +428,27 @@ class Controller:
         ### TODO # add title, legend, grid, values, etc.
 
         # render plot to window or file
-        if self.output_filename:
+        if output_filename:
             visualized_dir = self.elections.visualized_dir
             if not os.path.exists(visualized_dir):
                 ### TODO - make image dir, not only main dir
                 os.makedirs(visualized_dir)
-            output_path = visualized_dir + self.output_filename
+            output_path = visualized_dir + output_filename
             self.vis.save_image(output_path)
         else:
             self.vis.show()
 
+    def _visualize(self):
+        # split db into units
+        unit_ids, dbs, regions = self._split_units()
+
+        # process data
+        values = [unit_values[0] for unit_values in self._evaluate_cached(
+            unit_ids, dbs, [self.function])]
+
+        # make plot
+        self._render(regions, values, self.colormap, self.output_filename)
+
     def run(self):
         """
         Run prepared analysis object. It first makes sure the DB is
@@ -282,6 +457,45 @@ class Controller:
         self._load_db()
         self._visualize()
 
+    def run_many(self, tasks):
+        """
+        Run many analyses on the same units at once. DB is loaded,
+        indexed and split into units only once, all functions are
+        evaluated for each unit, and then plot is made for each of
+        them. Other settings of plots are taken from constructor.
+
+        tasks: list of (function, colormap, output_filename) - they
+            are used instead of the ones given to constructor, the
+            plots with `output_filename` of None are shown in window.
+
+        The DB is loaded only if it was not loaded before, so it can be
+        read before to prepare the tasks.
+        """
+        if self.source_db is None:
+            self._load_db()
+
+        # split db into units
+        unit_ids, dbs, regions = self._split_units()
+
+        # process data for all functions
+        functions = [function for function, _, _ in tasks]
+        values = self._evaluate_cached(unit_ids, dbs, functions)
+
+        # make plots
+        for i, (_, colormap, output_filename) in enumerate(tasks):
+            task_values = [unit_values[i] for unit_values in values]
+            self._render(regions, task_values, colormap, output_filename)
+
+    def clear_cache(self, function=None):
+        """
+        Remove values of function saved for these elections, or all
+        saved values if function is None. It is needed when function
+        depends on something that its fingerprint does not include,
+        like other modules or files.
+        """
+        cache = self.cache or ResultsCache(self.elections.cached_dir)
+        cache.invalidate(function)
+
     def show_db_schema(self):
         """ Show tables and fields in DB as user guide. """
         raise NotImplementedError("TODO")
@@ -292,9 +506,23 @@ class Controller:
 class DbReferences:
     """
     This class is making indexes on relations between tables in DB.
-    It is needed for pure performance requirements. This class could be
-    discarded if the custom DB driver used in this project would have
-    indexes implemented and be optimized for performance.
+    It is needed for pure performance requirements, so that records
+    corresponding to given territorial unit can be found without
+    querying tables for each unit.
+
+    The territorial hierarchy is kept as integer arrays. Records of
+    each level (voivodships, constituencies, districts, communes,
+    polling districts, protocoles, candidates and mandates) get their
+    positions in order of their table, and each level has an array of
+    positions of parent records. Records of lower level that belong
+    to one unit of higher level are found by grouping them by their
+    ancestor - sorted positions of records and offsets of groups (CSR
+    layout) - so relation of any unit is just a slice of array. Groups
+    are made for pairs of levels when they are first needed.
+
+    Related records are always given in order of their table. Because
+    all state is in the `arrays` dictionary of NumPy arrays, it can be
+    easily saved to file and loaded back.
 
     It assumes that splitting DB would need to get only those records
     from tables, that corresponds to the given territorial unit. That
@@ -307,35 +535,25 @@ class DbReferences:
         "powiaty": "powiat",
         "gminy": "gmina",
     }
+    # parent level of each level of the hierarchy
+    PARENTS = {
+        "voivodship": None,
+        "okreg": "voivodship",
+        "powiat": "okreg",
+        "gmina": "powiat",
+        "obwod": "gmina",
+        "protocole": "obwod",
+        "candidate": "okreg",
+        "mandate": "candidate",
+    }
 
-    @staticmethod
-    def _inverse_dict(dictionary):
-        """
-        Take dictionary of keys and lists of values and turn it
-        to dictionary of values with assigned lists of keys which
-        are paired in original dictionary.
-
-        dictionary: dict of {key: [value_1, value_2, ..., value_n]}
-        """
-        values = []
-        for value_list in dictionary.values():
-            values += value_list
-
-        inversed_dict = {value: [] for value in values}
-        for key, value_list in dictionary.items():
-            for value in value_list:
-                inversed_dict[value].append(key)
-
-        return inversed_dict
-
-    def __init__(self, source_db, granularity):
+    def __init__(self, source_db, granularity, arrays=None):
         """
         This object makes reading DB relations easier. Each of 4
         granularity levels has to have assigned corresponding records
         IDs for all tables in DB.
 
-        Explicitly saying - there are indexes needed that makes
-        assignment from:
+        Explicitly saying - there are relations needed from:
             - voivodships
             - constituencies
             - district
@@ -347,172 +565,241 @@ class DbReferences:
             - communes
             - polling districts
             - protocoles
+            - candidates, lists and mandates of constituencies
+            - voting results
         which they are associated with.
 
-        Alse intermediate assignments are needed from constituencies to:
-        - candidates
-        - lists
-        - mandates
-        The latter IDs are determined dynamically during calling
-        methods, because the lists of values for each unit within
-        one constituency would be the same.
-
-        Voting results IDs are dynamically determined.
+        Polling districts are assigned to constituencies by their
+        `constituency` field, as districts can be split between
+        constituencies. A district is assigned to the first
+        constituency listing it, and constituency to the voivodship
+        of its first district. If there are more records of voting
+        results of polling district, the last one in table of its
+        constituency is used.
+
+        source_db: DbDriver - preprocessed DB, used if `arrays` are
+            not given,
+        granularity: str - name of table of units,
+        arrays: dict or None - arrays of other `DbReferences` instance,
+            e.g. loaded from file, so they are not built again.
         """
-        print("Creating indexes for data...")
-
         self.granularity = granularity
+        # positions of records for their IDs
+        self._positions = {}
+        # levels above each level, starting from parent
+        self._levels_above = {
+            level: self._ancestors(level) for level in self.PARENTS}
+        # groups of records of level by ancestor level, made when needed
+        self._groups = {}
+
+        if arrays is not None:
+            self.arrays = arrays
+            for name in arrays:
+                if name.endswith("_ids"):
+                    self._add_positions(name[:-len("_ids")])
+        else:
+            print("Creating indexes for data...")
+            self.arrays = {}
+            self._make_arrays(source_db)
+            print("Indexes for data created.")
+            print()
+
+    def _make_arrays(self, source_db):
+        # territorial units
+        okreg_ids, numbers, powiat_lists = self._columns(
+            source_db, "okręgi", "_id", "number", "powiat_list")
+        powiat_ids, powiat_parents = self._columns(
+            source_db, "powiaty", "_id", "parent")
+        obwod_ids, obwod_gminy, obwod_okregi = self._columns(
+            source_db, "obwody", "_id", "gmina", "constituency")
+
+        okreg_powiaty = [json.loads(powiat_list)
+                         for powiat_list in powiat_lists]
+        powiat_to_okreg = {}
+        for okreg_id, powiat_list in zip(okreg_ids, okreg_powiaty):
+            for powiat_id in powiat_list:
+                powiat_to_okreg.setdefault(powiat_id, okreg_id)
+        powiat_to_voivodship = dict(zip(powiat_ids, powiat_parents))
+
+        self._add_level("voivodship", *self._columns(
+            source_db, "województwa", "_id"))
+        self._add_level(
+            "okreg", okreg_ids,
+            [powiat_to_voivodship.get(powiat_list[0]) if powiat_list else None
+             for powiat_list in okreg_powiaty])
+        self._add_level(
+            "powiat", powiat_ids,
+            [powiat_to_okreg.get(powiat_id) for powiat_id in powiat_ids])
+        self._add_level("gmina", *self._columns(
+            source_db, "gminy", "_id", "parent"))
+        self._add_level("obwod", obwod_ids, obwod_gminy)
+        self._add_level("protocole", *self._columns(
+            source_db, "protokoły", "_id", "obwod"))
+
+        # candidates, lists and mandates
+        candidate_ids, candidate_okregi, candidate_lists = self._columns(
+            source_db, "kandydaci", "_id", "constituency", "list")
+        self._add_level("candidate", candidate_ids, candidate_okregi)
+        self._add_level("list", *self._columns(source_db, "listy", "_id"))
+        self.arrays["candidate_list"] = self._to_positions(
+            "list", candidate_lists)
+        self._add_level("mandate", *self._columns(
+            source_db, "mandaty", "_id", "candidate"))
+
+        # constituency of polling district - it is also the table of
+        # its voting results - and record of polling district in it,
+        # as position in IDs of records of all the tables, -1 if none
+        self.arrays["okreg_number"] = np.array(numbers, dtype=object)
+        obwod_table = self._to_positions("okreg", obwod_okregi)
+        self.arrays["obwod_table"] = obwod_table
+        obwod_wyniki = np.full(len(obwod_ids), -1, dtype=np.int64)
+        wyniki_records = []
+        for okreg, number in enumerate(numbers):
+            wyniki_ids, wyniki_obwody = self._columns(
+                source_db, f"wyniki_{number}", "_id", "obwod")
+            positions = self._to_positions("obwod", wyniki_obwody)
+            # the last record of polling district is used
+            positions, last = np.unique(positions[::-1], return_index=True)
+            rows = len(wyniki_ids) - 1 - last
+            found = positions >= 0
+            found[found] = obwod_table[positions[found]] == okreg
+            obwod_wyniki[positions[found]] = len(wyniki_records) + rows[found]
+            wyniki_records.extend(wyniki_ids)
+        self.arrays["obwod_wyniki"] = obwod_wyniki
+        self.arrays["wyniki_records"] = np.array(wyniki_records, dtype=object)
 
-        # auxiliary indexes and names lists
-        self._voivodships = source_db["województwa"].find({}, fields="_id")
-        self._okregi = source_db["okręgi"].find({}, fields="_id")
-        self._gminy = source_db["gminy"].find({}, fields="_id")
-        self._wyniki_table_names = {
-            okreg_id: f"wyniki_{okreg_no}"
-            for okreg_id, okreg_no
-            in source_db["okręgi"].find({}, fields=["_id", "number"])
-        }
-        obwod_to_protocole = {
-            obwod_id: protocole_id
-            for protocole_id, obwod_id
-            in source_db["protokoły"].find({}, fields=["_id", "obwod"])
-        }
-
-        # direct indexes
-        self._gmina_to_powiat = {
-            gmina_id: [powiat_id]
-            for gmina_id, powiat_id
-            in source_db["gminy"].find({}, fields=["_id", "parent"])
-        }
-
-        self._powiat_to_voivodship = {
-            powiat_id: [voivodship_id]
-            for powiat_id, voivodship_id
-            in source_db["powiaty"].find({}, fields=["_id", "parent"])
-        }
-
-        self._okreg_to_powiat = {
-            okreg_id: json.loads(powiaty)
-            for okreg_id, powiaty
-            in source_db["okręgi"].find({}, fields=["_id", "powiat_list"])}
-
-        self._powiat_to_okreg = self._inverse_dict(self._okreg_to_powiat)
-
-        self._gmina_to_okreg = {}
-        for gmina_id in self._gminy:
-            powiat_id = self._gmina_to_powiat[gmina_id][0]
-            okreg_id = self._powiat_to_okreg[powiat_id][0]
-            self._gmina_to_okreg[gmina_id] = [okreg_id]
-
-        self._gmina_to_voivodship = {}
-        for gmina_id in self._gminy:
-            powiat_id = self._gmina_to_powiat[gmina_id][0]
-            voivodship_id = self._powiat_to_voivodship[powiat_id][0]
-            self._gmina_to_voivodship[gmina_id] = [voivodship_id]
-
-        self._okreg_to_voivodship = {}
-        for okreg_id in self._okregi:
-            powiat_id = self._okreg_to_powiat[okreg_id][0]
-            voivodship_id = self._powiat_to_voivodship[powiat_id][0]
-            self._okreg_to_voivodship[okreg_id] = [voivodship_id]
-
-        self._powiat_to_gmina = self._inverse_dict(self._gmina_to_powiat)
-
-        self._okreg_to_gmina = self._inverse_dict(self._gmina_to_okreg)
-
-        self._voivodship_to_gmina = self._inverse_dict(self._gmina_to_voivodship)
-
-        self._voivodship_to_powiat = self._inverse_dict(
-            self._powiat_to_voivodship)
-
-        self._voivodship_to_okreg = self._inverse_dict(self._okreg_to_voivodship)
-
-        self._gmina_to_obwod = {
-            gmina_id: [] for gmina_id in self._gminy}
-        for obwod_id, gmina_id \
-                in source_db["obwody"].find({}, fields=["_id", "gmina"]):
-            self._gmina_to_obwod[gmina_id].append(obwod_id)
-
-        self._powiat_to_obwod = {}
-        for powiat_id, gminy in self._powiat_to_gmina.items():
-            obwody = []
-            for gmina_id in gminy:
-                obwody += self._gmina_to_obwod[gmina_id]
-            self._powiat_to_obwod[powiat_id] = obwody
-
-        self._okreg_to_obwod = {}
-        for okreg_id, powiaty in self._okreg_to_powiat.items():
-            obwody = []
-            for powiat_id in powiaty:
-                obwody += self._powiat_to_obwod[powiat_id]
-            self._okreg_to_obwod[okreg_id] = obwody
-
-        self._voivodship_to_obwod = {}
-        for voivodship_id, okregi in self._voivodship_to_okreg.items():
-            obwody = []
-            for okreg_id in okregi:
-                obwody += self._okreg_to_obwod[okreg_id]
-            self._voivodship_to_obwod[voivodship_id] = obwody
-
-        self._gmina_to_protocole = {
-            gmina_id: [obwod_to_protocole[obwod_id] for obwod_id in obwody]
-            for gmina_id, obwody in self._gmina_to_obwod.items()
-        }
+    @staticmethod
+    def _columns(source_db, name, *fields):
+        """
+        Return lists of values of fields of all records in table. Only
+        these fields are loaded, if the table is not loaded yet.
+        """
+        table = source_db.table(
+            name, columns=[field for field in fields if field != "_id"])
+        return [table.find({}, fields=field) for field in fields]
 
-        self._powiat_to_protocole = {
-            powiat_id: [obwod_to_protocole[obwod_id] for obwod_id in obwody]
-            for powiat_id, obwody in self._powiat_to_obwod.items()
-        }
+    def _to_positions(self, level, ids):
+        """ Translate IDs of records of level to positions, -1 if missing. """
+        positions = self._positions[level]
+        return np.array([positions.get(_id, -1) for _id in ids],
+                        dtype=np.int64)
 
-        self._okreg_to_protocole = {
-            okreg_id: [obwod_to_protocole[obwod_id] for obwod_id in obwody]
-            for okreg_id, obwody in self._okreg_to_obwod.items()
-        }
+    def _add_positions(self, level):
+        self._positions[level] = {
+            _id: i for i, _id in enumerate(self.arrays[f"{level}_ids"])}
 
-        self._voivodship_to_protocole = {
-            voivodship_id: [obwod_to_protocole[obwod_id] for obwod_id in obwody]
-            for voivodship_id, obwody in self._voivodship_to_obwod.items()
-        }
+    def _add_level(self, level, ids, parent_ids=None):
+        """
+        Save IDs of records of level and positions of their parents.
+        The parent level must be added before.
+        """
+        self.arrays[f"{level}_ids"] = np.array(ids, dtype=object)
+        self._add_positions(level)
+        if parent_ids is not None:
+            self.arrays[f"{level}_parent"] = self._to_positions(
+                self.PARENTS[level], parent_ids)
+
+    def _ancestors(self, level):
+        """ Return list of levels above given level, starting from parent. """
+        ancestors = []
+        while self.PARENTS.get(level) is not None:
+            level = self.PARENTS[level]
+            ancestors.append(level)
+        return ancestors
+
+    def _parent_level(self, level, ancestor_level):
+        """
+        Return level of parents of records on the way to ancestor level
+        and array of positions of parents. Polling districts belong to
+        constituency directly, not through their district.
+        """
+        if level == "obwod" and ancestor_level in ["okreg", "voivodship"]:
+            return "okreg", self.arrays["obwod_table"]
+        return self.PARENTS[level], self.arrays[f"{level}_parent"]
+
+    def _ancestor_positions(self, level, ancestor_level, positions):
+        """ Return positions of ancestors of records, -1 if missing. """
+        while level != ancestor_level:
+            level, parents = self._parent_level(level, ancestor_level)
+            positions = np.where(positions >= 0, parents[positions], -1)
+        return positions
+
+    def _group(self, level, ancestor_level):
+        """
+        Return positions of records of level sorted by their ancestor
+        and offsets of groups of each ancestor record in them.
+        """
+        key = (level, ancestor_level)
+        if key not in self._groups:
+            n_records = len(self.arrays[f"{level}_ids"])
+            n_ancestors = len(self.arrays[f"{ancestor_level}_ids"])
+            ancestors = self._ancestor_positions(
+                level, ancestor_level, np.arange(n_records))
+            # stable sort keeps records in table order within group,
+            # records without ancestor are at the beginning
+            order = np.argsort(ancestors, kind="stable")
+            order = order[np.count_nonzero(ancestors < 0):]
+            counts = np.bincount(ancestors[ancestors >= 0],
+                                 minlength=n_ancestors)
+            offsets = np.zeros(n_ancestors + 1, dtype=np.int64)
+            np.cumsum(counts, out=offsets[1:])
+            self._groups[key] = (order, offsets)
+        return self._groups[key]
+
+    def _relation_positions(self, _from, _to, position):
+        """ Return positions of records of `_to` related to one record. """
+        if _from == _to:
+            return np.array([position])
+        if _from in self._levels_above.get(_to, []):
+            order, offsets = self._group(_to, _from)
+            return order[offsets[position]:offsets[position + 1]]
+        if _to in self._levels_above.get(_from, []):
+            position = self._ancestor_positions(
+                _from, _to, np.array([position]))[0]
+            return np.array([position] if position >= 0 else [],
+                            dtype=np.int64)
+        if _to == "list":
+            candidates = self._relation_positions(_from, "candidate", position)
+            lists = self.arrays["candidate_list"][candidates]
+            return np.unique(lists[lists >= 0])
+        # records of the closest common ancestor
+        for common in self._levels_above.get(_to, []):
+            if common in self._levels_above.get(_from, []):
+                ancestors = self._relation_positions(_from, common, position)
+                return np.concatenate([np.array([], dtype=np.int64)] + [
+                    self._relation_positions(common, _to, ancestor)
+                    for ancestor in ancestors])
+        raise ValueError(f"No relation from `{_from}` to `{_to}`.")
+
+    def get_ids(self, level):
+        """ Return array of IDs of records of level, in order of table. """
+        return self.arrays[f"{level}_ids"]
+
+    def get_positions(self, level, ids):
+        """
+        Return array of positions of records of level with given IDs
+        in array of `get_ids`, -1 for unknown IDs.
+        """
+        return self._to_positions(level, ids)
 
-        # intermediate indexes
-        candidates = source_db["kandydaci"].find({})  # maybe add `{"is_crossed_out": False}` ?
-        self._okreg_to_candidate = {okreg_id: [] for okreg_id in self._okregi}
-        self._okreg_to_list = {okreg_id: [] for okreg_id in self._okregi}
-        self._okreg_to_mandate = {okreg_id: [] for okreg_id in self._okregi}
-
-        for candidate_id, candidate in candidates.items():
-            okreg_id = candidate["constituency"]
-            list_id = candidate["list"]
-            self._okreg_to_candidate[okreg_id].append(candidate_id)
-            self._okreg_to_list[okreg_id].append(list_id)
-
-        for okreg_id in self._okreg_to_list:
-            lists_list = self._okreg_to_list[okreg_id]
-            lists_list = list(set(lists_list))
-            self._okreg_to_list[okreg_id] = lists_list
-
-        for mandate_id, candidate_id in source_db["mandaty"].find(
-                {}, fields=["_id", "candidate"]):
-            okreg_id = candidates[candidate_id]["constituency"]
-            self._okreg_to_mandate[okreg_id].append(mandate_id)
-
-        # results IDs
-        self._obwod_to_table_name = {}
-        for obwod_id, okreg_id in source_db["obwody"].find(
-                {}, fields=["_id", "constituency"]):
-            table_name_i = self._wyniki_table_names[okreg_id]
-            self._obwod_to_table_name[obwod_id] = table_name_i
-
-        self._obwod_to_wyniki = {}
-        for table_name_i in self._wyniki_table_names.values():
-            for wyniki_id, obwod_id in source_db[table_name_i].find(
-                    {}, fields=["_id", "obwod"]):
-                self._obwod_to_wyniki[obwod_id] = wyniki_id
-
-        print("Indexes for data created.")
-        print()
+    def get_parents(self, level, parent_level=None):
+        """
+        Return array of positions of parent records of all records of
+        level, -1 for records without parent. Records of other level
+        above, containing the records, can be given as `parent_level`.
+        """
+        if parent_level is None:
+            return self.arrays[f"{level}_parent"]
+        n_records = len(self.arrays[f"{level}_ids"])
+        return self._ancestor_positions(
+            level, parent_level, np.arange(n_records))
 
     def get_relation(self, _from, _to, _id):
+        """
+        Return list of IDs of records of `_to` level related to record
+        of `_from` level with given ID. Levels can be given as names of
+        tables of territorial units or singular names.
+        """
         # convert table names
         if _from in self.SINGULAR_DICT:
             _from = self.SINGULAR_DICT[_from]
@@ -521,105 +808,73 @@ class DbReferences:
         # handle identity
         if _from == _to:
             return [_id]
-        # compose attribute name
-        relation_attr_name = f"_{_from}_to_{_to}"
-        # get attribute
-        relation_dict = getattr(self, relation_attr_name)
-        # get relation ids
-        return relation_dict[_id]
+        positions = self._relation_positions(
+            _from, _to, self._positions[_from][_id])
+        return self.arrays[f"{_to}_ids"][positions].tolist()
 
     def get_gmina(self, unit_id):
-        if self.granularity == "gminy":
-            return [unit_id]
-        elif self.granularity == "powiaty":
-            return self._powiat_to_gmina[unit_id]
-        elif self.granularity == "okręgi":
-            return self._okreg_to_gmina[unit_id]
-        elif self.granularity == "województwa":
-            return self._voivodship_to_gmina[unit_id]
+        return self.get_relation(self.granularity, "gmina", unit_id)
 
     def get_powiat(self, unit_id):
-        if self.granularity == "gminy":
-            return self._gmina_to_powiat[unit_id]
-        elif self.granularity == "powiaty":
-            return [unit_id]
-        elif self.granularity == "okręgi":
-            return self._okreg_to_powiat[unit_id]
-        elif self.granularity == "województwa":
-            return self._voivodship_to_powiat[unit_id]
+        return self.get_relation(self.granularity, "powiat", unit_id)
 
     def get_okreg(self, unit_id):
-        if self.granularity == "gminy":
-            return self._gmina_to_okreg[unit_id]
-        elif self.granularity == "powiaty":
-            return self._powiat_to_okreg[unit_id]
-        elif self.granularity == "okręgi":
-            return [unit_id]
-        elif self.granularity == "województwa":
-            return self._voivodship_to_okreg[unit_id]
+        return self.get_relation(self.granularity, "okreg", unit_id)
 
     def get_voivodship(self, unit_id):
-        if self.granularity == "gminy":
-            return self._gmina_to_voivodship[unit_id]
-        elif self.granularity == "powiaty":
-            return self._powiat_to_voivodship[unit_id]
-        elif self.granularity == "okręgi":
-            return self._okreg_to_voivodship[unit_id]
-        elif self.granularity == "województwa":
-            return [unit_id]
+        return self.get_relation(self.granularity, "voivodship", unit_id)
 
     def get_obwod(self, unit_id):
-        if self.granularity == "gminy":
-            return self._gmina_to_obwod[unit_id]
-        elif self.granularity == "powiaty":
-            return self._powiat_to_obwod[unit_id]
-        elif self.granularity == "okręgi":
-            return self._okreg_to_obwod[unit_id]
-        elif self.granularity == "województwa":
-            return self._voivodship_to_obwod[unit_id]
+        return self.get_relation(self.granularity, "obwod", unit_id)
 
     def get_protocole(self, unit_id):
-        if self.granularity == "gminy":
-            return self._gmina_to_protocole[unit_id]
-        elif self.granularity == "powiaty":
-            return self._powiat_to_protocole[unit_id]
-        elif self.granularity == "okręgi":
-            return self._okreg_to_protocole[unit_id]
-        elif self.granularity == "województwa":
-            return self._voivodship_to_protocole[unit_id]
+        return self.get_relation(self.granularity, "protocole", unit_id)
 
     def get_candidate(self, unit_id):
-        okreg_ids = self.get_okreg(unit_id)
-        candidates_ids = []
-        for okreg_id in okreg_ids:
-            candidates_ids += self._okreg_to_candidate[okreg_id]
-        return candidates_ids
+        return self.get_relation(self.granularity, "candidate", unit_id)
 
     def get_list(self, unit_id):
-        okreg_ids = self.get_okreg(unit_id)
-        list_ids = []
-        for okreg_id in okreg_ids:
-            list_ids += self._okreg_to_list[okreg_id]
-        return list_ids
+        return self.get_relation(self.granularity, "list", unit_id)
 
     def get_mandate(self, unit_id):
-        okreg_ids = self.get_okreg(unit_id)
-        mandate_ids = []
-        for okreg_id in okreg_ids:
-            mandate_ids += self._okreg_to_mandate[okreg_id]
-        return mandate_ids
+        return self.get_relation(self.granularity, "mandate", unit_id)
 
     def get_wyniki(self, unit_id):
-        wyniki_dict = {}
-        okregi_ids = self.get_okreg(unit_id)
-        for okreg_id in okregi_ids:
-            table_name_i = self._wyniki_table_names[okreg_id]
-            wyniki_dict[table_name_i] = []
+        level = self.SINGULAR_DICT[self.granularity]
+        position = self._positions[level][unit_id]
+        obwody = self._relation_positions(level, "obwod", position)
+        okregi = self._relation_positions(level, "okreg", position)
+        tables = self.arrays["obwod_table"][obwody]
+        wyniki = self.arrays["obwod_wyniki"][obwody]
+        has_wyniki = wyniki >= 0
 
-        obwody_ids = self.get_obwod(unit_id)
-        for obwod_id in obwody_ids:
-            wyniki_id = self._obwod_to_wyniki[obwod_id]
-            table_name_i = self._obwod_to_table_name[obwod_id]
-            wyniki_dict[table_name_i].append(wyniki_id)
+        wyniki_dict = {}
+        for okreg in okregi:
+            number = self.arrays["okreg_number"][okreg]
+            wyniki_dict[f"wyniki_{number}"] = []
+        for okreg in np.unique(tables[has_wyniki]):
+            number = self.arrays["okreg_number"][okreg]
+            table_wyniki = wyniki[has_wyniki & (tables == okreg)]
+            wyniki_dict[f"wyniki_{number}"] = \
+                self.arrays["wyniki_records"][table_wyniki].tolist()
 
         return wyniki_dict
+
+    def save(self, filepath):
+        """
+        Save arrays of relations to `.npz` file. Arrays of IDs are saved
+        as arrays of strings or numbers, so they are loaded without
+        pickle.
+        """
+        arrays = {
+            name: np.array(array.tolist()) if array.dtype == object else array
+            for name, array in self.arrays.items()
+        }
+        np.savez(filepath, **arrays)
+
+    @classmethod
+    def load(cls, filepath, granularity):
+        """ Make instance from arrays saved with `save` method. """
+        with np.load(filepath, allow_pickle=False) as npz_file:
+            arrays = {name: npz_file[name] for name in npz_file.files}
+        return cls(None, granularity, arrays=arrays)
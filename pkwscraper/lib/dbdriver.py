@@ -1,12 +1,112 @@
 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import bisect
+import csv
+import functools
+import hashlib
+import json
+import operator
 import os
+import pathlib
 import random
+import shutil
+import sqlite3
+import sys
+import time
+import weakref
+import zipfile
 
+import numpy as np
 import pandas as pd
 
 
 EXTENSIONS = ['csv', 'xls', 'xlsx']
 SHORT_UUID = True
+NPT_EXTENSION = 'npt'
+SQLITE_EXTENSION = 'sqlite'
+CSV_CHUNK_SIZE = 50000
+SIZE_SAMPLE = 100
+STORAGE_FORMATS = ['csv', 'npt', 'sqlite']
+LAYOUTS = ['rows', 'columns', 'compact']
+EXECUTORS = ['process', 'thread']
+INDEX_KINDS = ['hash', 'sorted']
+KEYS = ['uuid', 'int']
+WAL_FILENAME = 'changes.wal'
+METADATA_FILENAME = 'db.json'
+COMPARISONS = {
+    "$gt": operator.gt,
+    "$gte": operator.ge,
+    "$lt": operator.lt,
+    "$lte": operator.le,
+}
+OPERATORS = ["$in", "$ne", "$exists"] + list(COMPARISONS)
+SQL_COMPARISONS = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def query_operators(condition):
+    """
+    Return dict of operators and their arguments if the condition
+    from query is operators dict (like `{"$gt": 5, "$lt": 10}`), or
+    `None` if it is a value for equality condition.
+    """
+    if not isinstance(condition, dict) or not condition \
+            or not all(isinstance(key, str) and key.startswith("$")
+                       for key in condition):
+        return None
+    for key in condition:
+        if key not in OPERATORS:
+            raise ValueError(f"Unknown query operator: `{key}`.")
+    return condition
+
+
+def _compare(value, comparison, argument):
+    """ Compare values, values of not comparable types do not match. """
+    try:
+        return bool(COMPARISONS[comparison](value, argument))
+    except TypeError:
+        return False
+
+
+def check_value(is_present, value, condition):
+    """
+    Check if value of field matches the condition from query.
+
+    is_present: bool - if the field is present in record
+    value: value of field in record
+    condition: value for equality condition or operators dict
+    """
+    operators = query_operators(condition)
+    if operators is None:
+        return is_present and value == condition
+    for operator_name, argument in operators.items():
+        if operator_name == "$exists":
+            matches = is_present == bool(argument)
+        elif operator_name == "$ne":
+            matches = not is_present or value != argument
+        elif not is_present:
+            matches = False
+        elif operator_name == "$in":
+            matches = any(value == item for item in argument)
+        else:
+            matches = _compare(value, operator_name, argument)
+        if not matches:
+            return False
+    return True
+
+
+def _sampled_size(objects, count, size_of=sys.getsizeof):
+    """
+    Estimate memory taken by `count` objects, from the average size of
+    the first `SIZE_SAMPLE` of given objects.
+    """
+    sample = []
+    for obj in objects:
+        sample.append(size_of(obj))
+        if len(sample) == SIZE_SAMPLE:
+            break
+    if not sample:
+        return 0
+    return sum(sample) * count // len(sample)
 
 
 class Record:
@@ -77,6 +177,19 @@ class Record:
         parts = [Record._hex_string(k) for k in Record.UUID_PARTS]
         return "-".join(parts)
 
+    @staticmethod
+    def _make_uuids(n):
+        """ Make `n` pretended UUIDs, drawing all digits at once. """
+        length = sum(Record.UUID_PARTS)
+        digits = Record._hex_string(n * length)
+        bounds = np.cumsum((0,) + Record.UUID_PARTS).tolist()
+        uuids = []
+        for start in range(0, n * length, length):
+            uuid = digits[start:start + length]
+            uuids.append("-".join(uuid[a:b]
+                                  for a, b in zip(bounds, bounds[1:])))
+        return uuids
+
     def get_field_or_id(self, name):
         """
         Return ID or value of field.
@@ -114,12 +227,35 @@ class Record:
         """
         return dict(self.__data)
 
+    def memory_size(self):
+        """ Return approximate number of bytes taken by record. """
+        return (sys.getsizeof(self) + sys.getsizeof(self.__data)
+                + sum(map(sys.getsizeof, self.__data.values())))
+
+    def add_fields(self, fields):
+        """
+        Add values of fields to record, used when fields are loaded
+        later than record.
+        """
+        self.__data.update(fields)
+
+    def get_index_key(self, fields):
+        """
+        Return tuple of values for given fields, used as a key in
+        indexes. If any of fields is missing - `None` is returned.
+        """
+        try:
+            return tuple(self.__data[field] for field in fields)
+        except KeyError:
+            return None
+
     def check_condition(self, query_dict):
         """
         Check if record matches given query.
         """
-        return all(key in self.__data and self.__data[key] == value
-                   for key, value in query_dict.items())
+        data = self.__data
+        return all(check_value(key in data, data.get(key), condition)
+                   for key, condition in query_dict.items())
 
     def __getitem__(self, name):
         return self.get_field_or_id(name)
@@ -132,212 +268,2749 @@ class Record:
         return false
 
 
-class Table:
+class RecordSchema:
     """
-    `Table` class represents DB Table containing records with given
-    IDs. Constructor creates empty table. `from_df` method gets
-    data from `pandas.DataFrame` object.
+    `RecordSchema` assigns positions to names of fields. It is shared
+    by all `CompactRecord` objects of a table, so the names of fields
+    are not repeated in each record. New fields are added at the end.
+    """
+    def __init__(self):
+        self.fields = []
+        self.positions = {}
 
-    `Table` can be created as read only - the modifying and
-    deleting operations cannot be performed.
+    def position(self, field):
+        """ Return position of field, adding the field if it is new. """
+        position = self.positions.get(field)
+        if position is None:
+            position = len(self.fields)
+            self.fields.append(field)
+            self.positions[field] = position
+        return position
 
-    Records can be read directly by record ID (if known). Then it
-    needs to use square brackets to choose proper record.
+    def __len__(self):
+        return len(self.fields)
 
-    Searching a `Table` is done by `find` method - it can
-    be called with criterions for fields with syntax:
 
-    `find(query={field_name_1: value_1, field_name_2: value_2})`
+class CompactRecord:
+    """
+    `CompactRecord` has the same interface as `Record`, but instead
+    of dict it keeps a tuple of values at positions given by shared
+    `RecordSchema`, and an integer bitmap of present fields. It has no
+    instance dict (`__slots__` are used), so it takes a few times
+    less memory than `Record` with the same data.
+    """
+    __slots__ = ("_id", "_schema", "_values", "_present")
 
-    This will return all records which have the given fields with
-    given values. The return structure is `dict` of records with their
-    IDs as keys. Records are represented as "documents" which are
-    dictionaries of `name: value` pairs. Names of fields in records
-    can be anything, except "_id" field, which is the record ID.
+    def __init__(self, schema, values, present, _id):
+        """
+        schema: RecordSchema - positions of fields
+        values: tuple - values at positions of fields
+        present: int - bitmap of fields present in record
+        _id: ID of record
+        """
+        self._schema = schema
+        self._values = values
+        self._present = present
+        self._id = _id
 
-    The `find_one` method can be used to return just one result
-    (first found). It takes the same kind of query. It returns the
-    ID of record, and the record itself (so the tuple is returned).
-    If there isn't any record matching the query, the `None` is
-    returned.
-    NOTE: just a single None object will be returned, not a tuple.
+    @classmethod
+    def from_dict(cls, schema, record, _id=None):
+        """ Create new record, like `Record.from_dict`. """
+        # copy dict
+        record = dict(record)
 
-    If the `fields` parameter is given - the returned value of `find`
-    and `find_one` methods is list of results. Each result represent
-    a single record that mathces the `query`. If `fields` parameter is
-    just a single key name - each result will be just the corresponding
-    value, therefore a method will return list of values.
+        # get record id and remove it from record
+        record_id = record.pop("_id", None)
+        if _id is None:
+            _id = record_id
+        if _id is None:
+            _id = Record._make_uuid()
 
-    If `fields` parameter is a list of keys (or column names) - a
-    single result will be a list of the keys values from a record,
-    with order matching the order of `fields` parameter. Missing keys
-    will also be included, containing `None` values. Therefore the
-    method in such case will return list of lists of values.
+        # make record
+        positions = [schema.position(name) for name in record]
+        values = [None] * len(schema)
+        present = 0
+        for position, value in zip(positions, record.values()):
+            values[position] = value
+            present |= 1 << position
+        return cls(schema, tuple(values), present, _id)
 
-    Writing records to `Table` can be done via `put` method. It takes
-    the ID of new record and dict with `name: value` pairs. If the ID
-    is not provided - a (pretended) UUID is generated. If the provided
-    ID duplicates an existing one - the record will be overwritten. This
-    behaviour can be also used for modifying records.
+    def _position(self, name):
+        """ Return position of field, or `None` if it is missing. """
+        position = self._schema.positions.get(name)
+        if position is None or not self._present >> position & 1:
+            return None
+        return position
 
-    Deleting or modifying records must be done manually. It is not
-    supported as it is not needed for this project.
+    def get_field_or_id(self, name):
+        """
+        Return ID or value of field.
 
-    `Table` can be converted to `pandas.DataFrame` without loss of data.
-    And vice versa - it can be loaded from `pandas.DataFrame`, but
-    this time it is not guaranteed to support all strange features
-    of `DataFrame`. Shortly said - `Table` can be converted to DF and
-    back and it will stay the same.
+        name: str - name of given field
+        """
+        if name == "_id":
+            return self._id
+        position = self._position(name)
+        return None if position is None else self._values[position]
+
+    def get_fields_list(self, fields):
+        """
+        Return list of values for given fields.
+        """
+        # choose one value
+        if isinstance(fields, str):
+            return self.get_field_or_id(fields)
+
+        # choose only values matching given fields
+        if isinstance(fields, list):
+            return [self.get_field_or_id(field) for field in fields]
+
+        raise TypeError(f"`fields` should be of one of types: "
+                        f"`None`, `str` or `list`. got: {type(fields)}")
+
+    def to_id_dict(self):
+        """
+        Return ID and dict of key-value pairs.
+        """
+        return self._id, self.to_dict()
+
+    def to_dict(self):
+        """
+        Return dict of key-value pairs.
+        """
+        fields = self._schema.fields
+        present = self._present
+        return {fields[position]: value
+                for position, value in enumerate(self._values)
+                if present >> position & 1}
+
+    def memory_size(self):
+        """ Return approximate number of bytes taken by record. """
+        return (sys.getsizeof(self) + sys.getsizeof(self._values)
+                + sum(map(sys.getsizeof, self._values)))
+
+    def add_fields(self, fields):
+        """
+        Add values of fields to record, used when fields are loaded
+        later than record.
+        """
+        positions = [self._schema.position(name) for name in fields]
+        values = list(self._values)
+        values += [None] * (len(self._schema) - len(values))
+        for position, value in zip(positions, fields.values()):
+            values[position] = value
+            self._present |= 1 << position
+        self._values = tuple(values)
+
+    def get_index_key(self, fields):
+        """
+        Return tuple of values for given fields, used as a key in
+        indexes. If any of fields is missing - `None` is returned.
+        """
+        key = []
+        for field in fields:
+            position = self._position(field)
+            if position is None:
+                return None
+            key.append(self._values[position])
+        return tuple(key)
+
+    def check_condition(self, query_dict):
+        """
+        Check if record matches given query.
+        """
+        for key, condition in query_dict.items():
+            position = self._position(key)
+            value = None if position is None else self._values[position]
+            if not check_value(position is not None, value, condition):
+                return False
+        return True
+
+    def __getitem__(self, name):
+        return self.get_field_or_id(name)
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, CompactRecord)):
+            return self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return False
+
+
+class HashIndex:
     """
-    def __init__(self, read_only=False):
-        self.__read_only = read_only
-        self.__data = {}
+    `HashIndex` maps values of given fields to IDs of records, which
+    have these values. It can be made on single field or on a tuple
+    of fields (compound index). Keys of index are always tuples of
+    values, ordered as the fields of index.
+
+    Records that do not have all of the index fields are not stored
+    in index, as they cannot match any equality query on these
+    fields. Indexed values must be hashable.
+
+    IDs for each key are kept in order of adding them to the index.
+    """
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self.__buckets = {}
+
+    def add(self, key, _id):
+        """ Assign record ID to the key. `None` key is ignored. """
+        if key is None:
+            return
+        bucket = self.__buckets.get(key)
+        if bucket is None:
+            bucket = self.__buckets[key] = {}
+        bucket[_id] = None
+
+    def remove(self, key, _id):
+        """ Remove record ID assigned to the key. """
+        if key is None:
+            return
+        bucket = self.__buckets[key]
+        del bucket[_id]
+        if not bucket:
+            del self.__buckets[key]
+
+    def lookup(self, key):
+        """ Return IDs of records having given key. """
+        return self.__buckets.get(key, {})
+
+    def to_dict(self):
+        """ Return dict of keys and lists of IDs assigned to them. """
+        return {key: list(bucket) for key, bucket in self.__buckets.items()}
 
     @classmethod
-    def from_df(cls, df, limit=None, read_only=False):
+    def from_dict(cls, fields, buckets):
+        """ Create index from dict of keys and lists of IDs. """
+        index = cls(fields)
+        index.__buckets = {key: dict.fromkeys(ids)
+                           for key, ids in buckets.items()}
+        return index
+
+    def __len__(self):
+        return len(self.__buckets)
+
+
+class SortedIndex(HashIndex):
+    """
+    `SortedIndex` is `HashIndex` on single field, which also keeps
+    the values of field sorted, so it can find records with values in
+    given range. Numbers and texts are sorted separately, and values
+    of other types are not sorted, as they are not comparable.
+    """
+    def __init__(self, fields):
+        if len(fields) != 1:
+            raise ValueError("Sorted index can be made on single field only.")
+        super().__init__(fields)
+        self.__sorted_values = {"number": [], "text": []}
+
+    @staticmethod
+    def _group(value):
+        """ Return name of group of comparable values, or `None`. """
+        if isinstance(value, (int, float, np.integer, np.floating)) \
+                and value == value:
+            return "number"
+        if isinstance(value, str):
+            return "text"
+        return None
+
+    def add(self, key, _id):
+        is_new = key is not None and not self.lookup(key)
+        super().add(key, _id)
+        group = None if not is_new else self._group(key[0])
+        if group is not None:
+            bisect.insort(self.__sorted_values[group], key[0])
+
+    def remove(self, key, _id):
+        super().remove(key, _id)
+        group = None if key is None or self.lookup(key) \
+            else self._group(key[0])
+        if group is not None:
+            values = self.__sorted_values[group]
+            del values[bisect.bisect_left(values, key[0])]
+
+    def range_ids(self, low=None, high=None, low_inclusive=True,
+                  high_inclusive=True):
         """
-        Read table from DataFrame and make table from it.
+        Return IDs of records with values between `low` and `high`
+        (`None` means no limit), in order of values.
+        """
+        groups = {self._group(limit) for limit in (low, high)
+                  if limit is not None}
+        if len(groups) != 1 or None in groups:
+            return []
+        values = self.__sorted_values[groups.pop()]
+        start = 0
+        if low is not None:
+            find_start = bisect.bisect_left if low_inclusive \
+                else bisect.bisect_right
+            start = find_start(values, low)
+        stop = len(values)
+        if high is not None:
+            find_stop = bisect.bisect_right if high_inclusive \
+                else bisect.bisect_left
+            stop = find_stop(values, high)
+        ids = []
+        for value in values[start:stop]:
+            ids += self.lookup((value,))
+        return ids
 
-        df: pandas.DataFrame - data structure containing table data
-        limit: None/int - maximum number of records to be loaded
-        read_only: bool - if table has to be protected from changing
+    @classmethod
+    def from_dict(cls, fields, buckets):
+        index = super().from_dict(fields, buckets)
+        for (value,) in buckets:
+            group = cls._group(value)
+            if group is not None:
+                index.__sorted_values[group].append(value)
+        for values in index.__sorted_values.values():
+            values.sort()
+        return index
 
-        returns: Table
+
+class BaseTable:
+    """
+    `BaseTable` contains the logic common for all kinds of tables -
+    the read only flag and indexes management. Concrete tables define
+    how the records are stored and searched.
+
+    Searching can be speeded up by making indexes on fields, that are
+    often used in queries. `create_index` takes name of field or list
+    of names (for compound index). Indexes are kept up to date when
+    putting records. `find` and `find_one` automatically choose the
+    most selective index, that covers the fields of query. Indexes
+    are not changing results, only the time of searching. Sorted
+    indexes (on single field) are used also for range conditions,
+    like `{"$gt": 5}`, and hash indexes are used for `$in` condition.
+
+    Indexes can be exported and attached to other table, which is
+    used by `DbDriver` to save them on harddrive next to table file.
+
+    Tables track if they were changed since they were saved, and IDs
+    of records appended since then (`None` if any existing record was
+    overwritten). It lets `DbDriver` skip saving unchanged tables, or
+    only append new records to file.
+
+    Table can be loaded with only some of fields (projection). The
+    other fields are loaded when they are needed - when they are used
+    in query or results, when whole records are returned, or when the
+    table is modified or converted.
+
+    IDs of new records are pretended UUIDs, unless `keys` attribute is
+    set to "int" - then they are consecutive integers, following the
+    greatest integer ID in table (dense surrogate keys, numbered from
+    0 in new table). `DbDriver` sets it for all its tables.
+
+    If `put_log` function is set, it is called with IDs and records
+    put to table, after they are put. `DbDriver` uses it for logging
+    changes in write-ahead log.
+
+    Searching is planned by `_plan` method - it chooses between scan
+    of all records (or of columns, in columnar tables) and lookup in
+    the most selective index. `explain` tells the plan of query, with
+    number of records scanned and returned and time of searching. If
+    `query_log` function is set, `find` and `find_one` calls taking at
+    least `slow_query_time` seconds are reported to it the same way.
+
+    Concrete tables need to implement methods: `_index_items`,
+    `_index_key`, `_has_id`, `_ids`, `_is_empty` and `_add_columns`.
+    """
+    _scan_method = "scan"
+
+    def __init__(self, read_only=False):
+        self._read_only = read_only
+        self.keys = "uuid"
+        self.__next_key = None
+        self.__indexes = {}
+        self.__indexes_loader = None
+        # new table has to be saved as whole
+        self._dirty = True
+        self._appended_ids = None
+        self._indexes_changed = False
+        # all fields are loaded
+        self.__projection = None
+        self.__projection_loader = None
+        # slow queries are not reported
+        self.query_log = None
+        self.slow_query_time = 0
+        # put records are not reported
+        self.put_log = None
+
+    def _mark_put(self, _id, is_new):
+        """ Note change of table after putting record. """
+        self._dirty = True
+        if is_new and self.__next_key is not None \
+                and isinstance(_id, (int, np.integer)) \
+                and _id >= self.__next_key:
+            self.__next_key = int(_id) + 1
+        if self._appended_ids is not None:
+            if is_new:
+                self._appended_ids.append(_id)
+            else:
+                self._appended_ids = None
+
+    def _log_put(self, ids, records):
+        """ Report put records to `put_log` function, if it is set. """
+        if self.put_log is not None:
+            self.put_log(ids, records)
+
+    def _mark_changed(self):
+        """ Note that table has to be saved as whole. """
+        self._dirty = True
+        self._appended_ids = None
+
+    def _mark_saved(self):
+        """ Note that table is the same as saved on harddrive. """
+        self._dirty = False
+        self._appended_ids = []
+        self._indexes_changed = False
+
+    def _check_read_only(self):
+        if self._read_only:
+            raise IOError("Table is for read only.")
+
+    def _new_ids(self, n):
+        """ Generate IDs for `n` new records, according to `keys`. """
+        if self.keys != "int":
+            return Record._make_uuids(n)
+        if self.__next_key is None:
+            self.__next_key = 1 + max(
+                (int(_id) for _id in self._ids()
+                 if isinstance(_id, (int, np.integer))), default=-1)
+        start = self.__next_key
+        self.__next_key += n
+        return list(range(start, start + n))
+
+    def _record_id(self, record, _id):
         """
-        # create new table
-        table = cls(read_only=read_only)
+        Return ID of put record - given `_id` argument, "_id" field of
+        record or new ID.
+        """
+        if _id is None:
+            _id = record.get("_id")
+        if _id is None:
+            _id = self._new_ids(1)[0]
+        return _id
 
-        # convert to python data structures
-        dict_data = df.iloc[:limit].T.to_dict('dict')
+    def _bulk_ids(self, records, ids):
+        """
+        Return list of IDs for records put in bulk. IDs given in `ids`
+        have the priority over "_id" fields of records, and missing
+        IDs are generated.
+        """
+        if ids is None:
+            ids = [None] * len(records)
+        elif len(ids) != len(records):
+            raise ValueError(f"Number of IDs ({len(ids)}) differs from "
+                             f"number of records ({len(records)}).")
+        ids = [record.get("_id") if _id is None else _id
+               for record, _id in zip(records, ids)]
+        missing = [i for i, _id in enumerate(ids) if _id is None]
+        for i, new_id in zip(missing, self._new_ids(len(missing))):
+            ids[i] = new_id
+        return ids
 
-        # make records
-        records = [Record.from_df_dict_item(item)
-                   for item in dict_data.items()]
+    def _index_items(self, fields):
+        """ Iterate over pairs of record ID and index key. """
+        raise NotImplementedError()
 
-        # make records dictionary
-        records_data = {rec._id: rec for rec in records}
+    def _index_key(self, _id, fields):
+        """ Return index key of record, `None` if any field is missing. """
+        raise NotImplementedError()
 
-        # assign to new table
-        table.__data = records_data
-        return table
+    def _has_id(self, _id):
+        raise NotImplementedError()
+
+    def _ids(self):
+        """ Return IDs of all records of table. """
+        raise NotImplementedError()
+
+    def _is_empty(self):
+        raise NotImplementedError()
+
+    def _add_columns(self, df):
+        """ Add fields loaded later to records of table. """
+        raise NotImplementedError()
+
+    def _field_names(self):
+        """ Return list of names of fields present in table. """
+        raise NotImplementedError()
+
+    def _rows_chunks(self, fields, chunk_size):
+        """
+        Iterate over lists of rows with ID and values of given fields
+        (`None` for missing values) of consecutive records.
+        """
+        raise NotImplementedError()
+
+    def _aggregation_data(self, query, fields, subset=None):
+        """
+        Return number of records matching the query and dict of pairs
+        of arrays - values and presence mask - for each of the fields
+        present in table.
+        """
+        raise NotImplementedError()
+
+    def _subset(self, ids):
+        """
+        Return references to records with given IDs (in given order),
+        used by `TableView` to search only in these records.
+        """
+        raise NotImplementedError()
+
+    def _memory_size(self):
+        """
+        Return approximate number of bytes taken by records of table,
+        estimated from a sample of records.
+        """
+        raise NotImplementedError()
+
+    @staticmethod
+    def _columns_to_df(ids, columns):
+        """ Make DataFrame from array of IDs and dict of columns. """
+        n = len(ids)
+        data = {name: column.frame_values(n)
+                for name, column in columns.items()}
+        index = pd.Index(ids, name="_id")
+        return pd.DataFrame(data, index=index)
+
+    def to_csv(self, filepath):
+        """
+        Save table to `csv` file, the same as made from `to_df` result.
+        Rows are written in chunks, without making `DataFrame` of
+        whole table. The file is replaced only when it is written
+        completely, so it is not broken by interrupted saving.
+
+        filepath: str - path of `csv` file
+        """
+        # check read only
+        self._check_read_only()
+        self._widen()
+
+        # write temporary file, which replaces the old one when ready
+        fields = self._field_names()
+        temp_path = filepath + ".new"
+        with open(temp_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f, delimiter=";", lineterminator=os.linesep)
+            writer.writerow(["_id"] + fields)
+            for rows in self._rows_chunks(fields, CSV_CHUNK_SIZE):
+                writer.writerows(rows)
+        os.replace(temp_path, filepath)
+
+    def _set_projection(self, fields, loader):
+        """
+        Note that only given fields of table are loaded. The `loader`
+        function takes the `usecols` filter of names of fields and
+        returns DataFrame with these fields of all records.
+        """
+        self.__projection = set(fields)
+        self.__projection_loader = loader
+
+    def _widen(self, fields=None):
+        """ Load given fields (all by default) if they are not loaded. """
+        if self.__projection is None:
+            return
+        loaded = self.__projection
+        if fields is None:
+            def usecols(name):
+                return name == "_id" or name not in loaded
+        else:
+            missing = {field for field in fields
+                       if field != "_id" and field not in loaded}
+            if not missing:
+                return
+
+            def usecols(name):
+                return name == "_id" or name in missing
+        self._add_columns(self.__projection_loader(usecols))
+        if fields is None:
+            self.__projection = None
+            self.__projection_loader = None
+        else:
+            self.__projection = loaded | missing
+
+    def _widen_for(self, query, fields):
+        """ Load fields used by query and needed in results. """
+        if fields is None:
+            self._widen()
+        elif isinstance(fields, str):
+            self._widen(list(query) + [fields])
+        elif isinstance(fields, list):
+            self._widen(list(query) + fields)
+        else:
+            self._widen(list(query))
+
+    def _old_index_keys(self, _id):
+        """
+        Return keys of record in all indexes, before modifying it.
+        `None` is returned for new record.
+        """
+        indexes = self._get_indexes()
+        if not indexes or not self._has_id(_id):
+            return None
+        return {fields: self._index_key(_id, fields) for fields in indexes}
+
+    def _update_indexes(self, _id, old_keys):
+        """ Update indexes after putting record. """
+        for fields, index in self._get_indexes().items():
+            key = self._index_key(_id, fields)
+            if old_keys is not None:
+                old_key = old_keys[fields]
+                if old_key == key:
+                    continue
+                index.remove(old_key, _id)
+            index.add(key, _id)
+
+    @staticmethod
+    def _index_fields(fields):
+        """ Convert field name or list of names to index fields tuple. """
+        if isinstance(fields, str):
+            return (fields,)
+        if isinstance(fields, (list, tuple)) and len(fields) > 0:
+            return tuple(fields)
+        raise TypeError(f"`fields` should be field name or non-empty "
+                        f"list of field names. got: {fields}")
+
+    def create_index(self, fields, kind="hash"):
+        """
+        Create index on a field or on a list of fields. Creating index
+        does not modify data, so it is allowed for read only tables.
+        If the index already exists - nothing is done, except that hash
+        index is replaced when sorted index is requested.
+
+        fields: str/list - name of field or names of fields for
+            compound index
+        kind: str - "hash" or "sorted" (for single field only), sorted
+            index is used also for range conditions
+        """
+        if kind not in INDEX_KINDS:
+            raise ValueError('`kind` should be one of: "hash" or "sorted"')
+        fields = self._index_fields(fields)
+        existing_index = self._get_indexes().get(fields)
+        if existing_index is not None and (
+                kind == "hash" or isinstance(existing_index, SortedIndex)):
+            return
+        self._widen(fields)
+        index = SortedIndex(fields) if kind == "sorted" \
+            else HashIndex(fields)
+        for _id, key in self._index_items(fields):
+            index.add(key, _id)
+        self.__indexes[fields] = index
+        self._indexes_changed = True
+
+    def drop_index(self, fields):
+        """
+        Remove index made on given field or fields.
+
+        fields: str/list - name of field or names of fields
+        """
+        fields = self._index_fields(fields)
+        del self._get_indexes()[fields]
+        self._indexes_changed = True
+
+    def index_groups(self, fields):
+        """
+        Return all values of given field (or tuples of values for
+        list of fields) with lists of IDs of records that have these
+        values. Index is created on fields if it does not exist yet.
+
+        fields: str/list - name of field or names of fields
+
+        returns: dict
+        """
+        self.create_index(fields)
+        index_fields = self._index_fields(fields)
+        groups = self._get_indexes()[index_fields].to_dict()
+        if isinstance(fields, str):
+            groups = {key[0]: ids for key, ids in groups.items()}
+        return groups
+
+    def aggregate(self, group_by=None, sums=None, count=False, query=None):
+        """
+        Sum values of fields in records matching the query, optionally
+        in groups of records with the same values of `group_by` fields.
+        Each sum is a single NumPy reduction over values of the field.
+        Records without summed field are skipped in its sum (so field
+        missing in whole table has sum 0), and records without any of
+        `group_by` fields are not assigned to any group.
+
+        group_by: str/list/None - field or fields to group records by
+        sums: list/None - names of fields to be summed
+        count: bool - if number of records is included in results
+            under "_count" key
+        query: dict/None - query for records to be aggregated, the same
+            as in `find`, all records are aggregated if not given
+
+        returns:
+            dict - `{field: sum}` if `group_by` is `None`
+            dict - `{group_value: {field: sum}}` otherwise, the group
+                values are tuples if `group_by` is a list
+        """
+        return self._aggregate(group_by, sums, count, query)
+
+    def _aggregate(self, group_by, sums, count, query, subset=None):
+        query = {} if query is None else query
+        sums = [] if sums is None else list(sums)
+        group_fields = () if group_by is None \
+            else self._index_fields(group_by)
+        fields = list(dict.fromkeys(list(group_fields) + sums))
+        self._widen_for(query, fields)
+        n, data = self._aggregation_data(query, fields, subset)
+
+        # assign records to groups
+        if group_by is None:
+            keys = [None]
+            codes = np.zeros(n, dtype=np.int64)
+        else:
+            keys, codes = self._group_codes(n, data, group_fields)
+        grouped = codes >= 0
+
+        # sum values in groups
+        results = [{} for _ in keys]
+        for field in sums:
+            field_sums = [0] * len(keys)
+            if field in data:
+                values, present = data[field]
+                mask = present & grouped
+                values = self._numeric_values(field, values[mask])
+                field_sums = np.bincount(
+                    codes[mask], weights=values, minlength=len(keys))
+                if values.dtype.kind != "f":
+                    field_sums = field_sums.round().astype(np.int64)
+                field_sums = field_sums.tolist()
+            for result, field_sum in zip(results, field_sums):
+                result[field] = field_sum
+        if count:
+            counts = np.bincount(codes[grouped], minlength=len(keys))
+            for result, records_count in zip(results, counts.tolist()):
+                result["_count"] = records_count
+
+        if group_by is None:
+            return results[0]
+        if isinstance(group_by, str):
+            keys = [key[0] for key in keys]
+        return dict(zip(keys, results))
+
+    @staticmethod
+    def _group_codes(n, data, group_fields):
+        """
+        Return list of group keys and array of numbers of groups for
+        each record (-1 if record lacks any of group fields).
+        """
+        codes = np.full(n, -1, dtype=np.int64)
+        if not all(field in data for field in group_fields):
+            return [], codes
+        present = np.logical_and.reduce(
+            [data[field][1] for field in group_fields])
+        rows = np.flatnonzero(present)
+        keys = {}
+        key_values = zip(*[data[field][0][rows].tolist()
+                           for field in group_fields])
+        codes[rows] = [keys.setdefault(key, len(keys)) for key in key_values]
+        return list(keys), codes
+
+    @staticmethod
+    def _numeric_values(field, values):
+        """ Convert values to numeric array for summing. """
+        if values.dtype.kind == "O":
+            values = np.array(values.tolist()) if len(values) \
+                else np.zeros(0, dtype=np.int64)
+        if values.dtype.kind == "b":
+            values = values.astype(np.int64)
+        if values.dtype.kind not in "iuf":
+            raise TypeError(f"Values of field `{field}` cannot be summed, "
+                            f"they are not numbers.")
+        return values
+
+    def _get_indexes(self):
+        """
+        Return dict of indexes. If indexes were attached to the table
+        by loader function - they are loaded at first use.
+        """
+        if self.__indexes_loader is not None:
+            loader = self.__indexes_loader
+            self.__indexes_loader = None
+            self._import_indexes(loader())
+        return self.__indexes
+
+    def _attach_indexes(self, loader):
+        """
+        Attach function returning exported indexes. It is called
+        only when indexes are needed for the first time.
+        """
+        self.__indexes_loader = loader
+
+    def _export_indexes(self):
+        """
+        Return dict of index fields and index contents. Contents of
+        sorted indexes are marked by pairing them with "sorted" label.
+        """
+        exported = {}
+        for fields, index in self._get_indexes().items():
+            buckets = index.to_dict()
+            if isinstance(index, SortedIndex):
+                buckets = ("sorted", buckets)
+            exported[fields] = buckets
+        return exported
+
+    def _import_indexes(self, indexes_data):
+        """
+        Add exported indexes to the table. A sample of each index is
+        checked against data, and if it does not match (for example
+        when types of values changed after saving table to file) -
+        the index is rebuilt from data.
+        """
+        for fields, buckets in indexes_data.items():
+            kind = "hash"
+            if isinstance(buckets, tuple):
+                kind, buckets = buckets
+            self._widen(fields)
+            for key, ids in buckets.items():
+                is_valid = (self._has_id(ids[0])
+                            and self._index_key(ids[0], fields) == key)
+                break
+            else:
+                is_valid = self._is_empty()
+            IndexClass = SortedIndex if kind == "sorted" else HashIndex
+            if is_valid:
+                self.__indexes[fields] = IndexClass.from_dict(fields, buckets)
+            else:
+                self.create_index(fields, kind=kind)
+
+    def _plan(self, query, subset=None):
+        """
+        Choose how to search records matching the query - scan of the
+        given subset, lookup in the most selective index that matches
+        the query, or scan of all records.
+
+        returns:
+            dict - with `method` name ("subset", "index" or the name of
+                table scan), `index` fields tuple (or `None`), number
+                of records to be `scanned` and `ids` from index
+        """
+        if subset is not None:
+            return {"method": "subset", "index": None,
+                    "scanned": len(subset), "ids": None}
+        best_fields = best_ids = None
+        for fields, index in self._get_indexes().items():
+            if not all(field in query for field in fields):
+                continue
+            try:
+                ids = self._index_lookup(index, query)
+            except TypeError:
+                # unhashable value in query
+                continue
+            if ids is None:
+                continue
+            if best_ids is None or len(ids) < len(best_ids):
+                best_fields, best_ids = fields, ids
+        if best_ids is None:
+            return {"method": self._scan_method, "index": None,
+                    "scanned": len(self._ids()), "ids": None}
+        return {"method": "index", "index": best_fields,
+                "scanned": len(best_ids), "ids": best_ids}
+
+    def _indexed_ids(self, query):
+        """
+        Return IDs of records from the most selective index that
+        matches the query, or `None` if no index can be used.
+        """
+        return self._plan(query)["ids"]
+
+    def explain(self, query):
+        """
+        Search records matching the query, like `find` does, and tell
+        how they were searched.
+
+        query: dict - query for records, the same as in `find`
+
+        returns:
+            dict - `method` of searching ("index", "scan", "column
+                mask" or "subset"), `index` fields tuple or `None`,
+                numbers of records `scanned` (`None` if not known) and
+                `returned`, and `time` of searching in seconds
+        """
+        return self._explain(query)
+
+    def _explain(self, query, subset=None):
+        plan = self._plan(query, subset)
+        start = time.perf_counter()
+        returned = len(self._find(query, "_id", subset,
+                                  plan=self._search_plan(query, subset)))
+        elapsed = time.perf_counter() - start
+        return {"method": plan["method"], "index": plan["index"],
+                "scanned": plan["scanned"], "returned": returned,
+                "time": elapsed}
+
+    def _search_plan(self, query, subset=None):
+        """
+        Return plan of search that is given to search function, so it
+        is not computed again for logging. `None` if the table does not
+        use the plan for searching.
+        """
+        return self._plan(query, subset)
+
+    def _logged(self, method, query, subset, search, *args):
+        """
+        Call search function with given arguments and the plan of
+        search, and report it to `query_log` function if it took at
+        least `slow_query_time`.
+        """
+        if self.query_log is None:
+            return search(*args)
+        start = time.perf_counter()
+        plan = self._search_plan(query, subset)
+        result = search(*args, plan=plan)
+        elapsed = time.perf_counter() - start
+        if elapsed >= self.slow_query_time:
+            if plan is None:
+                plan = self._plan(query, subset)
+            if method == "find_one":
+                returned = 0 if result is None else 1
+            else:
+                returned = len(result)
+            self.query_log({
+                "method": method, "query": query, "plan": plan["method"],
+                "index": plan["index"], "scanned": plan["scanned"],
+                "returned": returned, "time": elapsed})
+        return result
+
+    @staticmethod
+    def _index_lookup(index, query):
+        """
+        Return IDs of records from index, that can match the query, or
+        `None` if the conditions of query cannot be served by index.
+        """
+        conditions = [query[field] for field in index.fields]
+        operators = [query_operators(condition) for condition in conditions]
+        if all(operator_dict is None for operator_dict in operators):
+            return index.lookup(tuple(conditions))
+        if len(conditions) > 1:
+            return None
+        operators = operators[0]
+        if "$in" in operators:
+            ids = {}
+            for value in operators["$in"]:
+                ids.update(dict.fromkeys(index.lookup((value,))))
+            return ids
+        if isinstance(index, SortedIndex) \
+                and any(name in COMPARISONS for name in operators):
+            low = high = None
+            low_inclusive = high_inclusive = True
+            for name, argument in operators.items():
+                if name in ("$gt", "$gte"):
+                    low, low_inclusive = argument, name == "$gte"
+                elif name in ("$lt", "$lte"):
+                    high, high_inclusive = argument, name == "$lte"
+            return index.range_ids(low, high, low_inclusive, high_inclusive)
+        return None
+
+
+class Table(BaseTable):
+    """
+    `Table` class represents DB Table containing records with given
+    IDs. Constructor creates empty table. `from_df` method gets
+    data from `pandas.DataFrame` object.
+
+    `Table` can be created as read only - the modifying and
+    deleting operations cannot be performed.
+
+    Records can be read directly by record ID (if known). Then it
+    needs to use square brackets to choose proper record.
+
+    Searching a `Table` is done by `find` method - it can
+    be called with criterions for fields with syntax:
+
+    `find(query={field_name_1: value_1, field_name_2: value_2})`
+
+    This will return all records which have the given fields with
+    given values. The return structure is `dict` of records with their
+    IDs as keys. Records are represented as "documents" which are
+    dictionaries of `name: value` pairs. Names of fields in records
+    can be anything, except "_id" field, which is the record ID.
+
+    The `find_one` method can be used to return just one result
+    (first found). It takes the same kind of query. It returns the
+    ID of record, and the record itself (so the tuple is returned).
+    If there isn't any record matching the query, the `None` is
+    returned.
+    NOTE: just a single None object will be returned, not a tuple.
+
+    If the `fields` parameter is given - the returned value of `find`
+    and `find_one` methods is list of results. Each result represent
+    a single record that mathces the `query`. If `fields` parameter is
+    just a single key name - each result will be just the corresponding
+    value, therefore a method will return list of values.
+
+    If `fields` parameter is a list of keys (or column names) - a
+    single result will be a list of the keys values from a record,
+    with order matching the order of `fields` parameter. Missing keys
+    will also be included, containing `None` values. Therefore the
+    method in such case will return list of lists of values.
+
+    Writing records to `Table` can be done via `put` method. It takes
+    the ID of new record and dict with `name: value` pairs. If the ID
+    is not provided - a (pretended) UUID is generated. If the provided
+    ID duplicates an existing one - the record will be overwritten. This
+    behaviour can be also used for modifying records.
+
+    Deleting or modifying records must be done manually. It is not
+    supported as it is not needed for this project.
+
+    Indexes on fields can be made to speed up searching, see the
+    `BaseTable` docstring.
+
+    `Table` can be converted to `pandas.DataFrame` without loss of data.
+    And vice versa - it can be loaded from `pandas.DataFrame`, but
+    this time it is not guaranteed to support all strange features
+    of `DataFrame`. Shortly said - `Table` can be converted to DF and
+    back and it will stay the same.
+    """
+    def __init__(self, read_only=False):
+        super().__init__(read_only=read_only)
+        self.__data = {}
+        self.__order = None
+
+    @classmethod
+    def from_df(cls, df, limit=None, read_only=False):
+        """
+        Read table from DataFrame and make table from it.
+
+        df: pandas.DataFrame - data structure containing table data
+        limit: None/int - maximum number of records to be loaded
+        read_only: bool - if table has to be protected from changing
+
+        returns: Table
+        """
+        return cls.from_dfs([df.iloc[:limit]], read_only=read_only)
+
+    @classmethod
+    def from_dfs(cls, dfs, read_only=False):
+        """
+        Make table from DataFrames containing consecutive parts of
+        table data, like chunks of csv file. Only one DataFrame is
+        converted to records at once.
+
+        dfs: iterable - `pandas.DataFrame` objects with table data
+        read_only: bool - if table has to be protected from changing
+
+        returns: Table
+        """
+        # create new table
+        table = cls(read_only=read_only)
+
+        for df in dfs:
+            for record in table._records_from_df(df):
+                table.__data[record._id] = record
+
+        return table
+
+    def _records_from_df(self, df):
+        """ Make records from rows of DataFrame. """
+        # convert to python data structures
+        dict_data = df.T.to_dict('dict')
+
+        # make records
+        for item in dict_data.items():
+            yield Record.from_df_dict_item(item)
+
+    def _make_record(self, record, _id):
+        """ Make record from dict. """
+        return Record.from_dict(record, _id)
+
+    def to_df(self, ids=None):
+        """
+        Convert table to DataFrame.
+
+        ids: list/None - IDs of records to be converted, all by default
+
+        returns: pandas.DataFrame
+        """
+        # check read only
+        self._check_read_only()
+        self._widen()
+
+        # convert data to dicts
+        records = list(self.__data.values()) if ids is None \
+            else [self.__data[_id] for _id in ids]
+        dicts = [record.to_dict() for record in records]
+
+        # make typed columns of values
+        all_rows = np.arange(len(dicts))
+        columns = {}
+        for name in dict.fromkeys(name for data in dicts for name in data):
+            present = np.array([name in data for data in dicts], dtype=bool)
+            values = [data[name] for data in dicts if name in data]
+            column = Column.empty(len(dicts), values[0])
+            column.set_many(all_rows[present], values)
+            columns[name] = column
+
+        # make data frame
+        record_ids = np.empty(len(records), dtype=object)
+        record_ids[:] = [record._id for record in records]
+        return self._columns_to_df(record_ids, columns)
+
+    def put(self, record, _id=None, __force=False):
+        """
+        Put record in table. Note that `_id` is not stored in record
+        dict, but as a record key in table. The `_id` can be however
+        passed in record dict - it will be popped from it and used as
+        a record ID. However the explicit passing of `_id` argument has
+        the priority.
+
+        record: dict - record with `name: value` pairs
+        _id: key for record or `None`
+
+        returns: record ID
+        """
+        # check read only
+        if not __force:
+            self._check_read_only()
+        self._widen()
+
+        # make record
+        _id = self._record_id(record, _id)
+        self._put_record(self._make_record(record, _id))
+        self._log_put([_id], [record])
+        return _id
+
+    def put_many(self, records, ids=None):
+        """
+        Put many records in table at once, like with `put` method, but
+        checking table and generating missing IDs only once.
+
+        records: iterable - records dicts with `name: value` pairs
+        ids: list/None - keys for records, `None` values (or whole list)
+            mean taking "_id" from record or generating new ID
+
+        returns: list of records IDs
+        """
+        # check read only
+        self._check_read_only()
+        self._widen()
+
+        # make records and add them to data
+        records = list(records)
+        ids = self._bulk_ids(records, ids)
+        for record, _id in zip(records, ids):
+            self._put_record(self._make_record(record, _id))
+        self._log_put(ids, records)
+        return ids
+
+    def _put_record(self, record):
+        """ Add record to data and update indexes. """
+        _id = record._id
+        old_keys = self._old_index_keys(_id)
+        is_new = _id not in self.__data
+        self._mark_put(_id, is_new=is_new)
+        if is_new and self.__order is not None:
+            self.__order[_id] = len(self.__order)
+        self.__data[_id] = record
+        self._update_indexes(_id, old_keys)
+        return _id
+
+    def _index_items(self, fields):
+        for _id, record in self.__data.items():
+            yield _id, record.get_index_key(fields)
+
+    def _index_key(self, _id, fields):
+        return self.__data[_id].get_index_key(fields)
+
+    def _has_id(self, _id):
+        return _id in self.__data
+
+    def _ids(self):
+        return self.__data.keys()
+
+    def _is_empty(self):
+        return len(self.__data) == 0
+
+    def _add_columns(self, df):
+        for _id, fields in df.T.to_dict('dict').items():
+            record = self.__data.get(_id)
+            if record is not None:
+                record.add_fields({name: value
+                                   for name, value in fields.items()
+                                   if not pd.isna(value)})
+
+    def _field_names(self):
+        return list(dict.fromkeys(
+            name for record in self.__data.values()
+            for name in record.to_dict()))
+
+    def _rows_chunks(self, fields, chunk_size):
+        records = list(self.__data.values())
+        for start in range(0, len(records), chunk_size):
+            yield [[record._id] + record.get_fields_list(fields)
+                   for record in records[start:start + chunk_size]]
+
+    def _aggregation_data(self, query, fields, subset=None):
+        records = [rec.to_dict() for rec in self._select(query, subset)]
+        table_fields = set().union(*records)
+        data = {}
+        for field in fields:
+            if field in table_fields:
+                present = [field in record for record in records]
+                values = np.array([record.get(field) for record in records],
+                                  dtype=object)
+                data[field] = (values, np.array(present, dtype=bool))
+        return len(records), data
+
+    def _in_table_order(self, ids, query):
+        """
+        Sort IDs of records taken from many keys of index (for query
+        with operators) in order of records in table.
+        """
+        if len(ids) < 2 or all(query_operators(condition) is None
+                               for condition in query.values()):
+            return ids
+        if self.__order is None:
+            self.__order = {_id: i for i, _id in enumerate(self.__data)}
+        return sorted(ids, key=self.__order.__getitem__)
+
+    def _subset(self, ids):
+        return [self.__data[_id] for _id in ids]
+
+    def _memory_size(self):
+        return sys.getsizeof(self.__data) + _sampled_size(
+            self.__data.values(), len(self.__data),
+            size_of=lambda record: record.memory_size())
+
+    def _select(self, query, subset=None, plan=None):
+        """
+        Return list of records matching the query, searching only in
+        `subset` list of records if it is given.
+        """
+        if plan is None:
+            plan = self._plan(query, subset)
+        ids = plan["ids"]
+        if subset is not None:
+            records = subset
+        elif ids is None:
+            records = self.__data.values()
+        else:
+            records = (self.__data[_id]
+                       for _id in self._in_table_order(ids, query))
+        return [rec for rec in records if rec.check_condition(query)]
+
+    def __getitem__(self, _id):
+        self._widen()
+        return self.__data[_id].to_dict()
+
+    def find(self, query, fields=None):
+        """
+        Find all records matching the query.
+
+        query: dict - dictionary with fields and values to be matched
+            in searched records
+        fields: key/list/None - keys that has to be included in results
+
+        returns:
+            dict - if `fields` is None
+            list - when `fields` specified
+        """
+        return self._logged("find", query, None, self._find, query, fields)
+
+    def _find(self, query, fields, subset=None, plan=None):
+        # get records matching query
+        self._widen_for(query, fields)
+        records = self._select(query, subset, plan)
+
+        # handle `fields` argument
+        if fields is None:
+            # return raw results if fields not given
+            results = dict(rec.to_id_dict() for rec in records)
+        elif isinstance(fields, str):
+            # chose one value from each record
+            results = [rec[fields] for rec in records]
+        elif isinstance(fields, list):
+            # chose only values matching given fields
+            results = [rec.get_fields_list(fields) for rec in records]
+        else:
+            raise TypeError(f"`fields` should be of one of types: "
+                            f"`None`, `str` or `list`. got: {type(fields)}")
+
+        return results
+
+    def _find_one(self, query, subset=None, plan=None):
+        if plan is None:
+            plan = self._plan(query, subset)
+        ids = plan["ids"]
+        if subset is not None:
+            records = subset
+        elif ids is None:
+            records = self.__data.values()
+        else:
+            records = (self.__data[_id]
+                       for _id in self._in_table_order(ids, query))
+        for record in records:
+            if record.check_condition(query):
+                return record
+
+    def find_one(self, query, fields=None):
+        """
+        Find only one record - the first matching the query.
+
+        query: dict - dictionary with fields and values to be matched
+            in searched records
+        fields: key/list/None - keys that has to be included in results
+
+        returns:
+            None - if record not found
+            (_id, dict) tuple - when `fields` is None
+            single value - if `fields` specify single key name
+            list - if `fields` is a list of keys
+        """
+        return self._logged("find_one", query, None,
+                            self._find_one_with_fields, query, fields)
+
+    def _find_one_with_fields(self, query, fields, subset=None, plan=None):
+        # get raw result
+        self._widen_for(query, fields)
+        record = self._find_one(query, subset, plan)
+        # if no result found
+        if record is None:
+            return None
+        # handle `fields` parameter
+        if fields is None:
+            # if fields not given - return raw result
+            result = record.to_id_dict()
+        elif isinstance(fields, str):
+            # chose one value
+            result = record[fields]
+        elif isinstance(fields, list):
+            # chose only values matching given fields
+            result = record.get_fields_list(fields)
+        else:
+            raise TypeError(f"`fields` should be of one of types: "
+                            f"`None`, `str` or `list`. got: {type(fields)}")
+        return result
+
+
+class CompactTable(Table):
+    """
+    `CompactTable` is `Table` which keeps records as `CompactRecord`
+    objects sharing one `RecordSchema` - the names of fields are kept
+    only once for whole table, and each record is a tuple of values
+    with bitmap of present fields. The interface and the results are
+    the same as for `Table`.
+
+    This is useful for tables with many records with the same fields,
+    like protocoles or voting results.
+    """
+    def __init__(self, read_only=False):
+        super().__init__(read_only=read_only)
+        self._schema = RecordSchema()
+
+    def _records_from_df(self, df):
+        schema = self._schema
+        positions = [schema.position(name) for name in df.columns]
+        present_rows = df.notna().to_numpy().tolist()
+        rows = df.itertuples(index=False, name=None)
+        for _id, row, present_row in zip(df.index.tolist(), rows,
+                                         present_rows):
+            values = [None] * len(schema)
+            present = 0
+            for position, value, is_present \
+                    in zip(positions, row, present_row):
+                if is_present:
+                    values[position] = value
+                    present |= 1 << position
+            yield CompactRecord(schema, tuple(values), present, _id)
+
+    def _make_record(self, record, _id):
+        return CompactRecord.from_dict(self._schema, record, _id)
+
+
+class Column:
+    """
+    `Column` keeps values of single field of `ColumnarTable` in typed
+    NumPy array, together with boolean mask of present values. Arrays
+    can be longer than the table - the surplus is a capacity reserved
+    for new records.
+
+    The type of array is chosen from the first value: `bool`, `int64`,
+    `float64` or `object` for all other values (including strings). If
+    a value not fitting the type is put - the array is converted to
+    `object` type, so the values are never changed by conversion.
+    """
+    def __init__(self, values, mask):
+        self.values = values
+        self.mask = mask
+
+    @staticmethod
+    def _dtype_for(value):
+        """ Return NumPy type for storing given value. """
+        if isinstance(value, (bool, np.bool_)):
+            return np.dtype(bool)
+        if isinstance(value, (int, np.integer)) \
+                and -2**63 <= value < 2**63:
+            return np.dtype(np.int64)
+        if isinstance(value, (float, np.floating)):
+            return np.dtype(np.float64)
+        return np.dtype(object)
+
+    @classmethod
+    def empty(cls, capacity, value):
+        """ Create column with no values, typed for given value. """
+        dtype = cls._dtype_for(value)
+        values = np.zeros(capacity, dtype=dtype)
+        if dtype == object:
+            values[:] = None
+        mask = np.zeros(capacity, dtype=bool)
+        return cls(values, mask)
+
+    @classmethod
+    def from_series(cls, series):
+        """ Create column from `pandas.Series`, nulls are missing. """
+        mask = series.notna().to_numpy()
+        values = series.to_numpy()
+        if values.dtype.kind not in "biufO":
+            values = series.to_numpy(dtype=object)
+        if values.dtype.kind in "iu" and values.dtype != np.int64:
+            values = values.astype(np.int64)
+        return cls(values, mask)
+
+    @classmethod
+    def concatenate(cls, columns):
+        """
+        Join columns one after another. If types of arrays differ, the
+        result is `object` array, except of integers joined with floats.
+        """
+        if len(columns) == 1:
+            return columns[0]
+        dtypes = {column.values.dtype for column in columns}
+        if len(dtypes) > 1 and dtypes != {np.dtype(np.int64),
+                                          np.dtype(np.float64)}:
+            values = [column.values.astype(object) for column in columns]
+        else:
+            values = [column.values for column in columns]
+        mask = np.concatenate([column.mask for column in columns])
+        return cls(np.concatenate(values), mask)
+
+    def resize(self, capacity):
+        """ Change length of arrays, keeping existing values. """
+        values = np.zeros(capacity, dtype=self.values.dtype)
+        if values.dtype == object:
+            values[:] = None
+        n = min(capacity, len(self.values))
+        values[:n] = self.values[:n]
+        mask = np.zeros(capacity, dtype=bool)
+        mask[:n] = self.mask[:n]
+        self.values = values
+        self.mask = mask
+
+    def _fit_all(self, values):
+        """ Check if all values fit the array, checking types at once. """
+        dtype = self.values.dtype
+        types = set(map(type, values))
+        if dtype.kind == "O" or types <= {bool} and dtype == bool \
+                or types <= {float} and dtype == np.float64:
+            return True
+        if types <= {int} and dtype == np.int64:
+            # values out of int64 range are kept as objects
+            return -2**63 <= min(values, default=0) \
+                and max(values, default=0) < 2**63
+        return all(self._fits(value) for value in values)
+
+    def _fits(self, value):
+        kind = self.values.dtype.kind
+        if kind == "O":
+            return True
+        return self._dtype_for(value) == self.values.dtype
+
+    def set(self, row, value):
+        """ Set value in given row, converting array if needed. """
+        if not self._fits(value):
+            self.values = self.values.astype(object)
+        self.values[row] = value
+        self.mask[row] = True
+
+    def set_many(self, rows, values):
+        """ Set values in given rows, converting array if needed. """
+        if not self._fit_all(values):
+            self.values = self.values.astype(object)
+        if self.values.dtype == object:
+            for row, value in zip(rows, values):
+                self.values[row] = value
+        else:
+            self.values[rows] = values
+        self.mask[rows] = True
+
+    def unset(self, row):
+        """ Mark value in given row as missing. """
+        self.mask[row] = False
+
+    def get(self, row):
+        """ Return python value from given row. """
+        return self.values[row].item() \
+            if self.values.dtype != object else self.values[row]
+
+    def equal_mask(self, rows, value):
+        """
+        Return boolean array telling which of given rows have value
+        present and equal to given value.
+        """
+        values = self.values[rows]
+        present = self.mask[rows]
+        if isinstance(value, (str, bytes)) and values.dtype.kind != "O":
+            # numbers are never equal to texts
+            return np.zeros(len(values), dtype=bool)
+        if np.isscalar(value):
+            equal = values == value
+        else:
+            # avoid broadcasting lists and comparing with None
+            equal = np.fromiter((v == value for v in values.tolist()),
+                                dtype=bool, count=len(values))
+        return present & equal
+
+    def condition_mask(self, rows, condition):
+        """
+        Return boolean array telling which of given rows match the
+        condition from query - value for equality or operators dict.
+        """
+        operators = query_operators(condition)
+        if operators is None:
+            return self.equal_mask(rows, condition)
+        present = self.mask[rows]
+        result = np.ones(len(rows), dtype=bool)
+        for operator_name, argument in operators.items():
+            if operator_name == "$exists":
+                mask = present if argument else ~present
+            elif operator_name == "$ne":
+                mask = ~self.equal_mask(rows, argument)
+            elif operator_name == "$in":
+                mask = np.zeros(len(rows), dtype=bool)
+                for value in argument:
+                    mask |= self.equal_mask(rows, value)
+            else:
+                mask = present & self._compare_mask(rows, operator_name,
+                                                    argument)
+            result &= mask
+        return result
+
+    def _compare_mask(self, rows, comparison, argument):
+        """ Compare values in given rows with argument of comparison. """
+        values = self.values[rows]
+        if values.dtype.kind != "O":
+            if isinstance(argument, (str, bytes)) or not np.isscalar(argument):
+                # numbers are not comparable with other types
+                return np.zeros(len(values), dtype=bool)
+            return COMPARISONS[comparison](values, argument)
+        return np.fromiter(
+            (_compare(value, comparison, argument)
+             for value in values.tolist()),
+            dtype=bool, count=len(values))
+
+    def frame_values(self, n):
+        """
+        Return array of first `n` values for making `DataFrame`, with
+        missing values as NaN or `None`.
+        """
+        values = self.values[:n]
+        mask = self.mask[:n]
+        if mask.all():
+            return values
+        if values.dtype.kind == "f":
+            return np.where(mask, values, np.nan)
+        values = values.astype(object)
+        values[~mask] = None
+        return values
+
+    def storage_kind(self, n):
+        """
+        Return name of type used for saving first `n` values:
+        "bool", "int64", "float64", "str" or "object" (any values).
+        """
+        kind = self.values.dtype.kind
+        if kind != "O":
+            return {"b": "bool", "i": "int64", "f": "float64"}[kind]
+        present = self.values[:n][self.mask[:n]]
+        inferred = pd.api.types.infer_dtype(present, skipna=False)
+        if inferred == "empty":
+            return "float64"
+        return {"string": "str", "integer": "int64", "boolean": "bool",
+                "floating": "float64", "mixed-integer-float": "float64",
+                }.get(inferred, "object")
+
+    def save(self, prefix, n):
+        """
+        Save first `n` values to `npy` files starting with `prefix`.
+        Texts are saved as utf-8 bytes with array of their offsets, so
+        that all files can be memory-mapped.
+
+        returns: str - kind of saved values, see `storage_kind`
+        """
+        kind = self.storage_kind(n)
+        mask = self.mask[:n]
+        np.save(f"{prefix}.mask.npy", mask)
+        if kind == "str":
+            encoded = [value.encode("utf-8") if is_present else b""
+                       for value, is_present
+                       in zip(self.values[:n].tolist(), mask.tolist())]
+            lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=n)
+            offsets = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum(lengths, out=offsets[1:])
+            data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+            np.save(f"{prefix}.offsets.npy", offsets)
+            np.save(f"{prefix}.values.npy", data)
+        elif kind == "object":
+            np.save(f"{prefix}.values.npy", self.values[:n].astype(object),
+                    allow_pickle=True)
+        else:
+            values = np.zeros(n, dtype=kind)
+            values[mask] = self.values[:n][mask]
+            np.save(f"{prefix}.values.npy", values)
+        return kind
+
+    @classmethod
+    def load(cls, prefix, kind, limit=None, mmap_mode=None):
+        """
+        Load column saved by `save` method. If `mmap_mode` is given,
+        arrays are memory-mapped instead of read, and texts are not
+        decoded until needed (see `TextColumn`).
+        """
+        mask = np.load(f"{prefix}.mask.npy", mmap_mode=mmap_mode)[:limit]
+        if kind == "str" and mmap_mode is not None:
+            offsets = np.load(f"{prefix}.offsets.npy", mmap_mode=mmap_mode)
+            data = np.load(f"{prefix}.values.npy", mmap_mode=mmap_mode)
+            return TextColumn(offsets[:len(mask) + 1], data, mask)
+        if kind == "str":
+            offsets = np.load(f"{prefix}.offsets.npy")
+            data = np.load(f"{prefix}.values.npy").tobytes()
+            offsets = offsets.tolist()
+            values = np.empty(len(mask), dtype=object)
+            values[:] = [data[start:end].decode("utf-8") if is_present
+                         else None for start, end, is_present
+                         in zip(offsets, offsets[1:], mask.tolist())]
+        elif kind == "object":
+            values = np.load(f"{prefix}.values.npy", allow_pickle=True)
+            values = values[:limit]
+        else:
+            values = np.load(f"{prefix}.values.npy", mmap_mode=mmap_mode)
+            values = values[:limit]
+        return cls(values, mask)
+
+    def take(self, rows):
+        """ Return list of python values in rows, including missing. """
+        return self.values[rows].tolist()
+
+    def to_list(self, rows):
+        """ Return list of python values in rows, `None` for missing. """
+        values = self.take(rows)
+        if self.mask[rows].all():
+            return values
+        present = self.mask[rows].tolist()
+        return [v if p else None for v, p in zip(values, present)]
+
+    def memory_size(self, n):
+        """
+        Return approximate number of bytes taken by column, including
+        texts and other objects kept in first `n` rows.
+        """
+        size = self.values.nbytes + self.mask.nbytes
+        if self.values.dtype == object:
+            values = self.values[:n][self.mask[:n]]
+            size += _sampled_size(values, len(values))
+        return size
+
+
+class TextColumn(Column):
+    """
+    Read-only column of texts kept as utf-8 bytes, with array of
+    offsets of each text, as saved by `Column.save`. The arrays are
+    usually memory-mapped files, so the texts are decoded only when
+    they are read. Whole column is decoded once and kept in `values`
+    only when it is searched or converted.
+    """
+    def __init__(self, offsets, data, mask):
+        self.offsets = offsets
+        self.data = data
+        self.mask = mask
+        self._decoded = None
+
+    @property
+    def values(self):
+        if self._decoded is None:
+            self._decoded = np.empty(len(self.mask), dtype=object)
+            self._decoded[:] = self._decode(np.arange(len(self.mask)))
+        return self._decoded
+
+    def _decode(self, rows):
+        """ Return list of texts in given rows. """
+        starts = self.offsets[rows]
+        ends = self.offsets[rows + 1]
+        if len(rows) == 0:
+            return []
+        # read only the needed range of bytes
+        first = int(starts.min())
+        data = self.data[first:int(ends.max())].tobytes()
+        return [data[start - first:end - first].decode("utf-8")
+                for start, end in zip(starts.tolist(), ends.tolist())]
+
+    def get(self, row):
+        if self._decoded is not None:
+            return self._decoded[row]
+        return self._decode(np.array([row]))[0]
+
+    def take(self, rows):
+        if self._decoded is not None:
+            return self._decoded[rows].tolist()
+        return self._decode(np.asarray(rows, dtype=np.int64))
+
+    def memory_size(self, n):
+        size = self.offsets.nbytes + self.data.nbytes + self.mask.nbytes
+        if self._decoded is not None:
+            size += Column.memory_size(self, n)
+        return size
+
+
+class ColumnarTable(BaseTable):
+    """
+    `ColumnarTable` has the same interface as `Table` but it stores
+    data in columns instead of records. Each field is kept as typed
+    NumPy array with mask of present values (see `Column`), and IDs
+    of records are kept in separate array. Searching is done with
+    vectorized comparisons of whole columns, and there is no Python
+    dict allocated for each record, until it is returned by `find`,
+    `find_one` or square brackets.
+
+    This is useful for wide tables with many records, like voting
+    results, which take much less memory in this form.
+
+    The order of records, results of searching and conversions to
+    and from `pandas.DataFrame` are the same as for `Table`.
+    """
+    MIN_CAPACITY = 16
+    _scan_method = "column mask"
+
+    def __init__(self, read_only=False):
+        super().__init__(read_only=read_only)
+        self.__ids = np.empty(0, dtype=object)
+        self.__length = 0
+        self.__positions = {}
+        self.__columns = {}
+
+    @classmethod
+    def from_df(cls, df, limit=None, read_only=False):
+        """
+        Read table from DataFrame and make table from it.
+
+        df: pandas.DataFrame - data structure containing table data
+        limit: None/int - maximum number of records to be loaded
+        read_only: bool - if table has to be protected from changing
+
+        returns: ColumnarTable
+        """
+        return cls.from_dfs([df.iloc[:limit]], read_only=read_only)
+
+    @classmethod
+    def from_dfs(cls, dfs, read_only=False):
+        """
+        Make table from DataFrames containing consecutive parts of
+        table data, like chunks of csv file. Columns of each part are
+        made separately and joined at the end.
+
+        dfs: iterable - `pandas.DataFrame` objects with table data
+        read_only: bool - if table has to be protected from changing
+
+        returns: ColumnarTable
+        """
+        # make IDs and columns of each part
+        ids_parts = []
+        columns_parts = {}
+        for df in dfs:
+            ids = np.empty(len(df), dtype=object)
+            ids[:] = df.index.tolist()
+            ids_parts.append(ids)
+            for name in df.columns:
+                column = Column.from_series(df[name])
+                columns_parts.setdefault(name, []).append(column)
+
+        # join parts
+        if not ids_parts:
+            return cls(read_only=read_only)
+        ids = np.concatenate(ids_parts)
+        columns = {name: Column.concatenate(parts)
+                   for name, parts in columns_parts.items()}
+        return cls.from_columns(ids, columns, read_only=read_only)
+
+    def to_df(self, ids=None):
+        """
+        Convert table to DataFrame.
+
+        ids: list/None - IDs of records to be converted, all by default
+
+        returns: pandas.DataFrame
+        """
+        # check read only
+        self._check_read_only()
+        self._widen()
+
+        if ids is None:
+            return self._columns_to_df(
+                self.__ids[:self.__length], self.__columns)
+        rows = np.array([self.__positions[_id] for _id in ids],
+                        dtype=np.int64)
+        columns = {name: Column(column.values[rows], column.mask[rows])
+                   for name, column in self.__columns.items()}
+        return self._columns_to_df(self.__ids[rows], columns)
+
+    @classmethod
+    def from_columns(cls, ids, columns, read_only=False):
+        """
+        Make table from array of IDs and dict of `Column` objects of
+        the same length. Arrays are used without copying.
+
+        ids: numpy.ndarray - IDs of records
+        columns: dict - names of fields and `Column` objects
+        read_only: bool - if table has to be protected from changing
+
+        returns: ColumnarTable
+        """
+        table = cls(read_only=read_only)
+        table.__ids = ids
+        table.__length = len(ids)
+        table.__positions = {_id: row for row, _id in enumerate(ids.tolist())}
+        table.__columns = dict(columns)
+        return table
+
+    def _grow(self, minimum=0):
+        """ Make place for new record (or for `minimum` records). """
+        capacity = max(self.MIN_CAPACITY, 2 * len(self.__ids), minimum)
+        ids = np.empty(capacity, dtype=object)
+        ids[:self.__length] = self.__ids[:self.__length]
+        self.__ids = ids
+        for column in self.__columns.values():
+            column.resize(capacity)
+
+    def put(self, record, _id=None):
+        """
+        Put record in table. The behaviour is the same as for `Table`.
+
+        record: dict - record with `name: value` pairs
+        _id: key for record or `None`
+
+        returns: record ID
+        """
+        # check read only
+        self._check_read_only()
+        self._widen()
+
+        # get record id
+        _id = self._record_id(record, _id)
+        record = dict(record)
+        record.pop("_id", None)
+
+        # get row of record
+        old_keys = self._old_index_keys(_id)
+        row = self.__positions.get(_id)
+        self._mark_put(_id, is_new=row is None)
+        if row is None:
+            if self.__length == len(self.__ids):
+                self._grow()
+            row = self.__length
+            self.__length += 1
+            self.__ids[row] = _id
+            self.__positions[_id] = row
+
+        # write values
+        for name, column in self.__columns.items():
+            if name not in record:
+                column.unset(row)
+        for name, value in record.items():
+            column = self.__columns.get(name)
+            if column is None:
+                column = Column.empty(len(self.__ids), value)
+                self.__columns[name] = column
+            column.set(row, value)
+
+        # update indexes
+        self._update_indexes(_id, old_keys)
+        self._log_put([_id], [record])
+        return _id
+
+    def put_many(self, records, ids=None):
+        """
+        Put many records in table at once. The behaviour is the same
+        as for `Table`. New records are appended to columns in bulk.
+
+        records: iterable - records dicts with `name: value` pairs
+        ids: list/None - keys for records, see `Table.put_many`
+
+        returns: list of records IDs
+        """
+        # check read only
+        self._check_read_only()
+        self._widen()
+
+        # overwriting records is done one by one
+        records = list(records)
+        ids = self._bulk_ids(records, ids)
+        if len(set(ids)) < len(ids) \
+                or any(_id in self.__positions for _id in ids):
+            for record, _id in zip(records, ids):
+                self.put(record, _id)
+            return ids
+
+        # make place for records
+        start = self.__length
+        stop = start + len(ids)
+        if stop > len(self.__ids):
+            self._grow(stop)
+        self.__ids[start:stop] = ids
+        self.__positions.update(zip(ids, range(start, stop)))
+        self.__length = stop
+
+        # gather values of each field and write them to columns
+        names = dict.fromkeys(name for record in records for name in record)
+        names.pop("_id", None)
+        all_rows = np.arange(start, stop)
+        for name in names:
+            present = np.array([name in record for record in records],
+                               dtype=bool)
+            values = [record[name] for record in records if name in record]
+            rows = all_rows if present.all() else all_rows[present]
+            column = self.__columns.get(name)
+            if column is None:
+                column = Column.empty(len(self.__ids), values[0])
+                self.__columns[name] = column
+            column.set_many(rows, values)
+
+        # update indexes
+        for _id in ids:
+            self._mark_put(_id, is_new=True)
+            self._update_indexes(_id, None)
+        self._log_put(ids, records)
+        return ids
+
+    def _row_dict(self, row):
+        return {name: column.get(row)
+                for name, column in self.__columns.items()
+                if column.mask[row]}
+
+    def __getitem__(self, _id):
+        self._widen()
+        return self._row_dict(self.__positions[_id])
+
+    def _index_items(self, fields):
+        rows = np.arange(self.__length)
+        columns = [self.__columns.get(field) for field in fields]
+        if any(column is None for column in columns):
+            return
+        present = np.logical_and.reduce(
+            [column.mask[rows] for column in columns])
+        values = [column.values[rows].tolist() for column in columns]
+        ids = self.__ids[rows].tolist()
+        for _id, is_present, *key in zip(ids, present.tolist(), *values):
+            yield _id, tuple(key) if is_present else None
+
+    def _index_key(self, _id, fields):
+        row = self.__positions[_id]
+        key = []
+        for field in fields:
+            column = self.__columns.get(field)
+            if column is None or not column.mask[row]:
+                return None
+            key.append(column.get(row))
+        return tuple(key)
+
+    def _has_id(self, _id):
+        return _id in self.__positions
+
+    def _ids(self):
+        return self.__ids[:self.__length]
+
+    def _is_empty(self):
+        return self.__length == 0
+
+    def _add_columns(self, df):
+        # align rows of data frame with rows of table
+        df = df.reindex(self.__ids[:self.__length].tolist())
+        for name in df.columns:
+            column = Column.from_series(df[name])
+            if len(self.__ids) > self.__length:
+                column.resize(len(self.__ids))
+            self.__columns[name] = column
+
+    def _field_names(self):
+        return list(self.__columns)
+
+    def _rows_chunks(self, fields, chunk_size):
+        for start in range(0, self.__length, chunk_size):
+            rows = np.arange(start, min(start + chunk_size, self.__length))
+            values = [self._field_values(rows, field)
+                      for field in ["_id"] + fields]
+            yield zip(*values)
+
+    def _aggregation_data(self, query, fields, subset=None):
+        rows = self._select(query, subset)
+        data = {}
+        for field in fields:
+            column = self.__columns.get(field)
+            if column is not None:
+                data[field] = (column.values[rows], column.mask[rows])
+        return len(rows), data
+
+    def _subset(self, ids):
+        return np.fromiter((self.__positions[_id] for _id in ids),
+                           dtype=np.int64, count=len(ids))
+
+    def _memory_size(self):
+        ids = self.__ids[:self.__length]
+        size = (self.__ids.nbytes + sys.getsizeof(self.__positions)
+                + _sampled_size(ids, len(ids)))
+        for column in self.__columns.values():
+            size += column.memory_size(self.__length)
+        return size
+
+    def _select(self, query, subset=None, plan=None):
+        """
+        Return array of rows of records matching the query, searching
+        only in `subset` array of rows if it is given.
+        """
+        if plan is None:
+            plan = self._plan(query, subset)
+        ids = plan["ids"]
+        if subset is not None:
+            rows = subset
+        elif ids is None:
+            rows = np.arange(self.__length)
+        else:
+            rows = np.fromiter((self.__positions[_id] for _id in ids),
+                               dtype=np.int64, count=len(ids))
+            rows.sort()
+        for name, condition in query.items():
+            column = self.__columns.get(name)
+            if column is None:
+                if check_value(False, None, condition):
+                    continue
+                return rows[:0]
+            rows = rows[column.condition_mask(rows, condition)]
+        return rows
+
+    def _rows_to_dicts(self, rows):
+        records = [{} for _ in range(len(rows))]
+        for name, column in self.__columns.items():
+            values = column.take(rows)
+            present = column.mask[rows].tolist()
+            for record, value, is_present in zip(records, values, present):
+                if is_present:
+                    record[name] = value
+        return records
+
+    def _field_values(self, rows, field):
+        """ Return list of values of field in given rows. """
+        if field == "_id":
+            return self.__ids[rows].tolist()
+        column = self.__columns.get(field)
+        if column is None:
+            return [None] * len(rows)
+        return column.to_list(rows)
+
+    def find(self, query, fields=None):
+        """
+        Find all records matching the query. See `Table.find`.
+
+        query: dict - dictionary with fields and values to be matched
+            in searched records
+        fields: key/list/None - keys that has to be included in results
+
+        returns:
+            dict - if `fields` is None
+            list - when `fields` specified
+        """
+        return self._logged("find", query, None, self._find, query, fields)
+
+    def _find(self, query, fields, subset=None, plan=None):
+        self._widen_for(query, fields)
+        rows = self._select(query, subset, plan)
+
+        if fields is None:
+            # return raw results if fields not given
+            ids = self.__ids[rows].tolist()
+            results = dict(zip(ids, self._rows_to_dicts(rows)))
+        elif isinstance(fields, str):
+            # chose one value from each record
+            results = self._field_values(rows, fields)
+        elif isinstance(fields, list):
+            # chose only values matching given fields
+            columns = [self._field_values(rows, field) for field in fields]
+            results = [list(values) for values in zip(*columns)] \
+                if columns else [[] for _ in range(len(rows))]
+        else:
+            raise TypeError(f"`fields` should be of one of types: "
+                            f"`None`, `str` or `list`. got: {type(fields)}")
+
+        return results
+
+    def find_one(self, query, fields=None):
+        """
+        Find only one record - the first matching the query. See
+        `Table.find_one`.
+
+        query: dict - dictionary with fields and values to be matched
+            in searched records
+        fields: key/list/None - keys that has to be included in results
+
+        returns:
+            None - if record not found
+            (_id, dict) tuple - when `fields` is None
+            single value - if `fields` specify single key name
+            list - if `fields` is a list of keys
+        """
+        return self._logged("find_one", query, None,
+                            self._find_one_with_fields, query, fields)
+
+    def _find_one_with_fields(self, query, fields, subset=None, plan=None):
+        self._widen_for(query, fields)
+        rows = self._select(query, subset, plan)[:1]
+        # if no result found
+        if len(rows) == 0:
+            return None
+        # handle `fields` parameter
+        if fields is None:
+            row = rows[0]
+            return self.__ids[row], self._row_dict(row)
+        if isinstance(fields, str):
+            return self._field_values(rows, fields)[0]
+        if isinstance(fields, list):
+            return [self._field_values(rows, field)[0] for field in fields]
+        raise TypeError(f"`fields` should be of one of types: "
+                        f"`None`, `str` or `list`. got: {type(fields)}")
+
+
+class SqliteTable(BaseTable):
+    """
+    `SqliteTable` has the same interface as `Table`, but records are
+    kept in SQLite file instead of memory. Each field is a column of
+    SQL table (without declared type, so values keep their types), and
+    queries of `find`, `find_one` and `aggregate` are translated to
+    parameterized SQL, so only the matching records are read. Indexes
+    made by `create_index` are SQL indexes kept in the file. Many
+    processes can read the same file at once.
+
+    Changes are made in transaction, which is committed by `commit`
+    method (called by `DbDriver.dump_tables`). New file gets empty
+    table at once. Missing values and `None` values are the same (SQL
+    `NULL`) and boolean fields are remembered, as SQLite keeps them as
+    integers.
+    """
+    def __init__(self, path, read_only=False):
+        """
+        path: str - path of SQLite file, it is created if not present
+        read_only: bool - if table has to be protected from changing
+        """
+        super().__init__(read_only=read_only)
+        self.path = path
+        self.__connection = self._connect(path, read_only)
+        if not read_only:
+            self.__connection.execute(
+                "CREATE TABLE IF NOT EXISTS fields "
+                "(position INTEGER PRIMARY KEY, name TEXT, is_bool INTEGER)")
+            self.__connection.execute(
+                "CREATE TABLE IF NOT EXISTS records (_id PRIMARY KEY)")
+        # names of fields and their SQL columns
+        self.__columns = {}
+        self.__bool_fields = set()
+        for position, name, is_bool in self.__connection.execute(
+                "SELECT position, name, is_bool FROM fields "
+                "ORDER BY position"):
+            name = json.loads(name)
+            self.__columns[name] = f"c{position}"
+            if is_bool:
+                self.__bool_fields.add(name)
+
+    @staticmethod
+    def _connect(path, read_only):
+        """ Open SQLite file, transactions are started explicitly. """
+        if read_only:
+            uri = f"{pathlib.Path(os.path.abspath(path)).as_uri()}?mode=ro"
+            return sqlite3.connect(uri, uri=True, isolation_level=None,
+                                   check_same_thread=False)
+        return sqlite3.connect(path, isolation_level=None,
+                               check_same_thread=False)
+
+    def commit(self):
+        """ Write changes made since last commit to file. """
+        if self.__connection.in_transaction:
+            self.__connection.execute("COMMIT")
+
+    def close(self):
+        """ Close file, not committed changes are dropped. """
+        self.__connection.close()
+
+    def move(self, path):
+        """
+        Commit changes and move file to given path, replacing the file
+        that is there.
+        """
+        self.commit()
+        self.__connection.close()
+        os.replace(self.path, path)
+        self.path = path
+        self.__connection = self._connect(path, self._read_only)
+
+    def _begin(self):
+        """ Start transaction, if it is not started yet. """
+        if not self.__connection.in_transaction:
+            self.__connection.execute("BEGIN")
+
+    @staticmethod
+    def _sql_value(value):
+        """ Convert NumPy scalars to python values for SQLite. """
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+
+    def _add_fields(self, records):
+        """ Add columns for new fields of records, and note their types. """
+        for record in records:
+            for name, value in record.items():
+                if name == "_id":
+                    continue
+                if name not in self.__columns:
+                    is_bool = isinstance(value, (bool, np.bool_))
+                    position = self.__connection.execute(
+                        "INSERT INTO fields (name, is_bool) VALUES (?, ?)",
+                        (json.dumps(name), is_bool)).lastrowid
+                    column = f"c{position}"
+                    self.__connection.execute(
+                        f"ALTER TABLE records ADD COLUMN {column}")
+                    self.__columns[name] = column
+                    if is_bool:
+                        self.__bool_fields.add(name)
+                elif name in self.__bool_fields and value is not None \
+                        and not isinstance(value, (bool, np.bool_)):
+                    # field is not boolean anymore
+                    self.__connection.execute(
+                        "UPDATE fields SET is_bool = 0 WHERE name = ?",
+                        (json.dumps(name),))
+                    self.__bool_fields.discard(name)
+
+    def _upsert_sql(self):
+        """ Return SQL statement inserting or replacing whole record. """
+        columns = list(self.__columns.values())
+        placeholders = ", ".join("?" * (len(columns) + 1))
+        updates = ", ".join(f"{column} = excluded.{column}"
+                            for column in columns) or "_id = _id"
+        names = "".join(f", {column}" for column in columns)
+        return (f"INSERT INTO records (_id{names})"
+                f" VALUES ({placeholders})"
+                f" ON CONFLICT(_id) DO UPDATE SET {updates}")
+
+    def _record_row(self, _id, record):
+        """ Return values of SQL columns for record. """
+        return [self._sql_value(_id)] + [
+            self._sql_value(record.get(name)) for name in self.__columns]
+
+    def put(self, record, _id=None):
+        """
+        Put record in table. The behaviour is the same as for `Table`.
+
+        record: dict - record with `name: value` pairs
+        _id: key for record or `None`
+
+        returns: record ID
+        """
+        # check read only
+        self._check_read_only()
+        self._begin()
+
+        # write record
+        _id = self._record_id(record, _id)
+        self._add_fields([record])
+        is_new = not self._has_id(_id)
+        self.__connection.execute(
+            self._upsert_sql(), self._record_row(_id, record))
+        self._mark_put(_id, is_new=is_new)
+        self._log_put([_id], [record])
+        return _id
+
+    def put_many(self, records, ids=None):
+        """
+        Put many records in table at once, in one SQL statement. The
+        behaviour is the same as for `Table`.
+
+        records: iterable - records dicts with `name: value` pairs
+        ids: list/None - keys for records, see `Table.put_many`
+
+        returns: list of records IDs
+        """
+        # check read only
+        self._check_read_only()
+        self._begin()
+
+        # write records
+        records = list(records)
+        ids = self._bulk_ids(records, ids)
+        self._add_fields(records)
+        existing = self._existing_ids(ids)
+        self.__connection.executemany(
+            self._upsert_sql(),
+            (self._record_row(_id, record)
+             for _id, record in zip(ids, records)))
+        for _id in ids:
+            self._mark_put(_id, is_new=_id not in existing)
+            existing.add(_id)
+        self._log_put(ids, records)
+        return ids
+
+    def _existing_ids(self, ids):
+        """ Return set of given IDs which are present in table. """
+        return {_id for (_id,) in self.__connection.execute(
+            "SELECT _id FROM records WHERE _id IN "
+            "(SELECT value FROM json_each(?))", (self._json_ids(ids),))}
+
+    def _json_ids(self, ids):
+        """ Return IDs as JSON array, passed to SQL as one parameter. """
+        return json.dumps([self._sql_value(_id) for _id in ids])
+
+    def _column(self, name):
+        """ Return SQL expression of field value, `NULL` if missing. """
+        return self.__columns.get(name, "NULL")
+
+    def _condition_sql(self, column, condition):
+        """
+        Translate condition of field to SQL expression and parameters.
+        The results are the same as of `check_value`.
+        """
+        operators = query_operators(condition)
+        if operators is None:
+            operators = {"$eq": condition}
+        expressions = []
+        params = []
+        for operator_name, argument in operators.items():
+            argument = self._sql_value(argument)
+            if operator_name == "$exists":
+                expressions.append(f"{column} IS "
+                                   f"{'NOT ' if argument else ''}NULL")
+            elif operator_name == "$ne":
+                if not isinstance(argument, (int, float, str)):
+                    continue
+                expressions.append(f"({column} IS NULL OR {column} != ?)")
+                params.append(argument)
+            elif operator_name == "$in":
+                items = [self._sql_value(item) for item in argument]
+                items = [item for item in items
+                         if isinstance(item, (int, float, str))]
+                expressions.append(
+                    f"{column} IN ({', '.join('?' * len(items))})")
+                params += items
+            elif isinstance(argument, str):
+                sign = "=" if operator_name == "$eq" \
+                    else SQL_COMPARISONS[operator_name]
+                expressions.append(
+                    f"({column} {sign} ? AND typeof({column}) = 'text')")
+                params.append(argument)
+            elif isinstance(argument, (int, float)):
+                sign = "=" if operator_name == "$eq" \
+                    else SQL_COMPARISONS[operator_name]
+                expressions.append(
+                    f"({column} {sign} ? AND "
+                    f"typeof({column}) IN ('integer', 'real'))")
+                params.append(argument)
+            else:
+                # other values never match
+                expressions.append("0")
+        return expressions, params
+
+    def _where_sql(self, query, subset=None):
+        """
+        Translate query to SQL `FROM` and `WHERE` clauses and list of
+        parameters. Records of `subset` list of IDs are in its order.
+        """
+        expressions = []
+        params = []
+        for field, condition in query.items():
+            field_expressions, field_params = self._condition_sql(
+                self._column(field), condition)
+            expressions += field_expressions
+            params += field_params
+        where = " AND ".join(expressions) or "1"
+        if subset is None:
+            return f"FROM records WHERE {where} ORDER BY rowid", params
+        return (f"FROM json_each(?) AS subset JOIN records "
+                f"ON records._id = subset.value WHERE {where} "
+                f"ORDER BY subset.key", [self._json_ids(subset)] + params)
+
+    def _select(self, query, fields=None, subset=None, limit=None):
+        """
+        Return list of IDs and dicts of values of given fields (all by
+        default) of records matching the query.
+        """
+        fields = list(self.__columns) if fields is None \
+            else [field for field in fields if field in self.__columns]
+        columns = "".join(f", records.{self.__columns[field]}"
+                          for field in fields)
+        sql, params = self._where_sql(query, subset)
+        sql = f"SELECT records._id{columns} {sql}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        results = []
+        for row in self.__connection.execute(sql, params):
+            results.append((row[0], self._row_dict(fields, row[1:])))
+        return results
+
+    def _row_dict(self, fields, values):
+        """ Make record dict from values of fields, skipping missing. """
+        record = {}
+        for field, value in zip(fields, values):
+            if value is not None:
+                if field in self.__bool_fields:
+                    value = bool(value)
+                record[field] = value
+        return record
+
+    @staticmethod
+    def _result_fields(fields):
+        """ Return fields needed in results, `None` for all. """
+        if fields is None:
+            return None
+        if isinstance(fields, str):
+            return [fields]
+        if isinstance(fields, list):
+            return fields
+        raise TypeError(f"`fields` should be of one of types: "
+                        f"`None`, `str` or `list`. got: {type(fields)}")
+
+    @staticmethod
+    def _result(_id, record, fields):
+        """ Make result of `find` for single record. """
+        if fields is None:
+            return _id, record
+        record = dict(record, _id=_id)
+        if isinstance(fields, str):
+            return record.get(fields)
+        return [record.get(field) for field in fields]
+
+    def __getitem__(self, _id):
+        results = self._select({}, subset=[_id])
+        if not results:
+            raise KeyError(_id)
+        return results[0][1]
+
+    def find(self, query, fields=None):
+        """
+        Find all records matching the query. See `Table.find`.
+        """
+        return self._logged("find", query, None, self._find, query, fields)
+
+    def _find(self, query, fields, subset=None, plan=None):
+        results = self._select(query, self._result_fields(fields), subset)
+        if fields is None:
+            return dict(results)
+        return [self._result(_id, record, fields)
+                for _id, record in results]
+
+    def find_one(self, query, fields=None):
+        """
+        Find only one record - the first matching the query. See
+        `Table.find_one`.
+        """
+        return self._logged("find_one", query, None,
+                            self._find_one_with_fields, query, fields)
+
+    def _find_one_with_fields(self, query, fields, subset=None, plan=None):
+        results = self._select(
+            query, self._result_fields(fields), subset, limit=1)
+        if not results:
+            return None
+        return self._result(*results[0], fields)
+
+    def create_index(self, fields, kind="hash"):
+        """
+        Create SQL index on a field or on a list of fields. Both kinds
+        of indexes are the same SQL indexes, which serve also range
+        conditions. Indexes are kept in the SQLite file, so they cannot
+        be created for read only table.
+
+        fields: str/list - name of field or names of fields for
+            compound index
+        kind: str - "hash" or "sorted"
+        """
+        if kind not in INDEX_KINDS:
+            raise ValueError('`kind` should be one of: "hash" or "sorted"')
+        fields = self._index_fields(fields)
+        if fields in self._sql_indexes():
+            return
+        self._check_read_only()
+        self._begin()
+        self._add_fields([{field: None for field in fields}])
+        columns = [self._column(field) for field in fields]
+        self.__connection.execute(
+            f'CREATE INDEX "index_{"_".join(columns)}" '
+            f'ON records ({", ".join(columns)})')
+        self._indexes_changed = True
+
+    def drop_index(self, fields):
+        """
+        Remove index made on given field or fields.
+
+        fields: str/list - name of field or names of fields
+        """
+        self._check_read_only()
+        fields = self._index_fields(fields)
+        index_name = self._sql_indexes()[fields]
+        self._begin()
+        self.__connection.execute(f'DROP INDEX "{index_name}"')
+        self._indexes_changed = True
+
+    def _sql_indexes(self):
+        """ Return dict of fields of indexes and names of SQL indexes. """
+        names = {column: name for name, column in self.__columns.items()}
+        indexes = {}
+        for (index_name,) in self.__connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' "
+                "AND tbl_name = 'records' AND name LIKE 'index_%'"):
+            columns = index_name[len("index_"):].split("_")
+            indexes[tuple(names[column] for column in columns)] = index_name
+        return indexes
+
+    def _search_plan(self, query, subset=None):
+        # SQLite plans searching itself, the plan is made for logging
+        # only when the query is slow
+        return None
+
+    def _plan(self, query, subset=None):
+        """
+        Tell how SQLite searches records matching the query, using its
+        `EXPLAIN QUERY PLAN`. Number of scanned records is known only
+        when all of them (or the subset) are scanned.
+        """
+        sql, params = self._where_sql(query, subset)
+        details = [row[-1] for row in self.__connection.execute(
+            f"EXPLAIN QUERY PLAN SELECT records._id {sql}", params)]
+        names = {name: fields for fields, name in self._sql_indexes().items()}
+        for detail in details:
+            for word in detail.split():
+                if word in names:
+                    method = "subset" if subset is not None else "index"
+                    return {"method": method, "index": names[word],
+                            "scanned": None, "ids": None}
+        if subset is not None:
+            return {"method": "subset", "index": None,
+                    "scanned": len(subset), "ids": None}
+        (count,) = self.__connection.execute(
+            "SELECT COUNT(*) FROM records").fetchone()
+        return {"method": "scan", "index": None, "scanned": count,
+                "ids": None}
+
+    def index_groups(self, fields):
+        """
+        Return all values of given field (or tuples of values for
+        list of fields) with lists of IDs of records that have these
+        values. See `BaseTable.index_groups`.
+        """
+        if not self._read_only:
+            self.create_index(fields)
+        index_fields = self._index_fields(fields)
+        groups = {}
+        query = {field: {"$exists": True} for field in index_fields}
+        for _id, record in self._select(query, list(index_fields)):
+            key = tuple(record[field] for field in index_fields)
+            groups.setdefault(key, []).append(_id)
+        if isinstance(fields, str):
+            groups = {key[0]: ids for key, ids in groups.items()}
+        return groups
 
-    def to_df(self):
+    def to_df(self, ids=None):
         """
         Convert table to DataFrame.
 
+        ids: list/None - IDs of records to be converted, all by default
+
         returns: pandas.DataFrame
         """
-        # check read only
-        if self.__read_only:
-            raise IOError("Table is for read only.")
+        results = self._select({}, subset=ids)
+        all_rows = np.arange(len(results))
+        columns = {}
+        for name in self.__columns:
+            present = np.array([name in record for _, record in results],
+                               dtype=bool)
+            if not present.any():
+                continue
+            values = [record[name] for _, record in results
+                      if name in record]
+            column = Column.empty(len(results), values[0])
+            column.set_many(all_rows[present], values)
+            columns[name] = column
+        record_ids = np.empty(len(results), dtype=object)
+        record_ids[:] = [_id for _id, _ in results]
+        return self._columns_to_df(record_ids, columns)
 
-        # convert data to dicts
-        data = dict(record.to_id_dict()
-                    for record in self.__data.values())
+    def _has_id(self, _id):
+        return self.__connection.execute(
+            "SELECT 1 FROM records WHERE _id = ?",
+            (self._sql_value(_id),)).fetchone() is not None
 
-        # make data frame
-        df = pd.DataFrame(data).T
-        df.index.name = "_id"
-        return df
+    def _ids(self):
+        return [_id for (_id,) in self.__connection.execute(
+            "SELECT _id FROM records ORDER BY rowid")]
 
-    def put(self, record, _id=None, __force=False):
-        """
-        Put record in table. Note that `_id` is not stored in record
-        dict, but as a record key in table. The `_id` can be however
-        passed in record dict - it will be popped from it and used as
-        a record ID. However the explicit passing of `_id` argument has
-        the priority.
+    def _is_empty(self):
+        return not self.__connection.execute(
+            "SELECT 1 FROM records LIMIT 1").fetchone()
 
-        record: dict - record with `name: value` pairs
-        _id: key for record or `None`
+    def _field_names(self):
+        return list(self.__columns)
 
-        returns: record ID
-        """
-        # check read only
-        if self.__read_only and not __force:
-            raise IOError("Table is for read only.")
+    def _rows_chunks(self, fields, chunk_size):
+        cursor = self.__connection.execute(
+            f"SELECT _id{''.join(', ' + self._column(f) for f in fields)} "
+            f"FROM records ORDER BY rowid")
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield [[row[0]] + [
+                bool(value) if value is not None
+                and field in self.__bool_fields else value
+                for field, value in zip(fields, row[1:])] for row in rows]
 
-        # make record
-        record = Record.from_dict(record, _id)
+    def _aggregation_data(self, query, fields, subset=None):
+        # values are read as columns, without making record dicts
+        fields = [field for field in fields if field in self.__columns]
+        columns = "".join(f", records.{self.__columns[field]}"
+                          for field in fields)
+        sql, params = self._where_sql(query, subset)
+        rows = self.__connection.execute(
+            f"SELECT records._id{columns} {sql}", params).fetchall()
+        data = {}
+        for i, field in enumerate(fields, start=1):
+            column = [row[i] for row in rows]
+            present = np.array([value is not None for value in column],
+                               dtype=bool)
+            if field in self.__bool_fields:
+                column = [value if value is None else bool(value)
+                          for value in column]
+            values = np.empty(len(rows), dtype=object)
+            values[:] = column
+            data[field] = (values, present)
+        return len(rows), data
 
-        # add record to data
-        _id = record._id
-        self.__data[_id] = record
-        return _id
+    def _subset(self, ids):
+        return list(ids)
+
+    def _memory_size(self):
+        # records are not kept in memory
+        return 0
+
+
+class TableView:
+    """
+    `TableView` gives read only access to records of table with given
+    IDs, with the same methods for reading records as tables have.
+    Records are not copied - they are read from the table when they
+    are searched, and the results are made the same way as in table.
+    Records are ordered as the given IDs, repeated IDs are skipped.
+    """
+    def __init__(self, table, ids):
+        ids = list(dict.fromkeys(ids))
+        self.__table = table
+        self.__ids = set(ids)
+        self.__subset = table._subset(ids)
 
     def __getitem__(self, _id):
-        return self.__data[_id].to_dict()
+        if _id not in self.__ids:
+            raise KeyError(_id)
+        return self.__table[_id]
 
     def find(self, query, fields=None):
-        """
-        Find all records matching the query.
+        """ Find all records matching the query. See `Table.find`. """
+        return self.__table._logged(
+            "find", query, self.__subset, self.__table._find,
+            query, fields, self.__subset)
 
-        query: dict - dictionary with fields and values to be matched
-            in searched records
-        fields: key/list/None - keys that has to be included in results
+    def find_one(self, query, fields=None):
+        """ Find the first record matching the query. See `Table.find_one`. """
+        return self.__table._logged(
+            "find_one", query, self.__subset,
+            self.__table._find_one_with_fields, query, fields, self.__subset)
 
-        returns:
-            dict - if `fields` is None
-            list - when `fields` specified
-        """
-        # get records matching query
-        records = [rec for rec in self.__data.values()
-                   if rec.check_condition(query)]
+    def explain(self, query):
+        """ Tell how records are searched. See `BaseTable.explain`. """
+        return self.__table._explain(query, self.__subset)
 
-        # handle `fields` argument
-        if fields is None:
-            # return raw results if fields not given
-            results = dict(rec.to_id_dict() for rec in records)
-        elif isinstance(fields, str):
-            # chose one value from each record
-            results = [rec[fields] for rec in records]
-        elif isinstance(fields, list):
-            # chose only values matching given fields
-            results = [rec.get_fields_list(fields) for rec in records]
-        else:
-            raise TypeError(f"`fields` should be of one of types: "
-                            f"`None`, `str` or `list`. got: {type(fields)}")
+    def aggregate(self, group_by=None, sums=None, count=False, query=None):
+        """ Sum values of fields. See `BaseTable.aggregate`. """
+        return self.__table._aggregate(
+            group_by, sums, count, query, self.__subset)
 
-        return results
+    def put(self, record, _id=None):
+        raise IOError("Table is for read only.")
 
-    def _find_one(self, query):
-        for record in self.__data.values():
-            if record.check_condition(query):
-                return record
+    def put_many(self, records, ids=None):
+        raise IOError("Table is for read only.")
 
-    def find_one(self, query, fields=None):
-        """
-        Find only one record - the first matching the query.
 
-        query: dict - dictionary with fields and values to be matched
-            in searched records
-        fields: key/list/None - keys that has to be included in results
+class DbView:
+    """
+    `DbView` gives read only access to part of DB - to tables given
+    by names, each restricted to records with given IDs. Tables are
+    accessed with square brackets, like in `DbDriver`, and they are
+    `TableView` objects, made when they are used for the first time.
 
-        returns:
-            None - if record not found
-            (_id, dict) tuple - when `fields` is None
-            single value - if `fields` specify single key name
-            list - if `fields` is a list of keys
-        """
-        # get raw result
-        record = self._find_one(query)
-        # if no result found
-        if record is None:
-            return None
-        # handle `fields` parameter
-        if fields is None:
-            # if fields not given - return raw result
-            result = record.to_id_dict()
-        elif isinstance(fields, str):
-            # chose one value
-            result = record[fields]
-        elif isinstance(fields, list):
-            # chose only values matching given fields
-            result = record.get_fields_list(fields)
-        else:
-            raise TypeError(f"`fields` should be of one of types: "
-                            f"`None`, `str` or `list`. got: {type(fields)}")
-        return result
+    Numbers of votes of the territorial unit, if given, are available
+    as `votes` attribute. They are given as function returning them,
+    called when the attribute is used for the first time.
+    """
+    def __init__(self, db, tables_and_ids, votes=None):
+        self.__db = db
+        self.__tables_and_ids = tables_and_ids
+        self.__views = {}
+        self.__get_votes = votes
+        self.__votes = None
+
+    def __getitem__(self, name):
+        view = self.__views.get(name)
+        if view is None:
+            ids = self.__tables_and_ids[name]
+            view = TableView(self.__db[name], ids)
+            self.__views[name] = view
+        return view
+
+    @property
+    def read_only(self):
+        return True
+
+    @property
+    def votes(self):
+        if self.__votes is None and self.__get_votes is not None:
+            self.__votes = self.__get_votes()
+        return self.__votes
+
+
+def _json_value(value):
+    """
+    Convert NumPy scalars to python values, used as `default` of
+    `json.dumps` for values it cannot write.
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Value of type {type(value)} cannot be written as "
+                    f"JSON.")
+
+
+def _field_names(columns, keys="uuid"):
+    """
+    Return list of names of fields from header of `csv` file. In DB
+    with integer keys, names made of digits are IDs of records of
+    other table, and they are converted to integers.
+    """
+    if keys != "int":
+        return list(columns)
+    return [int(name) if isinstance(name, str) and name.isdecimal()
+            else name for name in columns]
+
+
+def _table_class(layout):
+    """ Return class of tables used for given layout of DB. """
+    if layout == "columns":
+        return ColumnarTable
+    if layout == "compact":
+        return CompactTable
+    return Table
 
 
 class DbDriver:
@@ -360,22 +3033,131 @@ class DbDriver:
     accesing for the first time via the square brackets. It prevents
     from always loading big, unnecesary tables.
 
-    The `dump_tables` method will save changes to harddrive.
+    The `dump_tables` method will save changes to harddrive. Indexes
+    of tables are saved in `idx` files (NumPy `npz` archives) next to
+    `csv` files, and they are attached to tables when loading, instead
+    of being rebuilt. The `idx` file is ignored if the `csv` file
+    changed after saving it.
     NOTE: when ending work with DbDriver, the changes will not be
     saved automatically. Each time the work needs to be saved - the
     `dump_tables` method must be called.
+
+    The `storage_format` parameter chooses the format in which tables
+    are saved by `dump_tables`: "csv" files or "npt" directories
+    (NumPy table - `npy` file for each column, see `_dump_npt`) or
+    "sqlite" files. Tables are loaded from files of any of these
+    formats, which is recognized by extension. `convert_tables` saves
+    whole DB in other format.
+
+    Tables in "sqlite" format are not loaded to memory - they are
+    `SqliteTable` instances, which read records from file when they
+    are searched, whatever the `layout` is. Changes of them are
+    committed by `dump_tables`, and new table is kept in temporary
+    file until then.
+
+    Tables of read-only DB in "npt" format and "columns" layout are
+    memory-mapped - they are read from disk only when accessed, and
+    the memory is shared between processes opening the same DB.
+
+    The `layout` parameter chooses how tables are kept in memory:
+    "rows" makes `Table` instances (dict of records), "columns"
+    makes `ColumnarTable` instances (typed arrays for each field),
+    and "compact" makes `CompactTable` instances (records as tuples
+    of values sharing names of fields). All have the same interface.
+
+    The `keys` parameter chooses IDs given to new records: "uuid"
+    makes pretended UUIDs (random hex strings), and "int" makes dense
+    integer keys, numbered from 0 in each table. Integer keys take
+    less memory and space in files, also as values of fields which
+    refer to records of other tables. In DB with integer keys, names
+    of `csv` columns made of digits are read as integers, since they
+    are integer IDs of records of other table (like candidates in
+    voting results). DB opened for writing with "int" keys notes it
+    in metadata file in its directory, so when `keys` is not given,
+    DB is opened with the keys it was made with ("uuid" if there is
+    no metadata).
+
+    Loaded tables are kept in memory until the `DbDriver` is deleted.
+    If `memory_budget` is given, the approximate memory size of loaded
+    tables is checked whenever a table is loaded, and the least
+    recently used tables without unsaved changes are unloaded, until
+    the tables fit the budget. Unloaded table is loaded again on next
+    access, unless it is still used somewhere - then it is taken back.
+
+    If `slow_query_time` is given, `find` and `find_one` calls of
+    tables that take at least this number of seconds are logged in
+    `slow_queries` list, with name of table, the query, its plan (see
+    `BaseTable.explain`) and time. `slow_queries_summary` tells which
+    kinds of queries took the most time in total.
+
+    Tables are saved so that interrupted saving does not leave broken
+    files - new file is written next to the old one and replaces it
+    when it is ready, and rows appended to `csv` file are cut off when
+    DB is opened for writing after crash. If `wal` is `True`, changes
+    of tables (`put`, `put_many`, `create_table` and `delete_table`)
+    are also appended to write-ahead log file in DB directory. When
+    DB is opened for writing again, the changes from the log, that
+    were not saved by `dump_tables`, are made again. Saving all tables
+    with `dump_tables` is a checkpoint - the log is cleared. DB opened
+    for reading ignores the log.
     """
-    def __init__(self, db_directory, limit=None, read_only=False):
+    memory_budget = None
+    slow_query_time = None
+    wal = False
+
+    def __init__(self, db_directory, limit=None, read_only=False,
+                 layout="rows", storage_format="csv", progress=None,
+                 keys=None, memory_budget=None, slow_query_time=None,
+                 wal=False):
         """
         db_directory: str - directory which contains DB tables
         limit: int/None - max numbers of records to be loaded to each table
         read_only: bool - whether to protect DB from changes
+        layout: str - "rows", "columns" or "compact", the storage of
+            tables in memory
+        storage_format: str - "csv", "npt" or "sqlite", format of saved
+            tables
+        progress: callable/None - function called while loading csv
+            file with table name, number of bytes read and file size;
+            by default progress is printed for big files only
+        keys: str/None - "uuid" or "int", the kind of IDs of new
+            records and of names of `csv` columns made of digits; by
+            default the kind noted in metadata of DB is used
+        memory_budget: int/None - approximate number of bytes of memory
+            for loaded tables, no limit by default
+        slow_query_time: float/None - minimal time of queries (in
+            seconds) logged in `slow_queries`, no queries are logged
+            by default
+        wal: bool - whether to log changes of tables in write-ahead log,
+            to make them again if DB is not saved because of crash
         """
+        if layout not in LAYOUTS:
+            raise ValueError(
+                '`layout` should be one of: "rows", "columns" or "compact"')
+        if storage_format not in STORAGE_FORMATS:
+            raise ValueError(
+                '`storage_format` should be one of: "csv", "npt" or "sqlite"')
+        if keys is not None and keys not in KEYS:
+            raise ValueError('`keys` should be one of: "uuid" or "int"')
+
         # initialize attributes
         self.delete_access_code = None
         self.limit = limit
+        self.layout = layout
+        self.storage_format = storage_format
+        self.progress = progress
+        self.keys = keys
+        self.memory_budget = memory_budget
+        self.slow_query_time = slow_query_time
+        self.slow_queries = []
+        self.wal = wal
+        self.__wal_file = None
         self.__read_only = read_only
         self.__dropped_tables = []
+        self.__formats = {}
+        # names of loaded tables from least recently used
+        self.__used = {}
+        self.__unloaded = {}
 
         # TODO - consider adding option "local"/None or something
         # that will indicate the DB is only in runtime memory, not
@@ -385,6 +3167,8 @@ class DbDriver:
 
         if os.path.exists(db_directory):
             # load existing directory
+            if not self.__read_only:
+                self._recover_files()
             self._load_table_names()
         else:
             # create new directory if not read_only
@@ -392,17 +3176,120 @@ class DbDriver:
                 raise IOError("DB for read does not exist.")
             os.makedirs(db_directory, exist_ok=True)
 
+        # kind of keys of DB
+        saved_keys = self._load_metadata().get("keys", "uuid")
+        if self.keys is None:
+            self.keys = saved_keys
+        elif self.keys != saved_keys and self.keys == "int" \
+                and not self.__read_only:
+            self._dump_metadata({"keys": self.keys})
+
+        # make changes from log again and continue logging
+        if self.wal and not self.__read_only:
+            self._replay_wal()
+            self.__wal_file = open(self._wal_path(), "ab")
+
     def __getitem__(self, name):
         table = self.__tables[name]
         if table is None:
             table = self._load_table(name)
+        elif self.memory_budget is not None:
+            self._mark_used(name)
+        return table
+
+    def table(self, name, columns=None):
+        """
+        Return table like square brackets do, but if the table is not
+        loaded yet - read only given columns from file. Other fields
+        are read later, at first time they are needed by the table.
+
+        name: str - name of table
+        columns: list/None - names of fields to be loaded, all fields
+            by default
+
+        returns: Table/ColumnarTable
+        """
+        table = self.__tables[name]
+        if table is None:
+            return self._load_table(name, columns=columns)
+        if self.memory_budget is not None:
+            self._mark_used(name)
+        if columns is not None:
+            table._widen(columns)
         return table
 
+    def _mark_used(self, name):
+        """ Move table to the end of least recently used order. """
+        self.__used.pop(name, None)
+        self.__used[name] = None
+
+    def _keep_memory_budget(self, name=None):
+        """
+        Unload least recently used tables, that have no unsaved changes,
+        until the loaded tables fit the `memory_budget`. The table with
+        given name, which is just used, is marked as used and kept.
+        """
+        if self.memory_budget is None:
+            return
+        if name is not None:
+            self._mark_used(name)
+        sizes = {used_name: self.__tables[used_name]._memory_size()
+                 for used_name in self.__used}
+        total_size = sum(sizes.values())
+        for used_name in list(self.__used):
+            if total_size <= self.memory_budget:
+                break
+            table = self.__tables[used_name]
+            if used_name == name or table._dirty or table._indexes_changed:
+                continue
+            # keep reference, in case the table is still used somewhere
+            self.__unloaded[used_name] = weakref.ref(table)
+            self.__tables[used_name] = None
+            self.__used.pop(used_name)
+            total_size -= sizes[used_name]
+
+    def _take_back(self, name):
+        """
+        Take back unloaded table, if it is still used somewhere.
+
+        returns: bool - if the table was taken back
+        """
+        reference = self.__unloaded.pop(name, None)
+        table = None if reference is None else reference()
+        if table is None:
+            return False
+        self.__tables[name] = table
+        self._keep_memory_budget(name)
+        return True
+
     def _filepath(self, name):
         filename = f"{name}.csv"
         filepath = os.path.join(self.db_directory, filename)
         return filepath
 
+    def _npt_path(self, name):
+        dirname = f"{name}.{NPT_EXTENSION}"
+        dirpath = os.path.join(self.db_directory, dirname)
+        return dirpath
+
+    def _sqlite_path(self, name):
+        filename = f"{name}.{SQLITE_EXTENSION}"
+        filepath = os.path.join(self.db_directory, filename)
+        return filepath
+
+    def _table_path(self, name):
+        """ Return path of file with table data, in format of table. """
+        if self.__formats.get(name) == "npt":
+            return os.path.join(self._npt_path(name), "meta.json")
+        if self.__formats.get(name) == "sqlite":
+            return self._sqlite_path(name)
+        return self._filepath(name)
+
+    def _index_filepath(self, name):
+        filename = f"{name}.idx"
+        filepath = os.path.join(self.db_directory, filename)
+        return filepath
+
     @property
     def read_only(self):
         """ Return the value of `read_only` parameter. """
@@ -412,22 +3299,124 @@ class DbDriver:
         # list files in directory
         for filename in os.listdir(self.db_directory):
             # check extension
-            if not any(filename.endswith("."+ext) for ext in EXTENSIONS):
+            if filename.endswith("." + NPT_EXTENSION):
+                storage_format = "npt"
+            elif filename.endswith("." + SQLITE_EXTENSION):
+                storage_format = "sqlite"
+            elif any(filename.endswith("."+ext) for ext in EXTENSIONS):
+                storage_format = "csv"
+            else:
                 continue
             # create table entry
             name = os.path.splitext(filename)[0]
             self.__tables[name] = None
+            # if table is saved in two formats - prefer format of DB
+            if self.__formats.get(name) != self.storage_format:
+                self.__formats[name] = storage_format
 
     @staticmethod
-    def _load_csv(filepath):
-        try:
-            # if there is index column in csv file
-            table_df = pd.read_csv(filepath, sep=";", index_col="_id")
-        except ValueError:
-            # if the index column is not present in csv file
-            table_df = pd.read_csv(filepath, sep=";")
-            table_df.index.name = "_id"
-        return table_df
+    def _load_csv_chunks(filepath, limit=None, progress=None, usecols=None,
+                         keys="uuid"):
+        """
+        Read csv file in chunks of `CSV_CHUNK_SIZE` rows. The reading
+        stops when `limit` of rows is reached.
+
+        filepath: str - path of csv file
+        limit: int/None - max numbers of rows to be read
+        progress: callable/None - function called after each chunk
+            with number of bytes read and size of file
+        usecols: callable/None - filter of names of columns to be read
+        keys: str - kind of keys of DB, names of columns made of digits
+            are converted to integers for "int" keys
+
+        yields: pandas.DataFrame - chunks with "_id" index
+        """
+        # check if there is index column in csv file
+        header = pd.read_csv(filepath, sep=";", nrows=0)
+        index_col = "_id" if "_id" in header.columns else None
+        file_size = os.path.getsize(filepath)
+        # read chunks
+        with open(filepath, "rb") as f:
+            reader = pd.read_csv(f, sep=";", index_col=index_col,
+                                 usecols=usecols, chunksize=CSV_CHUNK_SIZE,
+                                 nrows=limit)
+            for chunk_df in reader:
+                chunk_df.index.name = "_id"
+                chunk_df.columns = _field_names(chunk_df.columns, keys)
+                if progress is not None:
+                    progress(f.tell(), file_size)
+                yield chunk_df
+
+    @staticmethod
+    def _print_progress(name, loaded_size, file_size):
+        percent = 100 * loaded_size // max(file_size, 1)
+        print(f"Loading DB table `{name}`... {percent}%")
+
+    @staticmethod
+    def _dump_npt(table_df, dirpath):
+        """
+        Save table as NumPy table - a directory with `npy` files for
+        IDs and for each column (values and mask of present values),
+        and a `meta.json` file with names and types of columns. The
+        `meta.json` file is written last. Files are written to new
+        directory, which replaces the old one when it is ready.
+        """
+        # make temporary directory
+        final_dirpath = dirpath
+        dirpath = final_dirpath + ".new"
+        if os.path.exists(dirpath):
+            shutil.rmtree(dirpath)
+        os.makedirs(dirpath)
+
+        # save IDs and columns
+        n = len(table_df)
+        ids = Column.from_series(table_df.index.to_series())
+        ids_kind = ids.save(os.path.join(dirpath, "ids"), n)
+        columns_meta = []
+        for i, name in enumerate(table_df.columns):
+            column = Column.from_series(table_df[name])
+            kind = column.save(os.path.join(dirpath, str(i)), n)
+            columns_meta.append({"name": name, "kind": kind})
+
+        # save metadata
+        meta = {"length": n, "ids_kind": ids_kind, "columns": columns_meta}
+        with open(os.path.join(dirpath, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+        # replace old directory, it is removed when new one is in place
+        old_dirpath = final_dirpath + ".old"
+        if os.path.exists(old_dirpath):
+            shutil.rmtree(old_dirpath)
+        if os.path.exists(final_dirpath):
+            os.rename(final_dirpath, old_dirpath)
+        os.rename(dirpath, final_dirpath)
+        if os.path.exists(old_dirpath):
+            shutil.rmtree(old_dirpath)
+
+    @staticmethod
+    def _load_npt(dirpath, limit=None, mmap_mode=None, usecols=None):
+        """
+        Load table saved by `_dump_npt`. If `mmap_mode` is given, the
+        columns are memory-mapped (except of columns of mixed types,
+        which are always read). `usecols` is filter of names of
+        columns to be loaded.
+
+        returns: (numpy.ndarray, dict) - IDs and `Column` objects
+        """
+        with open(os.path.join(dirpath, "meta.json")) as f:
+            meta = json.load(f)
+        ids = Column.load(os.path.join(dirpath, "ids"),
+                          meta["ids_kind"], limit=limit)
+        ids = ids.values.astype(object)
+        columns = {}
+        for i, column_meta in enumerate(meta["columns"]):
+            if usecols is not None and not usecols(column_meta["name"]):
+                continue
+            kind = column_meta["kind"]
+            columns[column_meta["name"]] = Column.load(
+                os.path.join(dirpath, str(i)), kind, limit=limit,
+                mmap_mode=mmap_mode if kind != "object" else None)
+        return ids, columns
 
     @staticmethod
     def _load_excel(filepath):
@@ -452,31 +3441,436 @@ class DbDriver:
             table_df = table_df.set_index("_id")
         return table_df
 
-    def _load_table(self, name):
+    @staticmethod
+    def _usecols(columns):
+        """ Make filter of names of columns to be loaded. """
+        columns = {str(name) for name in columns}
+        return lambda name: name == "_id" or str(name) in columns
+
+    def _columns_loader(self, name):
+        """
+        Return function that loads chosen columns of table from file,
+        used for loading fields of table that were not loaded at once.
+        """
+        def loader(usecols):
+            if self.__formats.get(name) == "npt":
+                ids, columns = self._load_npt(
+                    self._npt_path(name), limit=self.limit, usecols=usecols)
+                return ColumnarTable._columns_to_df(ids, columns)
+            table_dfs = list(self._load_csv_chunks(
+                self._filepath(name), limit=self.limit, usecols=usecols,
+                keys=self.keys))
+            return pd.concat(table_dfs) if table_dfs else pd.DataFrame()
+        return loader
+
+    def _set_up_table(self, name, table):
+        """ Set options of DB for new or loaded table. """
+        table.keys = self.keys
+        if self.wal:
+            table.put_log = functools.partial(self._log_puts, name)
+        if self.slow_query_time is not None:
+            table.slow_query_time = self.slow_query_time
+            table.query_log = functools.partial(self._log_query, name)
+
+    def _wal_path(self):
+        return os.path.join(self.db_directory, WAL_FILENAME)
+
+    def _metadata_path(self):
+        return os.path.join(self.db_directory, METADATA_FILENAME)
+
+    def _load_metadata(self):
+        """ Return dict of metadata of DB, empty if there is no file. """
+        if not os.path.exists(self._metadata_path()):
+            return {}
+        with open(self._metadata_path()) as f:
+            return json.load(f)
+
+    def _dump_metadata(self, metadata):
+        """ Save dict of metadata of DB, replacing file at once. """
+        temp_path = self._metadata_path() + ".new"
+        with open(temp_path, "w") as f:
+            json.dump(metadata, f)
+        os.replace(temp_path, self._metadata_path())
+
+    def _log_change(self, change):
+        """
+        Append change to write-ahead log, if it is open. Changes are
+        lists of operation name, table name and arguments, written as
+        lines of JSON.
+        """
+        if self.__wal_file is None:
+            return
+        line = json.dumps(change, default=_json_value) + "\n"
+        self.__wal_file.write(line.encode("utf-8"))
+        self.__wal_file.flush()
+
+    def _log_puts(self, name, ids, records):
+        # records are written as pairs of field name and value, as
+        # names of fields can be integers - without "_id", which is
+        # written in list of IDs, so all kinds of tables log the same
+        records = [[(field, value) for field, value in record.items()
+                    if field != "_id"] for record in records]
+        self._log_change(["put", name, ids, records])
+
+    def _replay_wal(self):
+        """
+        Make changes from write-ahead log again. The last change can
+        be cut by crash - it is skipped and removed from the log.
+        """
+        wal_path = self._wal_path()
+        if not os.path.exists(wal_path):
+            return
+        position = 0
+        with open(wal_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    change = json.loads(line)
+                except ValueError:
+                    break
+                position += len(line)
+                operation, name, *args = change
+                if operation == "create":
+                    self.create_table(name)
+                elif operation == "delete":
+                    if name in self.__tables:
+                        self.delete_table(name)
+                elif operation == "put":
+                    ids, records = args
+                    self[name].put_many([dict(pairs) for pairs in records],
+                                        ids=ids)
+        os.truncate(wal_path, position)
+
+    def _checkpoint_wal(self):
+        """ Clear write-ahead log, after all changes are saved. """
+        if self.__wal_file is not None:
+            self.__wal_file.seek(0)
+            self.__wal_file.truncate()
+
+    def _recover_files(self):
+        """
+        Clean up after saving interrupted by crash: remove unfinished
+        temporary files, restore NumPy tables that were moved aside
+        and cut off rows partially appended to `csv` files. Only files
+        named like the ones made by saving tables are touched.
+        """
+        saved_extensions = (".csv", f".{NPT_EXTENSION}",
+                            f".{SQLITE_EXTENSION}", ".idx", ".csv.append")
+        for filename in os.listdir(self.db_directory):
+            path = os.path.join(self.db_directory, filename)
+            if filename.endswith(".new") \
+                    and (filename[:-len(".new")].endswith(saved_extensions)
+                         or filename == METADATA_FILENAME + ".new"):
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            elif filename.endswith(f".{NPT_EXTENSION}.old") \
+                    and os.path.isdir(path):
+                if os.path.exists(path[:-len(".old")]):
+                    shutil.rmtree(path)
+                else:
+                    os.rename(path, path[:-len(".old")])
+            elif filename.endswith(".csv.append"):
+                with open(path) as f:
+                    size = int(f.read())
+                os.truncate(path[:-len(".append")], size)
+                os.remove(path)
+
+    def _log_query(self, name, entry):
+        entry["table"] = name
+        self.slow_queries.append(entry)
+
+    def slow_queries_summary(self):
+        """
+        Sum logged slow queries of each kind - with the same table,
+        method and fields and operators of query (values do not
+        matter), so repeated queries are counted together.
+
+        returns:
+            list - of dicts with `table`, `method`, `query` fields (and
+                sorted operators, if used), `plan`, `count` of queries
+                and `time` in total, starting from the longest time
+        """
+        kinds = {}
+        for entry in self.slow_queries:
+            query_kind = tuple(
+                (field,) + tuple(sorted(query_operators(condition) or ()))
+                for field, condition in entry["query"].items())
+            key = (entry["table"], entry["method"], query_kind, entry["plan"])
+            kind = kinds.get(key)
+            if kind is None:
+                kind = {"table": entry["table"], "method": entry["method"],
+                        "query": query_kind, "plan": entry["plan"],
+                        "count": 0, "time": 0}
+                kinds[key] = kind
+            kind["count"] += 1
+            kind["time"] += entry["time"]
+        return sorted(kinds.values(), key=lambda kind: -kind["time"])
+
+    def _load_table(self, name, columns=None):
+        if name in self.__unloaded and self._take_back(name):
+            return self.table(name, columns=columns)
+        usecols = None if columns is None else self._usecols(columns)
+        # open SQLite table, it is read from file when it is searched
+        if self.__formats.get(name, "csv") == "sqlite":
+            table = SqliteTable(self._sqlite_path(name),
+                                read_only=self.__read_only)
+            if self.limit is not None:
+                table = _table_class(self.layout).from_df(
+                    table.to_df(), limit=self.limit,
+                    read_only=self.__read_only)
+            self._set_up_table(name, table)
+            table._mark_saved()
+            self.__tables[name] = table
+            self._keep_memory_budget(name)
+            return table
+        # load NumPy table
+        if self.__formats.get(name, "csv") == "npt":
+            # read-only tables are memory-mapped
+            mmap_mode = "r" if self.__read_only else None
+            ids, npt_columns = self._load_npt(
+                self._npt_path(name), limit=self.limit, mmap_mode=mmap_mode,
+                usecols=usecols)
+            if self.layout == "columns":
+                table = ColumnarTable.from_columns(
+                    ids, npt_columns, read_only=self.__read_only)
+            else:
+                table_df = ColumnarTable._columns_to_df(ids, npt_columns)
+                table = _table_class(self.layout).from_df(
+                    table_df, read_only=self.__read_only)
+            self._set_up_table(name, table)
+            table._mark_saved()
+            if columns is not None:
+                table._set_projection(columns, self._columns_loader(name))
+            self._load_indexes(name, table)
+            self.__tables[name] = table
+            self._keep_memory_budget(name)
+            return table
         # get file path
         filepath = self._filepath(name)
-        # print file size warning
-        file_size = os.path.getsize(filepath)
-        if file_size > 5e6:
-            minutes = file_size / 3e7
-            minutes = float(f"{minutes:.1g}")
-            if int(minutes) == minutes:
-                minutes = int(minutes)
-            print(f"Loading DB table `{name}` may take several minutes..."
-                  f" (max aproximately {minutes} min.)")
-        # load file
-        table_df = self._load_csv(filepath)
+        # report progress of loading big files
+        progress = self.progress
+        if progress is None and os.path.getsize(filepath) > 5e6:
+            progress = self._print_progress
+        if progress is not None:
+            progress = functools.partial(progress, name)
+        # load file in chunks
+        table_dfs = self._load_csv_chunks(
+            filepath, limit=self.limit, progress=progress, usecols=usecols,
+            keys=self.keys)
         # make table
-        table = Table.from_df(table_df, limit=self.limit,
-                              read_only=self.__read_only)
+        table = _table_class(self.layout).from_dfs(
+            table_dfs, read_only=self.__read_only)
+        self._set_up_table(name, table)
+        table._mark_saved()
+        if columns is not None:
+            table._set_projection(columns, self._columns_loader(name))
+        # attach saved indexes
+        self._load_indexes(name, table)
         # assign data
         self.__tables[name] = table
+        self._keep_memory_budget(name)
         return table
 
+    def preload(self, names=None, workers=None, executor="process"):
+        """
+        Load many tables at once, parsing their `csv` files in
+        parallel. It is faster than loading tables one by one at first
+        access, when it is known that the tables will be needed.
+        Tables that are already loaded are skipped.
+
+        names: list/None - names of tables, all tables by default
+        workers: int/None - number of parallel workers, by default
+            the number of processors
+        executor: str - "process" or "thread", kind of workers
+        """
+        if executor not in EXECUTORS:
+            raise ValueError(
+                '`executor` should be one of: "process" or "thread"')
+        if names is None:
+            names = list(self.__tables)
+        if workers is None:
+            workers = os.cpu_count() or 1
+        names = [name for name in names if self.__tables[name] is None
+                 and not self._take_back(name)]
+        # NumPy and SQLite tables are not parsed, load them in place,
+        # as well as all tables if there is only one worker
+        csv_names = []
+        for name in names:
+            if self.__formats.get(name) in ("npt", "sqlite") \
+                    or workers == 1:
+                self._load_table(name)
+            else:
+                csv_names.append(name)
+        if not csv_names:
+            return
+        # parse csv files in parallel
+        PoolExecutor = ProcessPoolExecutor if executor == "process" \
+            else ThreadPoolExecutor
+        with PoolExecutor(max_workers=workers) as pool:
+            futures = {
+                name: pool.submit(
+                    _load_csv_table, self._filepath(name), self.limit,
+                    self.__read_only, self.layout, self.keys)
+                for name in csv_names
+            }
+            for name, future in futures.items():
+                table = future.result()
+                self._set_up_table(name, table)
+                self._load_indexes(name, table)
+                self.__tables[name] = table
+                self._keep_memory_budget(name)
+
+    def _load_indexes(self, name, table):
+        """
+        Attach indexes saved in sidecar file to the table, if the
+        file exists and the table file did not change since saving.
+        Indexes are not read until table needs them.
+        """
+        # indexes cover whole table only
+        if self.limit is not None:
+            return
+        # check if sidecar is present
+        index_filepath = self._index_filepath(name)
+        if not os.path.exists(index_filepath):
+            return
+        # check if sidecar is up to date
+        try:
+            with np.load(index_filepath, allow_pickle=False) as npz_file:
+                header = npz_file["header"].tolist()
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return
+        stat = os.stat(self._table_path(name))
+        if header[:2] != [stat.st_size, stat.st_mtime_ns]:
+            return
+
+        def loader():
+            ids = list(table._ids())
+            if len(ids) != header[2]:
+                return {}
+            indexes_data = {}
+            with np.load(index_filepath, allow_pickle=False) as npz_file:
+                indexes = json.loads(str(npz_file["indexes"]))
+                for i, index in enumerate(indexes):
+                    keys = npz_file[f"keys_{i}"].tolist()
+                    offsets = npz_file[f"offsets_{i}"].tolist()
+                    positions = npz_file[f"positions_{i}"].tolist()
+                    buckets = {
+                        tuple(json.loads(key)): [
+                            ids[position]
+                            for position in positions[start:end]]
+                        for key, start, end
+                        in zip(keys, offsets, offsets[1:])
+                    }
+                    if index["kind"] == "sorted":
+                        buckets = ("sorted", buckets)
+                    indexes_data[tuple(index["fields"])] = buckets
+            return indexes_data
+
+        table._attach_indexes(loader)
+
+    def _dump_indexes(self, name, table):
+        """
+        Save indexes of the table in sidecar file, with size and
+        modification time of table file for checking if it is stale.
+        The file keeps NumPy arrays only - keys of indexes as JSON
+        texts and IDs of records as their positions in table - so it
+        is read without unpickling. Indexes with keys that cannot be
+        written as JSON are not saved.
+        """
+        indexes_data = table._export_indexes()
+        if not indexes_data:
+            self._remove_indexes(name)
+            return
+        positions = {_id: i for i, _id in enumerate(table._ids())}
+        stat = os.stat(self._table_path(name))
+        arrays = {"header": np.array(
+            [stat.st_size, stat.st_mtime_ns, len(positions)], dtype=np.int64)}
+        indexes = []
+        try:
+            for i, (fields, buckets) in enumerate(indexes_data.items()):
+                kind = "hash"
+                if isinstance(buckets, tuple):
+                    kind, buckets = buckets
+                indexes.append({"fields": list(fields), "kind": kind})
+                arrays[f"keys_{i}"] = np.array(
+                    [json.dumps(list(key), default=_json_value)
+                     for key in buckets], dtype=str)
+                arrays[f"offsets_{i}"] = np.cumsum(
+                    [0] + [len(ids) for ids in buckets.values()],
+                    dtype=np.int64)
+                arrays[f"positions_{i}"] = np.array(
+                    [positions[_id] for ids in buckets.values()
+                     for _id in ids], dtype=np.int64)
+        except TypeError:
+            self._remove_indexes(name)
+            return
+        arrays["indexes"] = np.array(json.dumps(indexes))
+        index_filepath = self._index_filepath(name)
+        with open(index_filepath + ".new", "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(index_filepath + ".new", index_filepath)
+
+    def _remove_npt(self, name):
+        """ Remove NumPy table directory of the table. """
+        dirpath = self._npt_path(name)
+        if os.path.exists(dirpath):
+            shutil.rmtree(dirpath)
+
+    def _remove_sqlite(self, name):
+        """ Remove SQLite file of the table, and its temporary file. """
+        filepath = self._sqlite_path(name)
+        for path in [filepath, filepath + ".new"]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _dump_sqlite(self, name, table):
+        """
+        Save table in SQLite file. Changes of `SqliteTable` are committed
+        (and new table is moved from temporary file), and other tables
+        are written to temporary file, which replaces the old one.
+        """
+        filepath = self._sqlite_path(name)
+        if isinstance(table, SqliteTable):
+            if table.path == filepath:
+                table.commit()
+            else:
+                table.move(filepath)
+            return
+        # write records in chunks
+        table._widen()
+        temp_path = filepath + ".new"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        sqlite_table = SqliteTable(temp_path)
+        fields = table._field_names()
+        for rows in table._rows_chunks(fields, CSV_CHUNK_SIZE):
+            rows = list(rows)
+            records = [{field: value
+                        for field, value in zip(fields, row[1:])
+                        if value is not None}
+                       for row in rows]
+            sqlite_table.put_many(records, ids=[row[0] for row in rows])
+        for index_fields in table._get_indexes():
+            sqlite_table.create_index(list(index_fields))
+        sqlite_table.move(filepath)
+        sqlite_table.close()
+
+    def _remove_indexes(self, name):
+        """ Remove sidecar file with indexes of the table. """
+        index_filepath = self._index_filepath(name)
+        if os.path.exists(index_filepath):
+            os.remove(index_filepath)
+
     def dump_tables(self):
         """
         Delete from harddrive the `csv` files corresponding to
-        deleted `Tables` and overwrite other `Tables`.
+        deleted `Tables` and overwrite other `Tables`. Tables that
+        were not changed since loading or saving are skipped, and
+        if records were only added to table - they are appended to
+        existing `csv` file.
         """
         # check read only
         if self.__read_only:
@@ -486,15 +3880,131 @@ class DbDriver:
             filepath = self._filepath(deleted_name)
             if os.path.exists(filepath):
                 os.remove(filepath)
+            self._remove_npt(deleted_name)
+            self._remove_sqlite(deleted_name)
+            self._remove_indexes(deleted_name)
         # reset the state of dbdriver
         self.__dropped_tables.clear()
+        # unloaded tables could be changed if they are still used
+        for name in list(self.__unloaded):
+            self._take_back(name)
         # overwrite existing tables
+        closed_names = []
         for name, table in self.__tables.items():
             if table is None:
+                # skip not loaded tables
+                continue
+            if not table._dirty and not table._indexes_changed:
                 # skip unchanged tables
                 continue
-            filepath = self._filepath(name)
-            table.to_df().to_csv(filepath, sep=";")
+            if not table._dirty:
+                # only indexes changed, data and format stay the same
+                if isinstance(table, SqliteTable):
+                    # SQL indexes are kept in the table file
+                    table.commit()
+                self._dump_indexes(name, table)
+                table._mark_saved()
+                continue
+            if self.storage_format == "npt":
+                self._dump_npt(table.to_df(), self._npt_path(name))
+                filepath = self._filepath(name)
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+            elif self.storage_format == "sqlite":
+                self._dump_sqlite(name, table)
+                filepath = self._filepath(name)
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+                self._remove_npt(name)
+            else:
+                filepath = self._filepath(name)
+                if not self._append_csv(filepath, name, table):
+                    table.to_csv(filepath)
+                self._remove_npt(name)
+            if self.storage_format != "sqlite":
+                if isinstance(table, SqliteTable):
+                    # table saved in other format is loaded again from it
+                    table.close()
+                    closed_names.append(name)
+                self._remove_sqlite(name)
+            self.__formats[name] = self.storage_format
+            self._dump_indexes(name, table)
+            table._mark_saved()
+        for name in closed_names:
+            self.__tables[name] = None
+            self.__used.pop(name, None)
+        # all changes are saved
+        self._checkpoint_wal()
+        # saved tables can be unloaded
+        self._keep_memory_budget()
+
+    def _append_csv(self, filepath, name, table):
+        """
+        Append records added to table since it was saved to its `csv`
+        file. It is possible only if no other record was changed and
+        the file has columns for all fields of new records.
+
+        returns: bool - if the table was saved
+        """
+        # check if only new records were put
+        ids = table._appended_ids
+        if ids is None or self.__formats.get(name) != "csv" \
+                or not os.path.exists(filepath):
+            return False
+        # check columns of file
+        columns = _field_names(
+            pd.read_csv(filepath, sep=";", nrows=0).columns, self.keys)
+        if not columns or columns[0] != "_id":
+            return False
+        if not ids:
+            return True
+        new_df = table.to_df(ids=ids)
+        if not set(new_df.columns) <= set(columns[1:]):
+            return False
+        # remember size of file, to cut off appended rows if saving
+        # is interrupted
+        journal_path = filepath + ".append"
+        with open(journal_path + ".new", "w") as f:
+            f.write(str(os.path.getsize(filepath)))
+        os.replace(journal_path + ".new", journal_path)
+        # append rows
+        with open(filepath, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+        new_df = new_df.reindex(columns=columns[1:])
+        new_df.to_csv(filepath, sep=";", header=False, mode="a")
+        os.remove(journal_path)
+        return True
+
+    def is_saved(self, name):
+        """
+        Tell if table exists and has no changes since it was saved (or
+        since it was loaded from harddrive).
+        """
+        if name not in self.__tables:
+            return False
+        table = self.__tables[name]
+        return table is None or not table._dirty
+
+    def version(self):
+        """
+        Return string identifying saved content of DB - hash of names,
+        sizes and modification times of files of all tables. It changes
+        every time any table is saved, so it can tell if data computed
+        from DB are out of date. Changes not saved yet are not included.
+        """
+        state = []
+        for name in sorted(self.__tables):
+            path = self._table_path(name)
+            if os.path.exists(path):
+                stat = os.stat(path)
+                state.append((name, stat.st_size, stat.st_mtime_ns))
+            else:
+                state.append((name, None, None))
+        return hashlib.sha256(repr(state).encode()).hexdigest()
 
     def create_table(self, name):
         """
@@ -504,12 +4014,26 @@ class DbDriver:
         # check read only
         if self.__read_only:
             raise IOError("DB is for reading only.")
-        # add new table to data
-        table = Table()
+        # add new table to data, SQLite table is kept in temporary file
+        # until it is saved
+        old_table = self.__tables.get(name)
+        if isinstance(old_table, SqliteTable):
+            old_table.close()
+        if self.storage_format == "sqlite":
+            temp_path = self._sqlite_path(name) + ".new"
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            table = SqliteTable(temp_path)
+        else:
+            table = _table_class(self.layout)()
+        self._set_up_table(name, table)
         self.__tables[name] = table
+        self.__unloaded.pop(name, None)
+        self._keep_memory_budget(name)
         # if table previously removed - unmark it
         if name in self.__dropped_tables:
             self.__dropped_tables.remove(name)
+        self._log_change(("create", name))
 
     def delete_table(self, name):
         """
@@ -520,9 +4044,40 @@ class DbDriver:
         if self.__read_only:
             raise IOError("DB is for reading only.")
         # delete table
-        self.__tables.pop(name)
+        table = self.__tables.pop(name)
+        if isinstance(table, SqliteTable):
+            table.close()
+        self.__used.pop(name, None)
+        self.__unloaded.pop(name, None)
         # add table name as deleted
         self.__dropped_tables.append(name)
+        self._log_change(("delete", name))
+
+    def convert_tables(self, storage_format):
+        """
+        Save all tables of DB in given storage format, and remove
+        files of the previous format. Tables are converted one by one,
+        so only one table is kept in memory at once.
+
+        storage_format: str - "csv", "npt" or "sqlite"
+        """
+        # check read only
+        if self.__read_only:
+            raise IOError("DB is for reading only.")
+        if self.limit is not None:
+            raise RuntimeError("Cannot convert DB opened with `limit`.")
+        if storage_format not in STORAGE_FORMATS:
+            raise ValueError(
+                '`storage_format` should be one of: "csv", "npt" or "sqlite"')
+        # save unsaved changes
+        self.dump_tables()
+        # convert tables
+        self.storage_format = storage_format
+        for name in list(self.__tables):
+            self[name]._mark_changed()
+            self.dump_tables()
+            self.__tables[name] = None
+            self.__used.pop(name, None)
 
     def get_deleting_access(self):
         """
@@ -563,7 +4118,53 @@ class DbDriver:
                 filepath = self._filepath(name)
                 if os.path.exists(filepath):
                     os.remove(filepath)
+                self._remove_npt(name)
+                self._remove_sqlite(name)
+                self._remove_indexes(name)
+            if self.__wal_file is not None:
+                self.__wal_file.close()
+                self.__wal_file = None
+            if os.path.exists(self._wal_path()):
+                os.remove(self._wal_path())
+            if os.path.exists(self._metadata_path()):
+                os.remove(self._metadata_path())
             os.rmdir(self.db_directory)
         else:
             raise PermissionError("Incorrect access code, directory "
                                   "was not deleted. See method docstring.")
+
+
+def _load_csv_table(filepath, limit, read_only, layout, keys):
+    """
+    Load table from `csv` file. This is run in workers of
+    `DbDriver.preload`, so it gets only picklable arguments.
+    """
+    table_dfs = DbDriver._load_csv_chunks(filepath, limit=limit, keys=keys)
+    table = _table_class(layout).from_dfs(table_dfs, read_only=read_only)
+    table._mark_saved()
+    return table
+
+
+def convert_databases(data_directory, storage_format, keys=None):
+    """
+    Convert all DBs found in given directory and its subdirectories
+    (for example `./pkwscraper/data/`) to given storage format. It is
+    a one-shot conversion of DBs saved by previous versions.
+
+    data_directory: str - directory to search for DBs
+    storage_format: str - "csv", "npt" or "sqlite"
+    keys: str/None - "uuid" or "int", kind of keys of the DBs, by
+        default noted in their metadata
+    """
+    for dirpath, dirnames, filenames in os.walk(data_directory):
+        # skip NumPy tables directories
+        if dirpath.endswith("." + NPT_EXTENSION):
+            continue
+        has_tables = any(filename.endswith((".csv", "." + SQLITE_EXTENSION))
+                         for filename in filenames)
+        has_tables = has_tables or any(
+            dirname.endswith("." + NPT_EXTENSION) for dirname in dirnames)
+        if not has_tables:
+            continue
+        print(f"Converting DB in `{dirpath}` to `{storage_format}`...")
+        DbDriver(dirpath, keys=keys).convert_tables(storage_format)
@@ -54,6 +54,8 @@ class Elections:
             self.__preprocessed_dir = \
                 sejm_2015_scraper.PREPROCESSED_DATA_DIRECTORY
             self.__visualized_dir = "./pkwscraper/data/sejm/2015/visualized/"
+            self.__cached_dir = \
+                sejm_2015_preprocessing.CACHED_DATA_DIRECTORY
             self.__ScraperClass = sejm_2015_scraper.Sejm2015Scraper
             self.__PreprocessingClass = \
                 sejm_2015_preprocessing.Sejm2015Preprocessing
@@ -83,6 +85,10 @@ class Elections:
     def visualized_dir(self):
         return str(self.__visualized_dir)
 
+    @property
+    def cached_dir(self):
+        return str(self.__cached_dir)
+
     @property
     def base_url(self):
         return str(self.__base_url)
@@ -1,5 +1,6 @@
 
 import json
+import os
 
 from pkwscraper.lib.dbdriver import DbDriver
 from pkwscraper.lib.preprocessing.base_preprocessing import BasePreprocessing
@@ -12,13 +13,28 @@ YEAR = 2015
 RAW_DATA_DIRECTORY = "./pkwscraper/data/sejm/2015/raw/"
 RESCRIBED_DATA_DIRECTORY = "./pkwscraper/data/sejm/2015/rescribed/"
 PREPROCESSED_DATA_DIRECTORY = "./pkwscraper/data/sejm/2015/preprocessed/"
+CACHED_DATA_DIRECTORY = "./pkwscraper/data/sejm/2015/cached/"
 
 
 class Sejm2015Preprocessing(BasePreprocessing):
-    def __init__(self, source_db=None, target_db=None):
+    def __init__(self, source_db=None, target_db=None, memory_budget=None,
+                 slow_query_time=None, cached_dir=None):
+        """
+        source_db: DbDriver/None - rescribed DB opened for reading
+        target_db: DbDriver/None - DB for preprocessed data
+        memory_budget: int/None - approximate number of bytes of memory
+            for tables of each of DBs opened by default
+        slow_query_time: float/None - minimal time of queries (in
+            seconds) logged by DBs opened by default; the slowest kinds
+            of queries are printed at the end of `run_all`
+        cached_dir: str/None - directory to save votes of territorial
+            units, computed at the end of `run_all`
+        """
         # source db
         if source_db is None:
-            source_db = DbDriver(RESCRIBED_DATA_DIRECTORY, read_only=True)
+            source_db = DbDriver(RESCRIBED_DATA_DIRECTORY, read_only=True,
+                                 memory_budget=memory_budget,
+                                 slow_query_time=slow_query_time)
         if not isinstance(source_db, DbDriver):
             raise TypeError("Please pass an instance of `DbDriver` or `None`.")
         if not source_db.read_only:
@@ -28,7 +44,9 @@ class Sejm2015Preprocessing(BasePreprocessing):
 
         # target db
         if target_db is None:
-            target_db = DbDriver(PREPROCESSED_DATA_DIRECTORY)
+            target_db = DbDriver(PREPROCESSED_DATA_DIRECTORY, keys="int",
+                                 memory_budget=memory_budget,
+                                 slow_query_time=slow_query_time)
         if not isinstance(target_db, DbDriver):
             raise TypeError("Please pass an instance of `DbDriver` or `None`.")
         if target_db.read_only:
@@ -36,6 +54,11 @@ class Sejm2015Preprocessing(BasePreprocessing):
                 "Please pass `DbDriver` for writing or `None`.")
         self.target_db = target_db
 
+        # directory of votes
+        if cached_dir is None:
+            cached_dir = CACHED_DATA_DIRECTORY
+        self.cached_dir = cached_dir
+
     def run_all(self):
         self._preprocess_voivodships()
         self._preprocess_okregi()
@@ -48,6 +71,7 @@ class Sejm2015Preprocessing(BasePreprocessing):
         self._preprocess_votes()
         self._check_votes()
         self._preprocess_mandates()
+        self._create_indexes()
         print()
 
         print("dumping DB tables...")
@@ -55,6 +79,45 @@ class Sejm2015Preprocessing(BasePreprocessing):
         print("DB closed.")
         print()
 
+        self._compute_votes()
+        self._print_slow_queries()
+
+    def _compute_votes(self):
+        """
+        Sum votes of territorial units of all levels, from polling
+        districts to voivodships, and save them in cache directory,
+        so `Controller` gives them to user functions without summing.
+        """
+        # imported here, because controller imports preprocessing
+        from pkwscraper.lib.controller import DbReferences
+        from pkwscraper.lib.vote_cube import VOTE_CUBE_FILENAME, VoteCube
+
+        print("computing votes of territorial units...")
+        db_refs = DbReferences(self.target_db, "gminy")
+        vote_cube = VoteCube.from_db(
+            self.target_db, db_refs, self.target_db.version())
+        if not os.path.exists(self.cached_dir):
+            os.makedirs(self.cached_dir)
+        vote_cube.save(os.path.join(self.cached_dir, VOTE_CUBE_FILENAME))
+        print("votes saved.")
+        print()
+
+    def _print_slow_queries(self, top=20):
+        """ Print kinds of logged queries that took the most time. """
+        for db_name, db in [("source", self.source_db),
+                            ("target", self.target_db)]:
+            summary = db.slow_queries_summary()[:top]
+            if not summary:
+                continue
+            print(f"slowest queries of {db_name} DB:")
+            for kind in summary:
+                fields = ", ".join(" ".join(map(str, field))
+                                   for field in kind["query"])
+                print(f"{kind['time']:8.2f} s  {kind['count']:6} x  "
+                      f"{kind['table']}.{kind['method']}({fields})  "
+                      f"[{kind['plan']}]")
+            print()
+
     @staticmethod
     def clean_text(text):
         """
@@ -217,6 +280,19 @@ class Sejm2015Preprocessing(BasePreprocessing):
         jsoned_txt = region.to_json()
         return jsoned_txt
 
+    def _create_indexes(self):
+        """
+        Make indexes of relations used for splitting DB into
+        territorial units. They are saved together with tables.
+        """
+        self.target_db["obwody"].create_index("gmina")
+        self.target_db["protokoły"].create_index("obwod")
+
+        constituencies = self.target_db["okręgi"].find({}, fields="number")
+        for constituency_number in constituencies:
+            table_name = f"wyniki_{constituency_number}"
+            self.target_db[table_name].create_index("obwod")
+
     def _preprocess_voivodships(self):
         voivodships = self.source_db["województwa"].find({})
         self.target_db.create_table("województwa")
@@ -235,6 +311,7 @@ class Sejm2015Preprocessing(BasePreprocessing):
     def _preprocess_okregi(self):
         constituencies = self.source_db["okręgi"].find({})
         self.target_db.create_table("okręgi")
+        self.target_db["województwa"].create_index("name")
 
         for o in constituencies.values():
             number = o["number"]
@@ -257,6 +334,8 @@ class Sejm2015Preprocessing(BasePreprocessing):
     def _preprocess_powiaty(self):
         districts = self.source_db["powiaty"].find({})
         self.target_db.create_table("powiaty")
+        self.target_db["województwa"].create_index("code")
+        self.target_db["okręgi"].create_index("number")
 
         consituencies_numbers = self.target_db["okręgi"].find(
             query={}, fields="number")
@@ -299,12 +378,14 @@ class Sejm2015Preprocessing(BasePreprocessing):
     def _preprocess_gminy(self):
         communes = self.source_db["gminy"].find({})
         self.target_db.create_table("gminy")
+        self.target_db["powiaty"].create_index("code")
 
         code_to_name_dict = {
             code: name for code, name in self.source_db["obwody"].find(
                 {}, fields=["commune_code", "commune_name"])
         }
 
+        gminy_records = []
         for c in communes.values():
             code = c["code"]
             partial_name = c["partial_name"]
@@ -323,7 +404,7 @@ class Sejm2015Preprocessing(BasePreprocessing):
             merged_name = self.merge_commune_names(
                 partial_name, full_name, code)
 
-            self.target_db["gminy"].put({
+            gminy_records.append({
                 "code": code,
                 "name": merged_name,
                 "urban_or_rural": urban_or_rural,
@@ -331,6 +412,8 @@ class Sejm2015Preprocessing(BasePreprocessing):
                 "parent": district_id,
             })
 
+        self.target_db["gminy"].put_many(gminy_records)
+
     def _preprocess_obwody(self):
         self.target_db.create_table("obwody")
 
@@ -354,6 +437,7 @@ class Sejm2015Preprocessing(BasePreprocessing):
                 query={}, fields=["_id", "number"])
         }
 
+        obwody_records = []
         for ob in obwody.values():
             # get basic data
             constituency_number = ob["constituency_number"]
@@ -398,7 +482,7 @@ class Sejm2015Preprocessing(BasePreprocessing):
             urban_or_rural = self.urban_or_rural(commune_name, commune_code)
 
             # add record
-            self.target_db["obwody"].put({
+            obwody_records.append({
                 "constituency": constituency_id,
                 "gmina": commune_id,
                 "number": polling_district_number,
@@ -409,6 +493,8 @@ class Sejm2015Preprocessing(BasePreprocessing):
                 "voters": voters,
             })
 
+        self.target_db["obwody"].put_many(obwody_records)
+
     def _preprocess_protocoles(self):
         self.target_db.create_table("protokoły")
         obwody_data = self.source_db["obwody"].find({})
@@ -426,6 +512,7 @@ class Sejm2015Preprocessing(BasePreprocessing):
         }
 
         # iterate records
+        protocoles_records = []
         for o in obwody_data.values():
             # get identifier of polling district
             commune_code = o["commune_code"]
@@ -471,7 +558,7 @@ class Sejm2015Preprocessing(BasePreprocessing):
                 print(f"miscounted envelopes: obwód {commune_code}/{polling_district_number}", end=", ")
 
             # add new record
-            self.target_db["protokoły"].put({
+            protocoles_records.append({
                 "obwod": obwod_id,
                 "voters": voters,
                 "got_ballots": got_ballots,
@@ -496,6 +583,7 @@ class Sejm2015Preprocessing(BasePreprocessing):
                 "invalid_candidate": invalid_candidate,
                 "votes_valid": votes_valid,
             })
+        self.target_db["protokoły"].put_many(protocoles_records)
         print()
         print()
 
@@ -571,7 +659,10 @@ class Sejm2015Preprocessing(BasePreprocessing):
         # find all candidates
         candidates = self.source_db["kandydaci_xls"].find({})
         self.target_db.create_table("kandydaci")
+        self.target_db["listy"].create_index(
+            ["committee_name", "committee_status"])
 
+        candidates_records = []
         for c in candidates.values():
             # get values
             constituency_number = c["okreg_number"]
@@ -630,7 +721,7 @@ class Sejm2015Preprocessing(BasePreprocessing):
                 is_crossed_out = False
 
             # add record
-            self.target_db["kandydaci"].put({
+            candidates_records.append({
                 "constituency": constituency_id,
                 "list": list_id,
                 "position": position,
@@ -644,6 +735,8 @@ class Sejm2015Preprocessing(BasePreprocessing):
                 "is_crossed_out": is_crossed_out
             })
 
+        self.target_db["kandydaci"].put_many(candidates_records)
+
         print()
 
     def _preprocess_votes(self):
@@ -712,6 +805,7 @@ class Sejm2015Preprocessing(BasePreprocessing):
             self.target_db.create_table(table_name)
 
             # iterate over polling districts
+            results_records = []
             for district_data in results_data.values():
                 commune_code = district_data["commune_code"]
                 candidates_count = district_data["candidates_count"]
@@ -780,8 +874,14 @@ class Sejm2015Preprocessing(BasePreprocessing):
                         votes = int(votes)
                         record[candidate_id] = votes
 
-                # add record to table
-                self.target_db[table_name].put(record)
+                # add record to records of table
+                results_records.append(record)
+
+            self.target_db[table_name].put_many(results_records)
+
+            # saved tables can be unloaded when memory is limited
+            if self.target_db.memory_budget is not None:
+                self.target_db.dump_tables()
 
             print(f"Preprocessed voting results for constituency {constituency_number}.")
 
@@ -818,8 +918,7 @@ class Sejm2015Preprocessing(BasePreprocessing):
 
             for target_record in target_results.values():
                 for key, value in target_record.items():
-                    if key in ["commune_code", "polling_district_number",
-                               "candidates_count"]:
+                    if key in ["obwod", "candidates_count"]:
                         continue
                     try:
                         votes = int(value)
@@ -837,6 +936,11 @@ class Sejm2015Preprocessing(BasePreprocessing):
         votes_count = 0
         table_name_template = "wyniki_{}"
 
+        # make indexes for searching
+        self.target_db["obwody"].create_index("constituency")
+        self.target_db["kandydaci"].create_index(
+            ["constituency", "is_crossed_out"])
+
         # iterate over constituencies
         constituencies = self.target_db["okręgi"].find(
             {}, fields=["_id", "number"])
@@ -879,6 +983,12 @@ class Sejm2015Preprocessing(BasePreprocessing):
 
         mandates = self.source_db["mandaty"].find({})
 
+        # make indexes for searching
+        self.target_db["listy"].create_index(
+            ["list_number", "committee_name"])
+        self.target_db["kandydaci"].create_index(
+            ["constituency", "list", "position"])
+
         # iterate records
         for m in mandates.values():
             # get data
@@ -0,0 +1,220 @@
+from functools import partial
+import hashlib
+import os
+import pickle
+import types
+
+"""
+Values of user function computed for territorial units can be kept in
+`ResultsCache` on harddrive, so making plot of the same function again,
+e.g. with different colormap or title, does not need evaluating it.
+
+The function is identified by its fingerprint - hash of its code,
+constants, default and bound arguments, closure variables, simple
+global values and fingerprints of global functions of its module that
+it calls. It is stable between runs of program, unlike `hash` of
+function object, and it changes when the code of function is changed.
+"""
+
+DEFAULT_CACHE_SIZE = 256 * 1024 ** 2
+CACHE_EXTENSION = 'pickle'
+SIMPLE_TYPES = (type(None), bool, int, float, complex, str, bytes)
+
+
+def function_fingerprint(function):
+    """
+    Return hex digest identifying function, see module description.
+    `functools.partial` objects, methods and objects with `__call__`
+    method are also accepted.
+    """
+    digest = hashlib.sha256()
+    _update_fingerprint(digest, function, set())
+    return digest.hexdigest()
+
+
+def _update_fingerprint(digest, obj, seen):
+    if isinstance(obj, SIMPLE_TYPES):
+        digest.update(f"{type(obj).__name__}:{obj!r};".encode())
+    elif isinstance(obj, (list, tuple)):
+        digest.update(f"{type(obj).__name__}:{len(obj)};".encode())
+        for item in obj:
+            _update_fingerprint(digest, item, seen)
+    elif isinstance(obj, dict):
+        digest.update(f"dict:{len(obj)};".encode())
+        for key in sorted(obj, key=repr):
+            _update_fingerprint(digest, key, seen)
+            _update_fingerprint(digest, obj[key], seen)
+    elif isinstance(obj, (set, frozenset)):
+        digest.update(f"set:{sorted(repr(item) for item in obj)};".encode())
+    elif isinstance(obj, partial):
+        digest.update(b"partial;")
+        _update_fingerprint(digest, obj.func, seen)
+        _update_fingerprint(digest, obj.args, seen)
+        _update_fingerprint(digest, obj.keywords, seen)
+    elif isinstance(obj, types.MethodType):
+        digest.update(b"method;")
+        _update_fingerprint(digest, obj.__func__, seen)
+        _update_fingerprint(digest, obj.__self__, seen)
+    elif isinstance(obj, types.FunctionType):
+        # recursive functions are included once
+        if id(obj) in seen:
+            digest.update(f"function:{obj.__qualname__};".encode())
+            return
+        seen.add(id(obj))
+        digest.update(b"function;")
+        _update_fingerprint(digest, obj.__code__, seen)
+        _update_fingerprint(digest, obj.__defaults__, seen)
+        _update_fingerprint(digest, obj.__kwdefaults__, seen)
+        closure = obj.__closure__ or ()
+        _update_fingerprint(
+            digest, [cell.cell_contents for cell in closure], seen)
+        # values of global names used by function, without modules,
+        # classes and other objects that are not data or functions;
+        # functions from other modules are identified by names only
+        for name in sorted(_code_names(obj.__code__)):
+            if name not in obj.__globals__:
+                continue
+            value = obj.__globals__[name]
+            if isinstance(value, types.FunctionType) \
+                    and value.__module__ != obj.__module__:
+                digest.update(f"global:{name}:{value.__module__}."
+                              f"{value.__qualname__};".encode())
+            elif isinstance(value, (SIMPLE_TYPES, list, tuple, dict, set,
+                                    frozenset, partial, types.FunctionType)):
+                digest.update(f"global:{name};".encode())
+                _update_fingerprint(digest, value, seen)
+    elif isinstance(obj, types.CodeType):
+        digest.update(b"code;")
+        digest.update(obj.co_code)
+        _update_fingerprint(digest, obj.co_consts, seen)
+        _update_fingerprint(digest, obj.co_names, seen)
+    elif isinstance(obj, (types.BuiltinFunctionType, type, types.ModuleType)):
+        name = getattr(obj, "__qualname__", obj.__name__)
+        digest.update(f"{getattr(obj, '__module__', '')}.{name};".encode())
+    elif callable(obj) and hasattr(obj, "__dict__"):
+        # callable object - code of its `__call__` method and attributes
+        digest.update(b"callable;")
+        _update_fingerprint(digest, type(obj).__call__, seen)
+        _update_fingerprint(digest, vars(obj), seen)
+    else:
+        try:
+            digest.update(pickle.dumps(obj, protocol=4))
+        except Exception:
+            raise TypeError(f"Cannot make fingerprint of object of type: "
+                            f"{type(obj)}.")
+
+
+def _code_names(code):
+    """ Return set of global names used in code and its nested code. """
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _code_names(const)
+    return names
+
+
+class ResultsCache:
+    """
+    `ResultsCache` keeps values of functions for territorial units in
+    files in given directory. One file holds values of one function for
+    all units evaluated with the same key - e.g. elections, granularity
+    and version of DB - as dictionary of unit IDs and values. Files
+    are named by fingerprint of function and hash of the key, so the
+    results of function can be removed without knowing the keys.
+
+    When total size of files is bigger than `max_size` bytes, least
+    recently used files are removed. Files that cannot be read are
+    treated as missing.
+    """
+    def __init__(self, directory, max_size=DEFAULT_CACHE_SIZE):
+        """
+        directory: str - path to directory of cache files, it is
+            created when needed,
+        max_size: int/None - maximum size of files in bytes, None for
+            no limit.
+        """
+        self.directory = directory
+        self.max_size = max_size
+
+    def _filepath(self, function, key):
+        key_hash = hashlib.sha256(repr(key).encode()).hexdigest()
+        filename = f"{function_fingerprint(function)[:32]}_{key_hash[:32]}" \
+                   f".{CACHE_EXTENSION}"
+        return os.path.join(self.directory, filename)
+
+    def _files(self):
+        """ Return list of paths of cache files in directory. """
+        if not os.path.exists(self.directory):
+            return []
+        return [os.path.join(self.directory, filename)
+                for filename in sorted(os.listdir(self.directory))
+                if filename.endswith(f".{CACHE_EXTENSION}")]
+
+    def get(self, function, key):
+        """
+        Return dictionary of unit IDs and values of function saved with
+        given key, empty if there are none.
+        """
+        filepath = self._filepath(function, key)
+        if not os.path.exists(filepath):
+            return {}
+        try:
+            with open(filepath, "rb") as f:
+                values = pickle.load(f)
+        except Exception:
+            return {}
+        # mark file as recently used
+        os.utime(filepath)
+        return values
+
+    def update(self, function, key, values):
+        """
+        Save values of function for units, given as dictionary of unit
+        IDs and values, together with values saved before.
+        """
+        all_values = self.get(function, key)
+        all_values.update(values)
+        filepath = self._filepath(function, key)
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        # processes saving values at once do not write the same file
+        temp_path = f"{filepath}.{os.getpid()}.new"
+        with open(temp_path, "wb") as f:
+            pickle.dump(all_values, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, filepath)
+        self._evict(keep=filepath)
+
+    def _evict(self, keep=None):
+        """
+        Remove least recently used files until total size fits in
+        `max_size`. File given as `keep` is removed last.
+        """
+        if self.max_size is None:
+            return
+        files = []
+        for filepath in self._files():
+            stat = os.stat(filepath)
+            files.append((filepath == keep, stat.st_mtime_ns, stat.st_size,
+                          filepath))
+        files.sort()
+        total_size = sum(size for _, _, size, _ in files)
+        for _, _, size, filepath in files:
+            if total_size <= self.max_size:
+                break
+            os.remove(filepath)
+            total_size -= size
+
+    def invalidate(self, function=None):
+        """
+        Remove saved values of function for all keys, or all saved
+        values if function is None.
+        """
+        prefix = None if function is None \
+            else function_fingerprint(function)[:32] + "_"
+        for filepath in self._files():
+            if prefix is None or os.path.basename(filepath).startswith(prefix):
+                os.remove(filepath)
+
+    def size(self):
+        """ Return total size of cache files in bytes. """
+        return sum(os.path.getsize(filepath) for filepath in self._files())
@@ -37,22 +37,53 @@ class Sejm2015Scraper(BaseScraper):
         self.all_votes = 0
 
     def run_all(self):
-        # TODO - check, if the data is already downloaded
-        #        and omit unnecessary steps
-        self._download_voivodships()
-        self._download_okregi()
-        self._download_committees()
-        self._download_xls_candidates()
-        self._download_html_candidates()
-        self._download_mandates_winners_and_powiaty()
-        self._download_gminy_and_obwody()
-        self._download_voting_results()
-
-        print("dumping DB tables...")
-        self.db.dump_tables()
+        """
+        Run all steps of scraping. Tables are saved after each step,
+        so when scraping is run again after failure, the steps whose
+        tables are already saved are omitted. A step is run again if
+        any earlier step was run, as its records refer to them.
+        """
+        steps = [
+            (self._download_voivodships, lambda: ["województwa"]),
+            (self._download_okregi, lambda: ["okręgi"]),
+            (self._download_committees, lambda: ["komitety"]),
+            (self._download_xls_candidates, lambda: ["kandydaci_xls"]),
+            (self._download_html_candidates, lambda: ["kandydaci_html"]),
+            (self._download_mandates_winners_and_powiaty,
+             lambda: ["mandaty", "powiaty"]),
+            (self._download_gminy_and_obwody, lambda: ["gminy", "obwody"]),
+            (self._download_voting_results, self._voting_results_tables),
+        ]
+        self._download_all_votes()
+        resuming = True
+        for step, table_names in steps:
+            resuming = resuming and all(
+                self.db.is_saved(name) for name in table_names())
+            if resuming:
+                print(f"omitting {step.__name__}, tables already saved")
+                continue
+            step()
+            print("dumping DB tables...")
+            self.db.dump_tables()
         print("DB closed.")
         print()
 
+    def _voting_results_tables(self):
+        constituencies = self.db["okręgi"].find({}, fields="number")
+        return ["obwody_uzupełnienie"] + [
+            f"wyniki_{int(number)}" for number in constituencies]
+
+    def _download_all_votes(self):
+        relative_path = "/349_Wyniki_Sejm/0/0.html"
+        html_content = self.dl.download(relative_path)
+        html_tree = html.fromstring(html_content)
+
+        xpath_all_votes = '/html/body/div/div[4]/div[2]/div[3]' \
+                          '/div[2]/div/div[1]/div/div[3]/div[2]/text()'
+        self.all_votes = int(html_tree.xpath(xpath_all_votes)[0])
+        print()
+        print(f"All votes: {self.all_votes}")
+
     def _download_voivodships(self):
         relative_path = "/index.html"
         html_content = self.dl.download(relative_path)
@@ -86,12 +117,6 @@ class Sejm2015Scraper(BaseScraper):
         html_content = self.dl.download(relative_path)
         html_tree = html.fromstring(html_content)
 
-        xpath_all_votes = '/html/body/div/div[4]/div[2]/div[3]' \
-                          '/div[2]/div/div[1]/div/div[3]/div[2]/text()'
-        self.all_votes = int(html_tree.xpath(xpath_all_votes)[0])
-        print()
-        print(f"All votes: {self.all_votes}")
-
         xpath_okregi_mapa = '/html/body//div[@id="wyniki1"]//' \
                             'div[@id="wyniki1_top_mapa"]//svg//a'
         okregi_hrefs = html_tree.xpath(xpath_okregi_mapa)
@@ -339,6 +364,7 @@ class Sejm2015Scraper(BaseScraper):
         self.db.create_table("obwody")
 
         # extract communes data for each district
+        gminy_records = []
         for powiat_code in powiaty_codes:
             relative_url = relative_url_template.format(powiat_code)
             html_content = self.dl.download(relative_url)
@@ -366,8 +392,8 @@ class Sejm2015Scraper(BaseScraper):
                 if skip_condition:
                     continue
 
-                # put record in DB
-                self.db["gminy"].put({
+                # add record to the list
+                gminy_records.append({
                     "code": code,
                     "partial_name": partial_name,
                     "geo": geo
@@ -375,6 +401,9 @@ class Sejm2015Scraper(BaseScraper):
                 # NOTE - `name`, `rural_or_urban` will be taken from
                 #        polling districts data in preprocessing step
 
+        # put records in DB
+        self.db["gminy"].put_many(gminy_records)
+
         # extract polling districts information from xlsx
         self.dl.download("/wyniki_zb/2015-gl-lis-obw.zip")
         with ZipFile(
@@ -385,11 +414,12 @@ class Sejm2015Scraper(BaseScraper):
         book = xlrd.open_workbook(
             RAW_DATA_DIRECTORY + "/2015-gl-lis-obw.xls")
         sheet = book.sheet_by_index(0)
+        obwody_records = []
         for row_index in range(1, sheet.nrows):
             row = sheet.row(row_index)
             all_votes += int(row[27].value)
 
-            self.db["obwody"].put({
+            obwody_records.append({
                 "constituency_number":          int(row[0].value),
                 "senate_constituency_number":   int(row[1].value),
                 "commune_code":                 row[2].value,
@@ -419,6 +449,7 @@ class Sejm2015Scraper(BaseScraper):
                 "invalid_candidate":            int(row[26].value),
                 "votes_valid":                  int(row[27].value)
             })
+        self.db["obwody"].put_many(obwody_records)
 
         if not all_votes == self.all_votes:
             raise RuntimeError(
@@ -484,6 +515,8 @@ class Sejm2015Scraper(BaseScraper):
 
             # iterate over polling districts (1 row - 1 polling district)
             print(f"Iterating over polling districts in constituency no. {constituency_number}...")
+            completion_records = []
+            results_records = []
             for row_index, row in enumerate(sheet.iter_rows()):
                 polling_district_votes = 0
                 if row_index == 0:
@@ -499,8 +532,8 @@ class Sejm2015Scraper(BaseScraper):
                 commission_name = row[3].value
                 polling_district_number = row[4].value
 
-                # put it into table
-                self.db["obwody_uzupełnienie"].put({
+                # add it to records of table
+                completion_records.append({
                     "commune_name": commune_name,
                     "commune_code": commune_code,
                     "commission_name": commission_name,
@@ -543,8 +576,12 @@ class Sejm2015Scraper(BaseScraper):
                     record[candidate_identifier] = votes
                     record["candidates_count"] += 1
 
-                # add record to table
-                self.db[table_name].put(record)
+                # add record to records of table
+                results_records.append(record)
+
+            # put records in tables
+            self.db["obwody_uzupełnienie"].put_many(completion_records)
+            self.db[table_name].put_many(results_records)
 
             print()
             print(f"Finished constituency no. {constituency_number}.")
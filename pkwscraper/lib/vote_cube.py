@@ -0,0 +1,265 @@
+import os
+
+import numpy as np
+
+"""
+Vote cube keeps numbers of votes for each candidate in each territorial
+unit - polling districts, communes, districts, constituencies and
+voivodships - and sums of votes for each list, so they can be read for
+unit without summing voting results records.
+
+Votes of polling districts are read from `wyniki_*` tables once. In one
+constituency all polling districts have votes for all its candidates,
+so the matrix of polling districts and candidates is dense in blocks of
+constituencies and zero outside them - it is kept in CSR layout
+(offsets of rows, columns and values of entries) with the blocks only.
+If there are more records of voting results of one polling district,
+only the one used by `DbReferences` - the last in table - is counted,
+so the votes agree with records given to user function. Votes of each
+higher level are sums of entries of its children, rolled up along the
+hierarchy of units given by `DbReferences` - communes from polling
+districts and districts from communes, constituencies from polling
+districts, as districts can be split between constituencies, and
+voivodships from constituencies.
+
+Votes are computed at the end of preprocessing and saved in the cache
+directory of elections with NumPy `.npz` format.
+"""
+
+VOTE_CUBE_FILENAME = "vote_cube.npz"
+# levels of territorial units, from the lowest
+LEVELS = ["obwod", "gmina", "powiat", "okreg", "voivodship"]
+# pairs of child and parent levels, in order of rolling up votes
+ROLL_UP = [("obwod", "gmina"), ("gmina", "powiat"), ("obwod", "okreg"),
+           ("okreg", "voivodship")]
+LEVEL_NAMES = {
+    "obwody": "obwod",
+    "gminy": "gmina",
+    "powiaty": "powiat",
+    "okręgi": "okreg",
+    "województwa": "voivodship",
+}
+
+
+def _sum_entries(rows, columns, values, n_rows, n_columns):
+    """
+    Sum values of entries with the same row and column, skipping
+    entries with negative row. Returns matrix in CSR layout - offsets
+    of rows and columns and values of entries, sorted by row and column.
+    """
+    valid = rows >= 0
+    keys = rows[valid].astype(np.int64) * n_columns + columns[valid]
+    keys, inverse = np.unique(keys, return_inverse=True)
+    sums = np.bincount(inverse.ravel(), weights=values[valid],
+                       minlength=len(keys))
+    entry_rows = keys // n_columns
+    offsets = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(entry_rows, minlength=n_rows), out=offsets[1:])
+    return (offsets, (keys % n_columns).astype(np.int32),
+            np.rint(sums).astype(np.int32))
+
+
+class VoteCube:
+    """
+    `VoteCube` gives numbers of votes of territorial units. It is made
+    from preprocessed DB with `from_db` and can be saved to `.npz` file
+    and loaded, with version of DB it was made from.
+
+    Units are given by level - singular name or name of table - and ID
+    of record. `unit_votes` returns `UnitVotes` object of single unit,
+    which is given to user function by `Controller`.
+    """
+    def __init__(self, arrays):
+        """
+        arrays: dict - arrays made by `from_db` or loaded from file
+        """
+        self.arrays = arrays
+        self._positions = {
+            level: {_id: i for i, _id in enumerate(arrays[f"{level}_ids"])}
+            for level in LEVELS
+        }
+
+    @property
+    def db_version(self):
+        """ Version of DB the votes were read from. """
+        return str(self.arrays["db_version"])
+
+    @classmethod
+    def from_db(cls, db, db_refs, db_version=""):
+        """
+        Read votes from voting results tables of DB and sum them for
+        units of all levels.
+
+        db: DbDriver - preprocessed DB
+        db_refs: DbReferences - relations of records of the DB
+        db_version: str - version of DB, to tell if votes are up to date
+        """
+        arrays = {"db_version": np.array(db_version, dtype=str)}
+        candidate_ids = db_refs.get_ids("candidate")
+        n_candidates = len(candidate_ids)
+        arrays["candidate_ids"] = candidate_ids
+        arrays["list_ids"] = db_refs.get_ids("list")
+        arrays["candidate_list"] = db_refs.arrays["candidate_list"]
+        for level in LEVELS:
+            arrays[f"{level}_ids"] = db_refs.get_ids(level)
+
+        # entries of polling districts and candidates
+        rows = []
+        columns = []
+        values = []
+        for okreg_id, number in zip(db_refs.get_ids("okreg"),
+                                    db_refs.arrays["okreg_number"]):
+            candidates = db_refs.get_relation("okreg", "candidate", okreg_id)
+            records = db[f"wyniki_{number}"].find(
+                {}, fields=["_id", "obwod"] + candidates)
+            if not records:
+                continue
+            wyniki_ids, obwod_ids, *candidates_votes = zip(*records)
+            obwody = db_refs.get_positions("obwod", obwod_ids)
+            # skip other records of polling district than the used one
+            wyniki = db_refs.arrays["obwod_wyniki"][obwody]
+            used = (obwody >= 0) & (wyniki >= 0)
+            used[used] = db_refs.arrays["wyniki_records"][wyniki[used]] \
+                == np.array(wyniki_ids, dtype=object)[used]
+            obwody[~used] = -1
+            for candidate, votes in zip(
+                    db_refs.get_positions("candidate", candidates),
+                    candidates_votes):
+                # crossed out candidates have no votes
+                if all(value is None for value in votes):
+                    continue
+                rows.append(obwody)
+                columns.append(np.full(len(obwody), candidate))
+                values.append(np.array(
+                    [value or 0 for value in votes], dtype=np.float64))
+
+        offsets, columns, votes = _sum_entries(
+            np.concatenate(rows or [np.zeros(0, dtype=np.int64)]),
+            np.concatenate(columns or [np.zeros(0, dtype=np.int64)]),
+            np.concatenate(values or [np.zeros(0)]),
+            len(arrays["obwod_ids"]), n_candidates)
+        cls._add_level(arrays, "obwod", offsets, columns, votes)
+
+        # roll up votes to parent units
+        for level, parent_level in ROLL_UP:
+            offsets = arrays[f"{level}_offsets"]
+            entry_rows = np.repeat(np.arange(len(offsets) - 1),
+                                   np.diff(offsets))
+            parents = db_refs.get_parents(level, parent_level)
+            offsets, columns, votes = _sum_entries(
+                parents[entry_rows], arrays[f"{level}_candidates"],
+                arrays[f"{level}_votes"].astype(np.float64),
+                len(arrays[f"{parent_level}_ids"]), n_candidates)
+            cls._add_level(arrays, parent_level, offsets, columns, votes)
+
+        return cls(arrays)
+
+    @staticmethod
+    def _add_level(arrays, level, offsets, columns, votes):
+        """ Save votes of units of level and sums of votes for lists. """
+        arrays[f"{level}_offsets"] = offsets
+        arrays[f"{level}_candidates"] = columns
+        arrays[f"{level}_votes"] = votes
+        n_rows = len(offsets) - 1
+        n_lists = len(arrays["list_ids"])
+        entry_rows = np.repeat(np.arange(n_rows), np.diff(offsets))
+        lists = arrays["candidate_list"][columns]
+        has_list = lists >= 0
+        list_votes = np.bincount(
+            entry_rows[has_list] * n_lists + lists[has_list],
+            weights=votes[has_list], minlength=n_rows * n_lists)
+        arrays[f"{level}_list_votes"] = \
+            np.rint(list_votes).astype(np.int64).reshape(n_rows, n_lists)
+        total_votes = np.bincount(entry_rows, weights=votes,
+                                  minlength=n_rows)
+        arrays[f"{level}_total_votes"] = np.rint(total_votes).astype(np.int64)
+
+    def save(self, filepath):
+        """
+        Save arrays of votes to `.npz` file. Arrays of IDs are saved as
+        arrays of strings or numbers, so they are loaded without pickle.
+        The file is replaced at once, when it is written.
+        """
+        arrays = {
+            name: np.array(array.tolist()) if array.dtype == object else array
+            for name, array in self.arrays.items()
+        }
+        # processes saving the same votes do not write the same file
+        temp_path = f"{filepath}.{os.getpid()}.new"
+        with open(temp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(temp_path, filepath)
+
+    @classmethod
+    def load(cls, filepath):
+        """ Make instance from arrays saved with `save` method. """
+        with np.load(filepath, allow_pickle=False) as npz_file:
+            arrays = {name: npz_file[name] for name in npz_file.files}
+        return cls(arrays)
+
+    def _locate(self, level, unit_id):
+        level = LEVEL_NAMES.get(level, level)
+        return level, self._positions[level][unit_id]
+
+    def candidate_votes(self, level, unit_id):
+        """ Return dict of candidates IDs and their votes in unit. """
+        level, position = self._locate(level, unit_id)
+        return self._candidate_votes(level, position)
+
+    def list_votes(self, level, unit_id):
+        """ Return dict of lists IDs and sums of their votes in unit. """
+        level, position = self._locate(level, unit_id)
+        return self._list_votes(level, position)
+
+    def total_votes(self, level, unit_id):
+        """ Return number of votes for all candidates in unit. """
+        level, position = self._locate(level, unit_id)
+        return int(self.arrays[f"{level}_total_votes"][position])
+
+    def unit_votes(self, level, unit_id):
+        """ Return `UnitVotes` of one unit. """
+        level, position = self._locate(level, unit_id)
+        return UnitVotes(self, level, position)
+
+    def _entries(self, level, position):
+        offsets = self.arrays[f"{level}_offsets"]
+        start, end = offsets[position], offsets[position + 1]
+        return (self.arrays[f"{level}_candidates"][start:end],
+                self.arrays[f"{level}_votes"][start:end])
+
+    def _candidate_votes(self, level, position):
+        candidates, votes = self._entries(level, position)
+        return dict(zip(self.arrays["candidate_ids"][candidates].tolist(),
+                        votes.tolist()))
+
+    def _list_votes(self, level, position):
+        candidates, _ = self._entries(level, position)
+        lists = np.unique(self.arrays["candidate_list"][candidates])
+        lists = lists[lists >= 0]
+        list_votes = self.arrays[f"{level}_list_votes"][position][lists]
+        return dict(zip(self.arrays["list_ids"][lists].tolist(),
+                        list_votes.tolist()))
+
+
+class UnitVotes:
+    """
+    `UnitVotes` gives numbers of votes of one territorial unit, read
+    from `VoteCube`. User function gets it as `votes` attribute of DB.
+    """
+    def __init__(self, vote_cube, level, position):
+        self.__vote_cube = vote_cube
+        self.__level = level
+        self.__position = position
+
+    def candidates(self):
+        """ Return dict of candidates IDs and their votes. """
+        return self.__vote_cube._candidate_votes(self.__level, self.__position)
+
+    def lists(self):
+        """ Return dict of lists IDs and sums of their votes. """
+        return self.__vote_cube._list_votes(self.__level, self.__position)
+
+    def total(self):
+        """ Return number of votes for all candidates. """
+        return int(self.__vote_cube.arrays[f"{self.__level}_total_votes"]
+                   [self.__position])
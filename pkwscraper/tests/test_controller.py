@@ -1,57 +1,213 @@
 
+import os
+import tempfile
+import threading
 from unittest import main, skip, TestCase
 from unittest.mock import call, MagicMock, patch
 
 from pkwscraper.lib.controller import Controller, DbReferences
+from pkwscraper.lib.dbdriver import Table
+from pkwscraper.lib.results_cache import ResultsCache
+
+
+class EvaluatedUnits:
+    calls = []
+
+
+def cached_function_1(db):
+    EvaluatedUnits.calls.append((1, db))
+    return 10 * db
+
+
+def cached_function_2(db):
+    EvaluatedUnits.calls.append((2, db))
+    return -db
 
 
 class TestDbReferences(TestCase):
     """
-    - test inverse dict
+    - test get relation
+    - test get methods
+    - test split district
+    - test duplicated voting results
+    - test save and load
     """
     def setUp(self):
-        pass
+        records = {
+            "województwa": {"V1": {}, "V2": {}},
+            "okręgi": {
+                "O1": {"number": 1, "powiat_list": '["P1", "P2"]'},
+                "O2": {"number": 2, "powiat_list": '["P3"]'},
+                "O3": {"number": 3, "powiat_list": '["P4"]'},
+            },
+            "powiaty": {"P1": {"parent": "V1"}, "P2": {"parent": "V1"},
+                        "P3": {"parent": "V2"}, "P4": {"parent": "V2"}},
+            "gminy": {"G1": {"parent": "P2"}, "G2": {"parent": "P1"},
+                      "G3": {"parent": "P1"}, "G4": {"parent": "P3"},
+                      "G5": {"parent": "P4"}},
+            "obwody": {
+                "B1": {"gmina": "G2", "constituency": "O1"},
+                "B2": {"gmina": "G1", "constituency": "O1"},
+                "B3": {"gmina": "G2", "constituency": "O1"},
+                "B4": {"gmina": "G4", "constituency": "O2"},
+                "B5": {"gmina": "G5", "constituency": "O3"},
+            },
+            "protokoły": {"R1": {"obwod": "B3"}, "R2": {"obwod": "B1"},
+                          "R3": {"obwod": "B2"}, "R4": {"obwod": "B4"},
+                          "R5": {"obwod": "B5"}},
+            "listy": {"L1": {}, "L2": {}},
+            "kandydaci": {
+                "C1": {"constituency": "O1", "list": "L1"},
+                "C2": {"constituency": "O1", "list": "L2"},
+                "C3": {"constituency": "O2", "list": "L1"},
+                "C4": {"constituency": "O3", "list": "L2"},
+            },
+            "mandaty": {"M1": {"candidate": "C2"},
+                        "M2": {"candidate": "C3"}},
+            "wyniki_1": {"W1": {"obwod": "B1"}, "W2": {"obwod": "B2"},
+                         "W3": {"obwod": "B3"}},
+            "wyniki_2": {"W4": {"obwod": "B4"}},
+            "wyniki_3": {"W5": {"obwod": "B5"}},
+        }
+        tables = {}
+        for name, table_records in records.items():
+            tables[name] = Table()
+            for _id, record in table_records.items():
+                tables[name].put(record, _id=_id)
+        self.source_db = MagicMock()
+        self.source_db.__getitem__.side_effect = tables.__getitem__
+        self.source_db.table.side_effect = \
+            lambda name, columns=None: tables[name]
+        self.tables = tables
+        with patch("builtins.print"):
+            self.db_refs = DbReferences(self.source_db, "gminy")
 
     def tearDown(self):
         pass
 
-    def test_inverse_dict(self):
-        # arrange
-        dictionary_1 = {}
-        dictionary_2 = {
-            "Moscow": ["Russia"],
-            "Sankt Petersburg": ["Russia"],
-            "Washington": ["USA"],
-            "Chicago": ["USA"],
-            "New Jersey": ["USA"],
-        }
-        dictionary_3 = {
-            "Numbers": [1, 2, 3, 8, "O"], "Letters": ["a", "x", "O"],}
-        expected_1 = {}
-        expected_2 = {
-            "Russia": ["Moscow", "Sankt Petersburg"],
-            "USA": ["Washington", "Chicago", "New Jersey"],
-        }
-        expected_3 = {
-            1: ["Numbers"], 2: ["Numbers"], 3: ["Numbers"], 8: ["Numbers"],
-            "a": ["Letters"], "x": ["Letters"],
-            "O": ["Numbers", "Letters"]
-        }
+    def test_get_relation(self):
+        get_relation = self.db_refs.get_relation
+        # down the hierarchy, in order of tables
+        self.assertListEqual(get_relation("województwa", "gminy", "V1"),
+                             ["G1", "G2", "G3"])
+        self.assertListEqual(get_relation("voivodship", "okreg", "V2"),
+                             ["O2", "O3"])
+        self.assertListEqual(get_relation("okręgi", "powiaty", "O1"),
+                             ["P1", "P2"])
+        self.assertListEqual(get_relation("voivodship", "obwod", "V1"),
+                             ["B1", "B2", "B3"])
+        self.assertListEqual(get_relation("gmina", "protocole", "G2"),
+                             ["R1", "R2"])
+        self.assertListEqual(get_relation("gmina", "obwod", "G3"), [])
+        self.assertListEqual(get_relation("okreg", "mandate", "O1"), ["M1"])
+        # up the hierarchy
+        self.assertListEqual(get_relation("gminy", "powiaty", "G1"), ["P2"])
+        self.assertListEqual(get_relation("gmina", "okreg", "G4"), ["O2"])
+        self.assertListEqual(get_relation("gmina", "voivodship", "G5"),
+                             ["V2"])
+        self.assertListEqual(get_relation("okreg", "voivodship", "O3"),
+                             ["V2"])
+        self.assertListEqual(get_relation("protocole", "gmina", "R3"),
+                             ["G1"])
+        # through common ancestor
+        self.assertListEqual(get_relation("gmina", "candidate", "G2"),
+                             ["C1", "C2"])
+        self.assertListEqual(get_relation("powiat", "mandate", "P3"), ["M2"])
+        # lists of candidates, without repeating
+        self.assertListEqual(get_relation("voivodship", "list", "V2"),
+                             ["L1", "L2"])
+        self.assertListEqual(get_relation("okreg", "list", "O2"), ["L1"])
+        # identity
+        self.assertListEqual(get_relation("gminy", "gmina", "G1"), ["G1"])
+        # no relation
+        with self.assertRaises(ValueError):
+            get_relation("list", "gmina", "L1")
+
+    def test_get_methods(self):
+        # communes
+        self.assertListEqual(self.db_refs.get_gmina("G2"), ["G2"])
+        self.assertListEqual(self.db_refs.get_powiat("G2"), ["P1"])
+        self.assertListEqual(self.db_refs.get_okreg("G2"), ["O1"])
+        self.assertListEqual(self.db_refs.get_voivodship("G2"), ["V1"])
+        self.assertListEqual(self.db_refs.get_obwod("G2"), ["B1", "B3"])
+        self.assertListEqual(self.db_refs.get_protocole("G2"), ["R1", "R2"])
+        self.assertListEqual(self.db_refs.get_candidate("G2"), ["C1", "C2"])
+        self.assertListEqual(self.db_refs.get_list("G2"), ["L1", "L2"])
+        self.assertListEqual(self.db_refs.get_mandate("G2"), ["M1"])
+        self.assertDictEqual(self.db_refs.get_wyniki("G2"),
+                             {"wyniki_1": ["W1", "W3"]})
+        self.assertDictEqual(self.db_refs.get_wyniki("G3"), {"wyniki_1": []})
+
+        # voivodships
+        self.db_refs.granularity = "województwa"
+        self.assertListEqual(self.db_refs.get_powiat("V2"), ["P3", "P4"])
+        self.assertListEqual(self.db_refs.get_candidate("V2"), ["C3", "C4"])
+        self.assertDictEqual(self.db_refs.get_wyniki("V2"),
+                             {"wyniki_2": ["W4"], "wyniki_3": ["W5"]})
+
+    def test_split_district(self):
+        # arrange - district P3 is split between constituencies O2 and O3
+        self.tables["okręgi"].put(
+            {"number": 3, "powiat_list": '["P4", "P3"]'}, _id="O3")
+        self.tables["obwody"].put({"gmina": "G4", "constituency": "O3"},
+                                  _id="B6")
+        self.tables["wyniki_3"].put({"obwod": "B6"}, _id="W6")
         # act
-        result_1 = DbReferences._inverse_dict(dictionary_1)
-        result_2 = DbReferences._inverse_dict(dictionary_2)
-        result_3 = DbReferences._inverse_dict(dictionary_3)
+        with patch("builtins.print"):
+            db_refs = DbReferences(self.source_db, "gminy")
         # assert
-        self.assertDictEqual(result_1, expected_1)
-        self.assertDictEqual(result_2, expected_2)
-        self.assertDictEqual(result_3, expected_3)
-        # NOTE: this tests assumes dict insertion order preserved, so it
-        # is intended to be run on Python 3.7+
+        get_relation = db_refs.get_relation
+        self.assertListEqual(get_relation("obwod", "okreg", "B6"), ["O3"])
+        self.assertListEqual(get_relation("okreg", "obwod", "O2"), ["B4"])
+        self.assertListEqual(get_relation("okreg", "obwod", "O3"),
+                             ["B5", "B6"])
+        self.assertListEqual(get_relation("obwod", "voivodship", "B6"),
+                             ["V2"])
+        self.assertListEqual(get_relation("powiat", "obwod", "P3"),
+                             ["B4", "B6"])
+        self.assertDictEqual(db_refs.get_wyniki("G4"),
+                             {"wyniki_2": ["W4"], "wyniki_3": ["W6"]})
+        self.assertListEqual(db_refs.get_parents("obwod", "okreg").tolist(),
+                             [0, 0, 0, 1, 2, 2])
+
+    def test_duplicated_voting_results(self):
+        # arrange - the last record of polling district in table of
+        # its constituency is used, like before making arrays
+        self.tables["wyniki_1"].put({"obwod": "B1"}, _id="W7")
+        self.tables["wyniki_1"].put({"obwod": "B2"}, _id="W8")
+        self.tables["wyniki_2"].put({"obwod": "B1"}, _id="W9")
+        # act
+        with patch("builtins.print"):
+            db_refs = DbReferences(self.source_db, "gminy")
+        # assert
+        self.assertDictEqual(db_refs.get_wyniki("G2"),
+                             {"wyniki_1": ["W7", "W3"]})
+        self.assertDictEqual(db_refs.get_wyniki("G1"), {"wyniki_1": ["W8"]})
+        self.assertDictEqual(db_refs.get_wyniki("G4"), {"wyniki_2": ["W4"]})
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "relations.npz")
+            self.db_refs.save(filepath)
+            db_refs = DbReferences.load(filepath, "powiaty")
+
+        self.assertEqual(db_refs.granularity, "powiaty")
+        self.assertListEqual(db_refs.get_gmina("P1"), ["G2", "G3"])
+        self.assertListEqual(db_refs.get_obwod("P1"), ["B1", "B3"])
+        self.assertListEqual(db_refs.get_mandate("P1"), ["M1"])
+        self.assertDictEqual(db_refs.get_wyniki("P4"), {"wyniki_3": ["W5"]})
+        for array in db_refs.arrays.values():
+            self.assertNotEqual(array.dtype, object)
 
 
 class TestController(TestCase):
     """
     - test 
+    - test workers
+    - test evaluate
+    - test run many
+    - test evaluate cached
+    - test evaluate without fingerprint
     """
     def setUp(self):
         pass
@@ -68,6 +224,139 @@ class TestController(TestCase):
         
         pass
 
+    def test_workers(self):
+        # arrange
+        args = (("sejm", 2015), len, None, "communes", None, "communes")
+        # act
+        controller_1 = Controller(*args)
+        controller_2 = Controller(*args, workers=None, executor="thread")
+        with self.assertRaises(ValueError) as e:
+            Controller(*args, workers=2, executor="cluster")
+        # assert
+        self.assertEqual(controller_1.workers, 1)
+        self.assertEqual(controller_1.executor, "process")
+        self.assertEqual(controller_2.workers, os.cpu_count() or 1)
+        self.assertEqual(controller_2.executor, "thread")
+        self.assertEqual(e.exception.args[0],
+                         '`executor` should be one of: "process" or "thread"')
+
+    def test_evaluate(self):
+        # arrange
+        dbs = list(range(23))
+        functions = [lambda db: db ** 2, lambda db: -db]
+        expected = [[x ** 2, -x] for x in dbs]
+        controller = Controller.__new__(Controller)
+        controller._db_refs = None
+        # act & assert
+        for workers, executor in [(1, "process"), (3, "thread"),
+                                  (3, "process")]:
+            controller.workers = workers
+            controller.executor = executor
+            self.assertListEqual(controller._evaluate(dbs, functions),
+                                 expected)
+        # threads are used if processes cannot be forked
+        with patch("pkwscraper.lib.controller.multiprocessing"
+                   ".get_all_start_methods", return_value=["spawn"]), \
+                patch("pkwscraper.lib.controller.ProcessPoolExecutor") \
+                as process_pool:
+            self.assertListEqual(controller._evaluate(dbs, functions),
+                                 expected)
+        process_pool.assert_not_called()
+        # votes of units are loaded once, before forking workers
+        controller._db_refs = MagicMock()
+        controller._get_vote_cube = MagicMock()
+        self.assertListEqual(controller._evaluate(dbs, functions), expected)
+        controller._get_vote_cube.assert_called_once_with()
+
+    def test_run_many(self):
+        # arrange
+        controller = Controller.__new__(Controller)
+        controller.source_db = None
+        controller.workers = 1
+        controller.cache = None
+        controller._load_db = MagicMock()
+        controller._split_units = MagicMock(
+            return_value=(["u1", "u2", "u3"], [1, 2, 3], ["r1", "r2", "r3"]))
+        controller._render = MagicMock()
+        function_1 = MagicMock(side_effect=lambda db: 10 * db)
+        function_2 = MagicMock(side_effect=lambda db: -db)
+        tasks = [(function_1, "cmap_1", "first.png"),
+                 (function_2, "cmap_2", None)]
+        # act
+        controller.run_many(tasks)
+        # assert
+        controller._load_db.assert_called_once_with()
+        controller._split_units.assert_called_once_with()
+        self.assertEqual(function_1.call_count, 3)
+        self.assertEqual(function_2.call_count, 3)
+        controller._render.assert_has_calls([
+            call(["r1", "r2", "r3"], [10, 20, 30], "cmap_1", "first.png"),
+            call(["r1", "r2", "r3"], [-1, -2, -3], "cmap_2", None),
+        ])
+
+    def test_evaluate_cached(self):
+        # arrange
+        controller = Controller(
+            ("sejm", 2015), None, None, "communes", None, "communes")
+        controller.source_db = MagicMock()
+        controller.source_db.version.return_value = "v1"
+        EvaluatedUnits.calls = []
+        with tempfile.TemporaryDirectory() as directory:
+            controller.cache = ResultsCache(directory)
+            # act
+            result_1 = controller._evaluate_cached(
+                ["u1", "u2"], [1, 2], [cached_function_1])
+            result_2 = controller._evaluate_cached(
+                ["u1", "u2", "u3"], [1, 2, 3],
+                [cached_function_1, cached_function_2])
+            result_3 = controller._evaluate_cached(
+                ["u3", "u1"], [3, 1], [cached_function_1, cached_function_2])
+            controller.source_db.version.return_value = "v2"
+            result_4 = controller._evaluate_cached(
+                ["u1"], [1], [cached_function_1])
+            result_5 = controller._evaluate_cached(
+                ["u3", "u1"], [3, 1], [cached_function_1, cached_function_2])
+            controller.clear_cache(cached_function_1)
+            result_6 = controller._evaluate_cached(
+                ["u1"], [1], [cached_function_1, cached_function_2])
+        # assert
+        self.assertListEqual(result_1, [[10], [20]])
+        self.assertListEqual(result_2, [[10, -1], [20, -2], [30, -3]])
+        self.assertListEqual(result_3, [[30, -3], [10, -1]])
+        self.assertListEqual(result_4, [[10]])
+        self.assertListEqual(result_5, [[30, -3], [10, -1]])
+        self.assertListEqual(result_6, [[10, -1]])
+        # only values not saved before were evaluated
+        self.assertListEqual(EvaluatedUnits.calls, [
+            (1, 1), (1, 2),
+            (1, 3), (2, 1), (2, 2), (2, 3),
+            (1, 1),
+            (1, 3), (2, 3), (2, 1),
+            (1, 1)])
+
+    def test_evaluate_without_fingerprint(self):
+        # arrange
+        controller = Controller(
+            ("sejm", 2015), None, None, "communes", None, "communes")
+        controller.source_db = MagicMock()
+        controller.source_db.version.return_value = "v1"
+        EvaluatedUnits.calls = []
+        lock = threading.Lock()
+
+        def locked_function(db):
+            with lock:
+                return 2 * db
+
+        with tempfile.TemporaryDirectory() as directory:
+            controller.cache = ResultsCache(directory)
+            # act
+            result = controller._evaluate_cached(
+                ["u1", "u2"], [1, 2], [locked_function, cached_function_1])
+            files = os.listdir(directory)
+        # assert
+        self.assertListEqual(result, [[2, 10], [4, 20]])
+        self.assertEqual(len(files), 1)
+        self.assertListEqual(EvaluatedUnits.calls, [(1, 1), (1, 2)])
 
 if __name__ == "__main__":
     main()
@@ -1,5 +1,7 @@
 
+import json
 import os
+import pickle
 import shutil
 from unittest import main, skip, TestCase
 from unittest.mock import call, MagicMock, patch
@@ -7,7 +9,10 @@ from unittest.mock import call, MagicMock, patch
 import numpy as np
 from pandas import DataFrame, Series
 
-from pkwscraper.lib.dbdriver import DbDriver, Record, Table
+from pkwscraper.lib.dbdriver import (
+    Column, ColumnarTable, CompactRecord, CompactTable, DbDriver, DbView,
+    HashIndex, Record, RecordSchema, SortedIndex, SqliteTable, Table,
+    TableView, TextColumn)
 
 
 '''
@@ -52,6 +57,14 @@ class TestUUID(TestCase):
         uuid = Record._make_uuid()
         assertUUID(self, uuid)
 
+    def test_many_uuids(self):
+        uuids = Record._make_uuids(100)
+        self.assertEqual(len(uuids), 100)
+        self.assertEqual(len(set(uuids)), 100)
+        for uuid in uuids:
+            assertUUID(self, uuid)
+        self.assertListEqual(Record._make_uuids(0), [])
+
 
 class TestRecord(TestCase):
     """
@@ -66,6 +79,7 @@ class TestRecord(TestCase):
     - test wrong fields
     - test to id dict
     - test check condition
+    - test check condition operators
     - test eq
     """
     def setUp(self):
@@ -143,6 +157,12 @@ class TestRecord(TestCase):
         self.assertEqual(rec_id, 123)
         self.assertDictEqual(rec_data, {"num": 5, "char": "A"})
 
+    def test_get_index_key(self):
+        self.assertTupleEqual(self.rec.get_index_key(("num",)), (5,))
+        self.assertTupleEqual(
+            self.rec.get_index_key(("char", "num")), ("A", 5))
+        self.assertIsNone(self.rec.get_index_key(("char", "other")))
+
     def test_check_condition(self):
         self.assertTrue(self.rec.check_condition({}))
         self.assertTrue(self.rec.check_condition({"char": "A"}))
@@ -156,6 +176,32 @@ class TestRecord(TestCase):
         self.assertFalse(self.rec.check_condition({"_id": 123}))
         self.assertFalse(self.rec.check_condition({"_id": 147}))
 
+    def test_check_condition_operators(self):
+        self.assertTrue(self.rec.check_condition({"num": {"$gt": 4}}))
+        self.assertFalse(self.rec.check_condition({"num": {"$gt": 5}}))
+        self.assertTrue(self.rec.check_condition({"num": {"$gte": 5}}))
+        self.assertTrue(self.rec.check_condition(
+            {"num": {"$gt": 1, "$lt": 6}, "char": "A"}))
+        self.assertFalse(self.rec.check_condition(
+            {"num": {"$gt": 1, "$lte": 4}}))
+        self.assertTrue(self.rec.check_condition({"char": {"$lt": "B"}}))
+        # not comparable types
+        self.assertFalse(self.rec.check_condition({"char": {"$gt": 1}}))
+        self.assertFalse(self.rec.check_condition({"num": {"$lt": "B"}}))
+        self.assertTrue(self.rec.check_condition({"num": {"$in": [4, 5]}}))
+        self.assertFalse(self.rec.check_condition({"num": {"$in": []}}))
+        self.assertTrue(self.rec.check_condition({"num": {"$ne": 4}}))
+        self.assertFalse(self.rec.check_condition({"num": {"$ne": 5}}))
+        self.assertTrue(self.rec.check_condition({"other": {"$ne": 5}}))
+        self.assertFalse(self.rec.check_condition({"other": {"$gt": 5}}))
+        self.assertTrue(self.rec.check_condition({"num": {"$exists": True}}))
+        self.assertTrue(self.rec.check_condition(
+            {"other": {"$exists": False}}))
+        self.assertFalse(self.rec.check_condition(
+            {"other": {"$exists": True}}))
+        with self.assertRaises(ValueError):
+            self.rec.check_condition({"num": {"$regex": "5"}})
+
     def test_eq(self):
         rec_2 = Record.from_dict({"char": "A", "num": 5}, _id=456)
         self.assertEqual(self.rec, rec_2)
@@ -166,9 +212,192 @@ class TestRecord(TestCase):
         self.assertEqual(self.rec, {"char": "A", "num": 5})
 
 
+class TestCompactRecord(TestCase):
+    """
+    - test from dict
+    - test shared schema
+    - test get fields
+    - test to id dict
+    - test add fields
+    - test get index key
+    - test check condition
+    - test eq
+    """
+    def setUp(self):
+        self.schema = RecordSchema()
+        self.rec = CompactRecord.from_dict(
+            self.schema, {"num": 5, "char": "A"}, _id=123)
+
+    def tearDown(self):
+        pass
+
+    def test_from_dict(self):
+        self.assertEqual(self.rec._id, 123)
+        self.assertTupleEqual(self.rec._values, (5, "A"))
+        self.assertEqual(self.rec._present, 0b11)
+        rec_2 = CompactRecord.from_dict(self.schema, {"char": "B", "_id": 4})
+        self.assertEqual(rec_2._id, 4)
+        rec_3 = CompactRecord.from_dict(self.schema, {"num": 6})
+        assertUUID(self, rec_3._id)
+
+    def test_shared_schema(self):
+        rec_2 = CompactRecord.from_dict(
+            self.schema, {"other": None, "char": "B"})
+        self.assertListEqual(self.schema.fields, ["num", "char", "other"])
+        self.assertTupleEqual(rec_2._values, (None, "B", None))
+        self.assertEqual(rec_2._present, 0b110)
+        self.assertFalse(hasattr(rec_2, "__dict__"))
+
+    def test_get_fields(self):
+        self.assertEqual(self.rec["_id"], 123)
+        self.assertEqual(self.rec["char"], "A")
+        self.assertIsNone(self.rec["other"])
+        self.assertListEqual(
+            self.rec.get_fields_list(["char", "_id", "char", "num"]),
+            ["A", 123, "A", 5])
+        with self.assertRaises(TypeError):
+            self.rec.get_fields_list(("char", "num"))
+
+    def test_to_id_dict(self):
+        rec_id, rec_data = self.rec.to_id_dict()
+        self.assertEqual(rec_id, 123)
+        self.assertDictEqual(rec_data, {"num": 5, "char": "A"})
+        rec_2 = CompactRecord.from_dict(self.schema, {"x": None})
+        self.assertDictEqual(rec_2.to_dict(), {"x": None})
+        self.assertDictEqual(self.rec.to_dict(), {"num": 5, "char": "A"})
+
+    def test_add_fields(self):
+        CompactRecord.from_dict(self.schema, {"x": 1})
+        self.rec.add_fields({"y": 2, "num": 7})
+        self.assertDictEqual(self.rec.to_dict(),
+                             {"num": 7, "char": "A", "y": 2})
+        self.assertIsNone(self.rec["x"])
+
+    def test_get_index_key(self):
+        self.assertTupleEqual(self.rec.get_index_key(("num",)), (5,))
+        self.assertTupleEqual(
+            self.rec.get_index_key(("char", "num")), ("A", 5))
+        self.assertIsNone(self.rec.get_index_key(("char", "other")))
+
+    def test_check_condition(self):
+        self.assertTrue(self.rec.check_condition({}))
+        self.assertTrue(self.rec.check_condition({"char": "A", "num": 5}))
+        self.assertFalse(self.rec.check_condition({"char": "A", "num": 6}))
+        self.assertFalse(self.rec.check_condition(
+            {"char": "A", "other": None}))
+        self.assertFalse(self.rec.check_condition({"_id": 123}))
+        self.assertTrue(self.rec.check_condition(
+            {"num": {"$gte": 5}, "char": {"$in": ["A", "B"]}}))
+        self.assertFalse(self.rec.check_condition({"num": {"$ne": 5}}))
+        self.assertTrue(self.rec.check_condition(
+            {"other": {"$exists": False}}))
+
+    def test_eq(self):
+        self.assertEqual(self.rec, {"char": "A", "num": 5})
+        self.assertEqual(self.rec, Record({"char": "A", "num": 5}, 1))
+        self.assertNotEqual(
+            self.rec, CompactRecord.from_dict(self.schema, {"num": 5}))
+
+
+class TestHashIndex(TestCase):
+    """
+    - test add and lookup
+    - test remove
+    - test none key
+    - test to dict and from dict
+    """
+    def setUp(self):
+        self.index = HashIndex(("char", "num"))
+        self.index.add(("a", 1), "id_1")
+        self.index.add(("a", 1), "id_2")
+        self.index.add(("b", 1), "id_3")
+
+    def tearDown(self):
+        pass
+
+    def test_add_and_lookup(self):
+        self.assertTupleEqual(self.index.fields, ("char", "num"))
+        self.assertListEqual(list(self.index.lookup(("a", 1))),
+                             ["id_1", "id_2"])
+        self.assertListEqual(list(self.index.lookup(("b", 1))), ["id_3"])
+        self.assertListEqual(list(self.index.lookup(("c", 1))), [])
+        self.assertEqual(len(self.index), 2)
+
+    def test_remove(self):
+        self.index.remove(("a", 1), "id_1")
+        self.assertListEqual(list(self.index.lookup(("a", 1))), ["id_2"])
+        self.index.remove(("b", 1), "id_3")
+        self.assertListEqual(list(self.index.lookup(("b", 1))), [])
+        self.assertEqual(len(self.index), 1)
+        with self.assertRaises(KeyError):
+            self.index.remove(("b", 1), "id_3")
+
+    def test_none_key(self):
+        self.index.add(None, "id_4")
+        self.index.remove(None, "id_4")
+        self.assertEqual(len(self.index), 2)
+
+    def test_to_dict_and_from_dict(self):
+        buckets = self.index.to_dict()
+        self.assertDictEqual(buckets, {
+            ("a", 1): ["id_1", "id_2"], ("b", 1): ["id_3"]})
+        index = HashIndex.from_dict(("char", "num"), buckets)
+        self.assertTupleEqual(index.fields, ("char", "num"))
+        self.assertDictEqual(index.to_dict(), buckets)
+
+
+class TestSortedIndex(TestCase):
+    """
+    - test range ids
+    - test remove
+    - test to dict and from dict
+    - test single field only
+    """
+    def setUp(self):
+        self.index = SortedIndex(("num",))
+        for i, value in enumerate([5, 1, 3.5, "b", 3, "a", None, 5]):
+            self.index.add((value,), f"id_{i}")
+
+    def tearDown(self):
+        pass
+
+    def test_range_ids(self):
+        self.assertListEqual(self.index.range_ids(3, 5),
+                             ["id_4", "id_2", "id_0", "id_7"])
+        self.assertListEqual(self.index.range_ids(3, 5, low_inclusive=False,
+                                                  high_inclusive=False),
+                             ["id_2"])
+        self.assertListEqual(self.index.range_ids(high=3), ["id_1", "id_4"])
+        self.assertListEqual(self.index.range_ids(low="a"), ["id_5", "id_3"])
+        self.assertListEqual(self.index.range_ids(1, "b"), [])
+        self.assertListEqual(self.index.range_ids(), [])
+        self.assertListEqual(list(self.index.lookup((None,))), ["id_6"])
+
+    def test_remove(self):
+        self.index.remove((5,), "id_0")
+        self.assertListEqual(self.index.range_ids(low=4), ["id_7"])
+        self.index.remove((5,), "id_7")
+        self.assertListEqual(self.index.range_ids(low=4), [])
+        self.index.remove(("a",), "id_5")
+        self.assertListEqual(self.index.range_ids(low="a"), ["id_3"])
+
+    def test_to_dict_and_from_dict(self):
+        buckets = self.index.to_dict()
+        index = SortedIndex.from_dict(("num",), buckets)
+        self.assertDictEqual(index.to_dict(), buckets)
+        self.assertListEqual(index.range_ids(3, 5),
+                             self.index.range_ids(3, 5))
+
+    def test_single_field_only(self):
+        with self.assertRaises(ValueError):
+            SortedIndex(("num", "char"))
+
+
 class TestTable(TestCase):
     """
     - test put
+    - test put many
+    - test int keys
     - test get
     - test find
     - test find multiple criteria
@@ -176,6 +405,26 @@ class TestTable(TestCase):
     - test find one with fields
     - test find with fields
     - test to df
+    - test to df dtypes
+    - test from dfs
+    - test changes tracking
+    - test create index
+    - test create index wrong fields
+    - test drop index
+    - test put updates index
+    - test find with index
+    - test find one with index
+    - test most selective index
+    - test index groups
+    - test export and import indexes
+    - test import stale indexes
+    - test attach indexes
+    - test find with operators
+    - test sorted index
+    - test aggregate
+    - test aggregate groups
+    - test explain
+    - test query log
     """
     def setUp(self):
         self.table = Table()
@@ -225,6 +474,53 @@ class TestTable(TestCase):
             "lid": {"a": 0, "b": 1}
         })
 
+    def test_put_many(self):
+        t = Table()
+        t.create_index("a")
+        records = [{"a": 1, "b": 2}, {"a": 3, "_id": "rid"}, {"b": 4}]
+        ids = t.put_many(records)
+        assertUUID(self, ids[0])
+        self.assertEqual(ids[1], "rid")
+        assertUUID(self, ids[2])
+        self.assertDictEqual(records[1], {"a": 3, "_id": "rid"})
+        self.assertDictEqual(t.find({}), {
+            ids[0]: {"a": 1, "b": 2}, "rid": {"a": 3}, ids[2]: {"b": 4}})
+
+        # explicit IDs and overwriting
+        ids_2 = t.put_many([{"a": 5}, {"a": 1, "_id": "x"}],
+                           ids=["rid", "lid"])
+        self.assertListEqual(ids_2, ["rid", "lid"])
+        self.assertListEqual(t.find({"a": 5}, "_id"), ["rid"])
+        self.assertListEqual(t.find({"a": 1}, "_id"), [ids[0], "lid"])
+        self.assertListEqual(t.find({"a": 3}, "_id"), [])
+
+        with self.assertRaises(ValueError):
+            t.put_many([{"a": 1}], ids=[])
+        t_2 = Table(read_only=True)
+        with self.assertRaises(IOError):
+            t_2.put_many([{"a": 1}])
+
+    def test_int_keys(self):
+        for table_class in [Table, CompactTable]:
+            t = table_class()
+            t.keys = "int"
+            self.assertEqual(t.put({"a": 1}), 0)
+            self.assertEqual(t.put({"a": 2, "_id": "rid"}), "rid")
+            self.assertEqual(t.put({"a": 3}), 1)
+            self.assertEqual(t.put({"a": 4}, _id=10), 10)
+            self.assertListEqual(t.put_many([{"a": 5}, {"a": 6, "_id": 3}]),
+                                 [11, 3])
+            self.assertEqual(t.put({"a": 7}), 12)
+            self.assertListEqual(t.find({}, "_id"), [0, "rid", 1, 10, 11, 3, 12])
+
+        # loaded table continues numbering
+        df = DataFrame({"a": [1, 2]}, index=[4, 7])
+        df.index.name = "_id"
+        t = Table.from_df(df)
+        assertUUID(self, t.put({"a": 3}))
+        t.keys = "int"
+        self.assertEqual(t.put({"a": 4}), 8)
+
     def test_table_get(self):
         t = Table()
 
@@ -395,6 +691,1000 @@ class TestTable(TestCase):
         self.assertEqual(len(t2._Table__data), 4)
         self.assertDictEqual(t._Table__data, t2._Table__data)
 
+    def test_to_df_dtypes(self):
+        t = self.table
+        t.put({"char": "c", "num": 4.5, "flag": True}, _id="fid")
+        df = t.to_df()
+        self.assertListEqual(df.columns.tolist(),
+                             ["char", "num", "num2", "val", "flag"])
+        self.assertEqual(df["num"].dtype, object)
+        self.assertEqual(df["num2"].dtype, object)
+        self.assertTrue(df["num2"].isna()["fid"])
+        df = t.to_df(ids=self.ids[:3])
+        self.assertEqual(df["num"].dtype, np.int64)
+        self.assertEqual(df["num2"].dtype, np.int64)
+        self.assertListEqual(df.index.tolist(), list(self.ids[:3]))
+        self.assertEqual(Table().to_df().index.name, "_id")
+
+    def test_from_dfs(self):
+        df = self.table.to_df()
+        t2 = Table.from_dfs([df.iloc[:1], df.iloc[1:3], df.iloc[3:]])
+        self.assertDictEqual(self.table._Table__data, t2._Table__data)
+        t3 = ColumnarTable.from_dfs([df.iloc[:1], df.iloc[1:3], df.iloc[3:]])
+        self.assertDictEqual(t3.find({}), self.table.find({}))
+        self.assertDictEqual(Table.from_dfs([])._Table__data, {})
+        self.assertDictEqual(ColumnarTable.from_dfs([]).find({}), {})
+
+    def test_changes_tracking(self):
+        t = self.table
+        self.assertTrue(t._dirty)
+        self.assertIsNone(t._appended_ids)
+        t._mark_saved()
+        self.assertFalse(t._dirty)
+        new_id = t.put({"num": 5})
+        self.assertTrue(t._dirty)
+        self.assertListEqual(t._appended_ids, [new_id])
+        t.put({"num": 6}, _id="kid")
+        self.assertIsNone(t._appended_ids)
+        t._mark_saved()
+        t.create_index("num")
+        self.assertFalse(t._dirty)
+        self.assertTrue(t._indexes_changed)
+
+    def test_create_index(self):
+        t = self.table
+        id_1, id_2, id_3, id_4 = self.ids
+
+        t.create_index("num2")
+        t.create_index(["char", "num"])
+        t.create_index(("char", "num"))
+
+        indexes = t._BaseTable__indexes
+        self.assertSetEqual(set(indexes), {("num2",), ("char", "num")})
+        self.assertListEqual(
+            list(indexes[("num2",)].lookup((10,))), [id_1, id_3])
+        self.assertListEqual(
+            list(indexes[("num2",)].lookup((11,))), [id_2])
+        self.assertListEqual(
+            list(indexes[("char", "num")].lookup(("b", 3))), [id_3, id_4])
+
+    def test_create_index_wrong_fields(self):
+        with self.assertRaises(TypeError):
+            self.table.create_index([])
+        with self.assertRaises(TypeError):
+            self.table.create_index(5)
+
+    def test_drop_index(self):
+        t = self.table
+        t.create_index("num")
+        t.drop_index("num")
+        self.assertDictEqual(t._BaseTable__indexes, {})
+        with self.assertRaises(KeyError):
+            t.drop_index("num")
+
+    def test_put_updates_index(self):
+        t = self.table
+        id_1, id_2, id_3, id_4 = self.ids
+        t.create_index("num2")
+
+        # new record
+        id_5 = t.put({"char": "c", "num2": 10})
+        # record moved to other key
+        t.put({"char": "a", "num": 2, "num2": 10}, _id=id_2)
+        # record losing indexed field
+        t.put({"char": "b", "num": 3}, _id=id_3)
+
+        index = t._BaseTable__indexes[("num2",)]
+        self.assertListEqual(list(index.lookup((10,))), [id_1, id_5, id_2])
+        self.assertListEqual(list(index.lookup((11,))), [])
+        self.assertSetEqual(set(t.find({"num2": 10})), {id_1, id_2, id_5})
+
+    def test_find_with_index(self):
+        t = self.table
+        id_1, id_2, id_3, id_4 = self.ids
+        expected = [t.find(query) for query in [
+            {"num": 3}, {"num": 3, "char": "b"}, {"num2": 10, "num": 3},
+            {"num": 667}, {"val": 20, "num": 3}, {}]]
+
+        t.create_index("num")
+        t.create_index(["char", "num"])
+        results = [t.find(query) for query in [
+            {"num": 3}, {"num": 3, "char": "b"}, {"num2": 10, "num": 3},
+            {"num": 667}, {"val": 20, "num": 3}, {}]]
+
+        self.assertListEqual(results, expected)
+        self.assertListEqual(
+            t.find({"num": 3, "char": "b"}, fields="_id"), [id_3, id_4])
+
+    def test_find_one_with_index(self):
+        t = self.table
+        id_1, id_2, id_3, id_4 = self.ids
+        t.create_index("num")
+
+        self.assertEqual(t.find_one({"num": 3, "val": 20}, "_id"), id_4)
+        self.assertEqual(t.find_one({"num": 2}, "_id"), id_2)
+        self.assertIsNone(t.find_one({"num": 2, "char": "b"}))
+        self.assertIsNone(t.find_one({"num": [2]}))
+
+    def test_most_selective_index(self):
+        t = self.table
+        id_1, id_2, id_3, id_4 = self.ids
+        t.create_index("char")
+        t.create_index("num2")
+
+        ids = t._indexed_ids({"char": "a", "num2": 11})
+        self.assertListEqual(list(ids), [id_2])
+        ids = t._indexed_ids({"char": "b", "num2": 10})
+        self.assertEqual(len(ids), 2)
+        self.assertIsNone(t._indexed_ids({"num": 3}))
+
+    def test_index_groups(self):
+        t = self.table
+        id_1, id_2, id_3, id_4 = self.ids
+
+        groups = t.index_groups("num2")
+        self.assertDictEqual(groups, {10: [id_1, id_3], 11: [id_2]})
+        self.assertIn(("num2",), t._BaseTable__indexes)
+
+        groups = t.index_groups(["char", "num"])
+        self.assertDictEqual(groups, {
+            ("a", 1): [id_1], ("a", 2): [id_2], ("b", 3): [id_3, id_4]})
+
+    def test_export_and_import_indexes(self):
+        t = self.table
+        id_1, id_2, id_3, id_4 = self.ids
+        t.create_index("num")
+        exported = t._export_indexes()
+        self.assertDictEqual(exported, {
+            ("num",): {(1,): [id_1], (2,): [id_2], (3,): [id_3, id_4]}})
+
+        t2 = Table.from_df(t.to_df())
+        t2._import_indexes(exported)
+        self.assertDictEqual(t2._export_indexes(), exported)
+
+    def test_import_stale_indexes(self):
+        t = self.table
+        id_1, id_2, id_3, id_4 = self.ids
+        # keys have different type than values in records
+        stale_indexes = {
+            ("num",): {("1",): [id_1], ("2",): [id_2], ("3",): [id_3, id_4]}}
+
+        t._import_indexes(stale_indexes)
+
+        self.assertDictEqual(t._export_indexes(), {
+            ("num",): {(1,): [id_1], (2,): [id_2], (3,): [id_3, id_4]}})
+
+    def test_attach_indexes(self):
+        t = self.table
+        id_1, id_2, id_3, id_4 = self.ids
+        loader = MagicMock()
+        loader.return_value = {("num2",): {(10,): [id_1, id_3], (11,): [id_2]}}
+
+        t._attach_indexes(loader)
+        loader.assert_not_called()
+
+        self.assertEqual(t.find_one({"num2": 11}, "_id"), id_2)
+        self.assertEqual(t.find_one({"num2": 10}, "_id"), id_1)
+        loader.assert_called_once_with()
+        self.assertIn(("num2",), t._BaseTable__indexes)
+
+    def test_find_with_operators(self):
+        t = self.table
+        id_1, id_2, id_3, id_4 = self.ids
+        self.assertListEqual(t.find({"num": {"$gte": 2}}, "_id"),
+                             [id_2, id_3, id_4])
+        self.assertListEqual(
+            t.find({"num": {"$gt": 1, "$lt": 3}, "char": "a"}, "_id"), [id_2])
+        self.assertListEqual(t.find({"num2": {"$in": [11, 10]}}, "_id"),
+                             [id_1, id_2, id_3])
+        self.assertListEqual(t.find({"num2": {"$ne": 10}}, "_id"),
+                             [id_2, id_4])
+        self.assertListEqual(t.find({"val": {"$exists": True}}, "_id"),
+                             [id_4])
+        self.assertEqual(t.find_one({"char": {"$gt": "a"}}, "_id"), id_3)
+        with self.assertRaises(ValueError):
+            t.find({"num": {"$lt": 1, "$near": 2}})
+
+        # the same results with indexes
+        t.create_index("num2")
+        self.assertListEqual(t.find({"num2": {"$in": [11, 10]}}, "_id"),
+                             [id_1, id_2, id_3])
+        self.assertEqual(len(t._indexed_ids({"num2": {"$in": [11, 10]}})), 3)
+        self.assertIsNone(t._indexed_ids({"num2": {"$gt": 10}}))
+
+    def test_sorted_index(self):
+        t = self.table
+        id_1, id_2, id_3, id_4 = self.ids
+        t.create_index("num")
+        t.create_index("num", kind="sorted")
+        self.assertIsInstance(t._BaseTable__indexes[("num",)], SortedIndex)
+        # hash index does not replace sorted one
+        t.create_index("num")
+        self.assertIsInstance(t._BaseTable__indexes[("num",)], SortedIndex)
+        with self.assertRaises(ValueError):
+            t.create_index("num", kind="tree")
+        with self.assertRaises(ValueError):
+            t.create_index(["num", "char"], kind="sorted")
+
+        self.assertListEqual(list(t._indexed_ids({"num": {"$gte": 2}})),
+                             [id_2, id_3, id_4])
+        t.put({"char": "c", "num": 0}, _id=id_3)
+        self.assertListEqual(t.find({"num": {"$lte": 2}}, "_id"),
+                             [id_1, id_2, id_3])
+        self.assertListEqual(t.find({"num": 3}, "_id"), [id_4])
+
+        # export marks sorted indexes
+        exported = t._export_indexes()
+        self.assertDictEqual(exported, {("num",): ("sorted", {
+            (1,): [id_1], (2,): [id_2], (3,): [id_4], (0,): [id_3]})})
+        t2 = Table.from_df(t.to_df())
+        t2._import_indexes(exported)
+        self.assertIsInstance(t2._BaseTable__indexes[("num",)], SortedIndex)
+        self.assertListEqual(t2.find({"num": {"$lt": 2}}, "_id"),
+                             [id_1, id_3])
+
+    def test_aggregate(self):
+        t = self.table
+        self.assertDictEqual(t.aggregate(sums=["num", "num2", "other"]),
+                             {"num": 9, "num2": 31, "other": 0})
+        self.assertDictEqual(
+            t.aggregate(sums=["num2"], count=True, query={"char": "a"}),
+            {"num2": 21, "_count": 2})
+        self.assertDictEqual(t.aggregate(count=True, query={"char": "c"}),
+                             {"_count": 0})
+        with self.assertRaises(TypeError):
+            t.aggregate(sums=["char"])
+
+    def test_aggregate_groups(self):
+        t = self.table
+        t.put({"char": "c", "num": 1.5})
+        self.assertDictEqual(
+            t.aggregate("char", sums=["num", "val"], count=True), {
+                "a": {"num": 3, "val": 0, "_count": 2},
+                "b": {"num": 6, "val": 20, "_count": 2},
+                "c": {"num": 1.5, "val": 0, "_count": 1}})
+        self.assertDictEqual(
+            t.aggregate(["char", "num2"], sums=["num"],
+                        query={"num": {"$gt": 1}}), {
+                ("a", 11): {"num": 2}, ("b", 10): {"num": 3}})
+        self.assertDictEqual(t.aggregate("other", sums=["num"]), {})
+
+    def test_explain(self):
+        t = self.table
+        plan = t.explain({"char": "b"})
+        self.assertEqual(plan["method"], "scan")
+        self.assertIsNone(plan["index"])
+        self.assertEqual(plan["scanned"], 4)
+        self.assertEqual(plan["returned"], 2)
+        self.assertGreaterEqual(plan["time"], 0)
+
+        t.create_index("char")
+        t.create_index(["char", "num"])
+        plan = t.explain({"char": "a", "num": 2, "num2": 10})
+        self.assertEqual(plan["method"], "index")
+        self.assertEqual(plan["index"], ("char", "num"))
+        self.assertEqual(plan["scanned"], 1)
+        self.assertEqual(plan["returned"], 0)
+
+        columnar_table = ColumnarTable.from_df(t.to_df())
+        plan = columnar_table.explain({"num": {"$gt": 1}})
+        self.assertEqual(plan["method"], "column mask")
+        self.assertEqual(plan["returned"], 3)
+
+        plan = TableView(t, list(self.ids[1:])).explain({"char": "b"})
+        self.assertEqual(plan["method"], "subset")
+        self.assertEqual(plan["scanned"], 3)
+        self.assertEqual(plan["returned"], 2)
+
+    def test_query_log(self):
+        t = self.table
+        log = []
+        t.query_log = log.append
+        t.slow_query_time = 0
+        t.create_index("char")
+        self.assertEqual(t.find_one({"char": "b"}, "_id"), "kid")
+        t.find({"num": {"$gte": 2}})
+        TableView(t, list(self.ids[:2])).find({"char": "b"})
+        self.assertListEqual(
+            [(entry["method"], entry["plan"], entry["scanned"],
+              entry["returned"]) for entry in log],
+            [("find_one", "index", 2, 1), ("find", "scan", 4, 3),
+             ("find", "subset", 2, 0)])
+        self.assertDictEqual(log[0]["query"], {"char": "b"})
+
+        # plan of search is made once for searching and logging
+        with patch.object(t, "_plan", wraps=t._plan) as plan_mock:
+            t.find({"char": "b"})
+            t.find_one({"num": 2})
+        self.assertEqual(plan_mock.call_count, 2)
+
+        # fast queries are not logged
+        t.slow_query_time = 10
+        t.find({})
+        self.assertEqual(len(log), 5)
+
+
+class TestCompactTable(TestCase):
+    """
+    - test same results as table
+    - test from df
+    - test indexes
+    """
+    def setUp(self):
+        records = [{"a": i % 3, "b": str(i % 2), "c": i / 2}
+                   for i in range(20)]
+        records[5]["d"] = True
+        records[7].pop("a")
+        self.table = Table()
+        self.compact_table = CompactTable()
+        for i, record in enumerate(records):
+            self.table.put(record, _id=i)
+            self.compact_table.put(record, _id=i)
+
+    def tearDown(self):
+        pass
+
+    def test_same_results_as_table(self):
+        for query in [{}, {"a": 1}, {"a": 1, "b": "1"}, {"d": True},
+                      {"c": 2}, {"a": "1"}, {"b": 1}, {"c": {"$gt": 4.5}},
+                      {"a": {"$in": [0, 2]}, "c": {"$lte": 3}},
+                      {"a": {"$ne": 1}}, {"b": {"$gte": "1"}},
+                      {"a": {"$exists": False}}, {"d": {"$ne": False}}]:
+            self.assertDictEqual(
+                self.table.find(query), self.compact_table.find(query))
+            self.assertListEqual(
+                self.table.find(query, ["c", "_id", "a"]),
+                self.compact_table.find(query, ["c", "_id", "a"]))
+            self.assertEqual(self.table.find_one(query),
+                             self.compact_table.find_one(query))
+        self.assertDictEqual(self.table[7], self.compact_table[7])
+
+    def test_from_df(self):
+        df = self.table.to_df()
+        compact_table = CompactTable.from_dfs([df.iloc[:5], df.iloc[5:]])
+        self.assertDictEqual(compact_table.find({}), self.table.find({}))
+        self.assertIsInstance(compact_table._Table__data[0], CompactRecord)
+        self.assertDictEqual(compact_table[7], {"b": "1", "c": 3.5})
+        self.assertEqual(len(compact_table._schema), 4)
+
+    def test_indexes(self):
+        self.compact_table.create_index(["a", "b"])
+        self.assertListEqual(
+            self.compact_table.find({"a": 1, "b": "1"}, "_id"), [1, 13, 19])
+        self.compact_table.put({"a": 1, "b": "1"}, _id=7)
+        self.assertListEqual(
+            self.compact_table.find({"a": 1, "b": "1"}, "_id"),
+            [1, 13, 19, 7])
+
+
+class TestColumn(TestCase):
+    """
+    - test empty
+    - test from series
+    - test set and get
+    - test set converts type
+    - test resize
+    - test concatenate
+    - test equal mask
+    - test to list
+    - test storage kind
+    - test save and load
+    """
+    def setUp(self):
+        self.column = Column.empty(4, 5)
+        self.column.set(0, 5)
+        self.column.set(2, 7)
+
+    def tearDown(self):
+        pass
+
+    def test_empty(self):
+        self.assertEqual(Column.empty(3, True).values.dtype, bool)
+        self.assertEqual(Column.empty(3, 1).values.dtype, np.int64)
+        self.assertEqual(Column.empty(3, 1.5).values.dtype, np.float64)
+        self.assertEqual(Column.empty(3, "a").values.dtype, object)
+        self.assertEqual(Column.empty(3, 2**70).values.dtype, object)
+        self.assertFalse(Column.empty(3, 1).mask.any())
+
+    def test_from_series(self):
+        column = Column.from_series(Series([1.0, np.nan, 3.0]))
+        self.assertEqual(column.values.dtype, np.float64)
+        self.assertListEqual(column.mask.tolist(), [True, False, True])
+
+        column = Column.from_series(Series(["a", None, "c"]))
+        self.assertEqual(column.values.dtype, object)
+        self.assertListEqual(column.mask.tolist(), [True, False, True])
+
+    def test_set_and_get(self):
+        self.assertEqual(self.column.values.dtype, np.int64)
+        self.assertEqual(self.column.get(2), 7)
+        self.assertIsInstance(self.column.get(2), int)
+        self.assertListEqual(
+            self.column.mask.tolist(), [True, False, True, False])
+        self.column.unset(0)
+        self.assertListEqual(
+            self.column.mask.tolist(), [False, False, True, False])
+
+    def test_set_converts_type(self):
+        self.column.set(1, "x")
+        self.assertEqual(self.column.values.dtype, object)
+        self.assertEqual(self.column.get(0), 5)
+        self.assertEqual(self.column.get(1), "x")
+
+        column = Column.empty(2, 1)
+        column.set(0, 1)
+        column.set(1, 1.5)
+        self.assertEqual(column.values.dtype, object)
+        self.assertIsInstance(column.get(0), int)
+
+    def test_resize(self):
+        self.column.resize(8)
+        self.assertEqual(len(self.column.values), 8)
+        self.assertEqual(len(self.column.mask), 8)
+        self.assertEqual(self.column.get(2), 7)
+        self.assertEqual(self.column.mask.sum(), 2)
+
+    def test_concatenate(self):
+        ints = Column.from_series(Series([1, 2]))
+        floats = Column.from_series(Series([1.5, np.nan]))
+        texts = Column.from_series(Series(["a"]))
+        column = Column.concatenate([ints, floats])
+        self.assertEqual(column.values.dtype, np.float64)
+        self.assertListEqual(column.to_list(np.arange(4)),
+                             [1.0, 2.0, 1.5, None])
+        column = Column.concatenate([ints, texts])
+        self.assertEqual(column.values.dtype, object)
+        self.assertListEqual(column.to_list(np.arange(3)), [1, 2, "a"])
+        self.assertIsInstance(column.get(0), int)
+
+    def test_equal_mask(self):
+        rows = np.arange(4)
+        self.assertListEqual(self.column.equal_mask(rows, 7).tolist(),
+                             [False, False, True, False])
+        self.assertListEqual(self.column.equal_mask(rows, 0).tolist(),
+                             [False, False, False, False])
+        self.assertListEqual(self.column.equal_mask(rows, "7").tolist(),
+                             [False, False, False, False])
+        self.assertListEqual(self.column.equal_mask(rows, [7]).tolist(),
+                             [False, False, False, False])
+        self.assertListEqual(
+            self.column.equal_mask(np.array([2, 0]), 7).tolist(),
+            [True, False])
+
+    def test_to_list(self):
+        self.assertListEqual(self.column.to_list(np.arange(4)),
+                             [5, None, 7, None])
+        self.assertListEqual(self.column.to_list(np.array([2, 0])), [7, 5])
+
+    def test_storage_kind(self):
+        self.assertEqual(self.column.storage_kind(4), "int64")
+        column = Column.from_series(Series(["a", None, "ż"]))
+        self.assertEqual(column.storage_kind(3), "str")
+        column = Column.from_series(Series([1, "a"], dtype=object))
+        self.assertEqual(column.storage_kind(2), "object")
+        column = Column.from_series(Series([None, None], dtype=object))
+        self.assertEqual(column.storage_kind(2), "float64")
+        self.column.set(1, "x")
+        self.assertEqual(self.column.storage_kind(4), "object")
+        self.assertEqual(self.column.storage_kind(1), "int64")
+
+    def test_save_and_load(self):
+        directory = "./_column_unittesting_temp_dir/"
+        os.makedirs(directory)
+        prefix = os.path.join(directory, "0")
+        try:
+            texts = Column.from_series(Series(["ala", None, "żółw", ""]))
+            self.assertEqual(texts.save(prefix, 4), "str")
+            loaded = Column.load(prefix, "str")
+            self.assertListEqual(loaded.to_list(np.arange(4)),
+                                 ["ala", None, "żółw", ""])
+            loaded = Column.load(prefix, "str", limit=2)
+            self.assertListEqual(loaded.to_list(np.arange(2)),
+                                 ["ala", None])
+
+            self.assertEqual(self.column.save(prefix, 3), "int64")
+            loaded = Column.load(prefix, "int64")
+            self.assertEqual(loaded.values.dtype, np.int64)
+            self.assertListEqual(loaded.to_list(np.arange(3)),
+                                 [5, None, 7])
+
+            loaded = Column.load(prefix, "int64", mmap_mode="r")
+            self.assertIsInstance(loaded.values, np.memmap)
+            self.assertEqual(loaded.get(2), 7)
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestTextColumn(TestCase):
+    """
+    - test get and take
+    - test values
+    - test search
+    """
+    def setUp(self):
+        texts = ["ala", "", "żółw", "kot"]
+        encoded = [text.encode("utf-8") for text in texts]
+        offsets = np.cumsum([0] + [len(e) for e in encoded])
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        mask = np.array([True, False, True, True])
+        self.column = TextColumn(offsets, data, mask)
+
+    def tearDown(self):
+        pass
+
+    def test_get_and_take(self):
+        self.assertEqual(self.column.get(2), "żółw")
+        self.assertListEqual(self.column.take(np.array([3, 0])),
+                             ["kot", "ala"])
+        self.assertListEqual(self.column.to_list(np.arange(4)),
+                             ["ala", None, "żółw", "kot"])
+        self.assertListEqual(self.column.take(np.array([], dtype=int)), [])
+        self.assertIsNone(self.column._decoded)
+
+    def test_values(self):
+        self.assertListEqual(self.column.values.tolist(),
+                             ["ala", "", "żółw", "kot"])
+        self.assertIsNotNone(self.column._decoded)
+        self.assertEqual(self.column.get(3), "kot")
+
+    def test_search(self):
+        self.assertListEqual(
+            self.column.equal_mask(np.arange(4), "kot").tolist(),
+            [False, False, False, True])
+        self.assertListEqual(
+            self.column.equal_mask(np.arange(4), "").tolist(),
+            [False, False, False, False])
+
+
+class TestColumnarTable(TestCase):
+    """
+    - test put
+    - test put many
+    - test int keys
+    - test get
+    - test find
+    - test find one
+    - test find with fields
+    - test find one with fields
+    - test find with index
+    - test same results as table
+    - test aggregate same as table
+    - test to df and from df
+    - test from df limit
+    - test read only
+    """
+    def setUp(self):
+        self.table = ColumnarTable()
+        id_1 = self.table.put({"char": "a", "num": 1, "num2": 10})
+        id_2 = self.table.put({"char": "a", "num": 2, "num2": 11, "_id": "aid"})
+        id_3 = self.table.put({"char": "b", "num": 3, "num2": 10}, _id="kid")
+        id_4 = self.table.put({"char": "b", "num": 3, "val": 20})
+        self.ids = (id_1, id_2, id_3, id_4)
+
+    def tearDown(self):
+        pass
+
+    def test_put(self):
+        t = ColumnarTable()
+        id_1 = t.put({"a": 5, "b": 9})
+        assertUUID(self, id_1)
+        id_2 = t.put({"a": 4, "b": 8, "_id": "rid"})
+        self.assertEqual(id_2, "rid")
+        self.assertDictEqual(t.find({}), {
+            id_1: {"a": 5, "b": 9}, "rid": {"a": 4, "b": 8}})
+
+        # overwrite record with other fields
+        id_3 = t.put({"c": "x"}, _id=id_1)
+        self.assertEqual(id_3, id_1)
+        self.assertDictEqual(t.find({}), {
+            id_1: {"c": "x"}, "rid": {"a": 4, "b": 8}})
+
+        # grow over capacity
+        ids = [t.put({"a": i}) for i in range(40)]
+        self.assertListEqual(t.find({}, "a")[2:], list(range(40)))
+        self.assertListEqual(t.find({}, "_id"), [id_1, "rid"] + ids)
+
+    def test_get(self):
+        id_1, id_2, id_3, id_4 = self.ids
+        self.assertDictEqual(self.table[id_4], {"char": "b", "num": 3, "val": 20})
+        self.assertDictEqual(self.table["aid"], {"char": "a", "num": 2, "num2": 11})
+        with self.assertRaises(KeyError) as e:
+            self.table["456"]
+        self.assertEqual(e.exception.args[0], "456")
+
+    def test_put_many(self):
+        records = [{"a": i, "b": str(i)} for i in range(20)]
+        records[3]["a"] = 2**70
+        records[5]["c"] = True
+        records[7].pop("b")
+        table = Table()
+        columnar_table = ColumnarTable()
+        columnar_table.create_index("b")
+        ids = list(range(20))
+        table.put_many(records, ids=ids)
+        self.assertListEqual(columnar_table.put_many(records, ids=ids), ids)
+        self.assertDictEqual(columnar_table.find({}), table.find({}))
+        self.assertListEqual(columnar_table.find({"b": "8"}, "_id"), [8])
+
+        # overwriting records
+        columnar_table.put_many([{"b": "8"}, {"a": 1.5}], ids=[2, 21])
+        self.assertListEqual(columnar_table.find({"b": "8"}, "_id"), [2, 8])
+        self.assertDictEqual(columnar_table[21], {"a": 1.5})
+        self.assertEqual(columnar_table.aggregate(count=True)["_count"], 21)
+
+    def test_int_keys(self):
+        table = ColumnarTable()
+        table.keys = "int"
+        self.assertEqual(table.put({"a": 1}), 0)
+        self.assertEqual(table.put({"a": 2}, _id=5), 5)
+        self.assertListEqual(table.put_many([{"a": 3}, {"a": 4}]), [6, 7])
+        self.assertEqual(table.put({"a": 5, "_id": "rid"}), "rid")
+        self.assertEqual(table.put({"a": 6}), 8)
+        self.assertDictEqual(table.find({"a": {"$gte": 5}}),
+                             {"rid": {"a": 5}, 8: {"a": 6}})
+
+    def test_find(self):
+        t = self.table
+        id_1, id_2, id_3, id_4 = self.ids
+        self.assertDictEqual(t.find({"num2": 10}), {
+            id_1: {"char": "a", "num": 1, "num2": 10},
+            "kid": {"char": "b", "num": 3, "num2": 10},
+        })
+        self.assertDictEqual(t.find({"num": 3, "char": "b"}), {
+            id_4: {"char": "b", "num": 3, "val": 20},
+            "kid": {"char": "b", "num": 3, "num2": 10},
+        })
+        self.assertDictEqual(t.find({"num": 3, "xyz": 1}), {})
+        self.assertEqual(len(t.find({})), 4)
+
+    def test_find_one(self):
+        t = self.table
+        id_1, id_2, id_3, id_4 = self.ids
+        _id, rec = t.find_one({"num": 3})
+        self.assertEqual(_id, id_3)
+        self.assertDictEqual(rec, {"char": "b", "num": 3, "num2": 10})
+        self.assertIsNone(t.find_one({"num": 3, "char": "a"}))
+        self.assertIsNone(t.find_one({"xyz": 3}))
+
+    def test_find_with_fields(self):
+        t = self.table
+        id_1, id_2, id_3, id_4 = self.ids
+        self.assertListEqual(t.find({}, "_id"), list(self.ids))
+        self.assertListEqual(
+            t.find({}, ["num2", "_id"]),
+            [[10, id_1], [11, id_2], [10, id_3], [None, id_4]])
+        self.assertListEqual(t.find({}, "val"), [None, None, None, 20])
+        self.assertListEqual(t.find({}, []), [[], [], [], []])
+        self.assertListEqual(t.find({"num2": 11}, ["num2", "_id"]),
+                             [[11, id_2]])
+        with self.assertRaises(TypeError):
+            t.find({}, ("num2", "_id"))
+
+    def test_find_one_with_fields(self):
+        t = self.table
+        id_1, id_2, id_3, id_4 = self.ids
+        self.assertEqual(t.find_one({"num2": 11}, "_id"), id_2)
+        self.assertListEqual(t.find_one({"num2": 11}, ["val", "_id"]),
+                             [None, id_2])
+        self.assertIsNone(t.find_one({"num2": 12}, "_id"))
+
+    def test_find_with_index(self):
+        t = self.table
+        id_1, id_2, id_3, id_4 = self.ids
+        t.create_index(["char", "num"])
+        self.assertListEqual(
+            t.find({"char": "b", "num": 3, "val": 20}, "_id"), [id_4])
+        t.put({"char": "b", "num": 3}, _id=id_1)
+        self.assertListEqual(
+            t.find({"char": "b", "num": 3}, "_id"), [id_1, id_3, id_4])
+        self.assertDictEqual(t.index_groups("char"), {
+            "a": [id_2], "b": [id_1, id_3, id_4]})
+
+    def test_same_results_as_table(self):
+        records = [{"a": i % 3, "b": str(i % 2), "c": i / 2}
+                   for i in range(20)]
+        records[5]["d"] = True
+        records[7].pop("a")
+        table = Table()
+        columnar_table = ColumnarTable()
+        for i, record in enumerate(records):
+            table.put(record, _id=i)
+            columnar_table.put(record, _id=i)
+        for query in [{}, {"a": 1}, {"a": 1, "b": "1"}, {"d": True},
+                      {"c": 2}, {"a": "1"}, {"b": 1}, {"c": {"$gt": 4.5}},
+                      {"a": {"$in": [0, 2]}, "c": {"$lte": 3}},
+                      {"a": {"$ne": 1}}, {"b": {"$gte": "1"}},
+                      {"a": {"$exists": False}}, {"d": {"$ne": False}}]:
+            self.assertDictEqual(
+                table.find(query), columnar_table.find(query))
+            self.assertListEqual(table.find(query, ["c", "_id", "a"]),
+                                 columnar_table.find(query, ["c", "_id", "a"]))
+            self.assertEqual(table.find_one(query),
+                             columnar_table.find_one(query))
+
+    def test_aggregate_same_as_table(self):
+        records = [{"a": i % 3, "b": str(i % 2), "c": i / 2}
+                   for i in range(20)]
+        records[5]["d"] = True
+        records[7].pop("a")
+        table = Table()
+        columnar_table = ColumnarTable()
+        for i, record in enumerate(records):
+            table.put(record, _id=i)
+            columnar_table.put(record, _id=i)
+        for args in [{"sums": ["a", "c", "d", "e"], "count": True},
+                     {"group_by": "b", "sums": ["a", "c"], "count": True},
+                     {"group_by": ["a", "b"], "sums": ["c"],
+                      "query": {"c": {"$lt": 7}}},
+                     {"group_by": "d", "count": True}]:
+            self.assertDictEqual(table.aggregate(**args),
+                                 columnar_table.aggregate(**args))
+        self.assertIsInstance(columnar_table.aggregate(sums=["a"])["a"], int)
+
+    def test_to_df_and_from_df(self):
+        t = self.table
+        df = t.to_df()
+        self.assertIsInstance(df, DataFrame)
+        self.assertEqual(df.index.name, "_id")
+        self.assertEqual(df.loc["kid"]["num2"], 10)
+        self.assertEqual(df["num"].dtype, np.int64)
+
+        t2 = ColumnarTable.from_df(df)
+        self.assertDictEqual(t2.find({}), t.find({}))
+        t3 = Table.from_df(df)
+        self.assertDictEqual(t3.find({}), t.find({}))
+
+    def test_from_df_limit(self):
+        t = ColumnarTable.from_df(self.table.to_df(), limit=2)
+        self.assertListEqual(t.find({}, "_id"), list(self.ids[:2]))
+        self.assertDictEqual(t["aid"], {"char": "a", "num": 2, "num2": 11})
+
+    def test_read_only(self):
+        t = ColumnarTable.from_df(self.table.to_df(), read_only=True)
+        with self.assertRaises(IOError) as e:
+            t.put({"a": 1})
+        self.assertEqual(e.exception.args[0], "Table is for read only.")
+        with self.assertRaises(IOError):
+            t.to_df()
+        t.create_index("num")
+        self.assertEqual(t.find_one({"num": 2}, "_id"), "aid")
+
+
+class TestSqliteTable(TestCase):
+    """
+    - test put
+    - test put many
+    - test same results as table
+    - test aggregate same as table
+    - test indexes
+    - test table view
+    - test to df
+    - test file and read only
+    - test explain
+    """
+    def setUp(self):
+        self.records = [{"a": i % 3, "b": str(i % 2), "c": i / 2}
+                        for i in range(20)]
+        self.records[5]["d"] = True
+        self.records[7].pop("a")
+        self.table = Table()
+        self.sqlite_table = SqliteTable(":memory:")
+        for i, record in enumerate(self.records):
+            self.table.put(record, _id=i)
+            self.sqlite_table.put(record, _id=i)
+        self.filepath = "./_sqlite_unittesting_temp_file.sqlite"
+
+    def tearDown(self):
+        self.sqlite_table.close()
+        if os.path.exists(self.filepath):
+            os.remove(self.filepath)
+
+    def test_put(self):
+        t = SqliteTable(":memory:")
+        id_1 = t.put({"a": 5, "b": True})
+        assertUUID(self, id_1)
+        id_2 = t.put({"a": 4.5, "b": False, "_id": "rid"})
+        self.assertEqual(id_2, "rid")
+        self.assertDictEqual(t.find({}), {
+            id_1: {"a": 5, "b": True}, "rid": {"a": 4.5, "b": False}})
+        self.assertIs(t["rid"]["b"], False)
+
+        # overwrite record with other fields keeps its position
+        id_3 = t.put({"c": "x", "b": 2}, _id=id_1)
+        self.assertEqual(id_3, id_1)
+        self.assertListEqual(t.find({}, "_id"), [id_1, "rid"])
+        self.assertDictEqual(t[id_1], {"c": "x", "b": 2})
+        self.assertEqual(t.find_one({"_id": "rid"}), None)
+        with self.assertRaises(KeyError):
+            t["456"]
+
+    def test_put_many(self):
+        t = self.sqlite_table
+        ids = t.put_many([{"x": 1}, {"a": 2}], ids=[3, 100])
+        self.assertListEqual(ids, [3, 100])
+        self.assertDictEqual(t[3], {"x": 1})
+        self.assertDictEqual(t[100], {"a": 2})
+        self.assertEqual(t.aggregate(count=True)["_count"], 21)
+        self.assertListEqual(t.find({"x": 1}, "_id"), [3])
+
+    def test_same_results_as_table(self):
+        self.table.put({"a": 9}, _id=3)
+        self.sqlite_table.put({"a": 9}, _id=3)
+        for query in [{}, {"a": 1}, {"a": 1, "b": "1"}, {"d": True},
+                      {"c": 2}, {"a": "1"}, {"b": 1}, {"c": {"$gt": 4.5}},
+                      {"a": {"$in": [0, 2]}, "c": {"$lte": 3}},
+                      {"a": {"$ne": 1}}, {"b": {"$gte": "1"}},
+                      {"a": {"$exists": False}}, {"d": {"$ne": False}},
+                      {"b": {"$gt": 0}}, {"e": 1}, {"e": {"$ne": 1}},
+                      {"a": None}, {"a": {"$ne": None}}, {"d": 1}]:
+            self.assertDictEqual(
+                self.table.find(query), self.sqlite_table.find(query))
+            self.assertListEqual(
+                self.table.find(query, ["c", "_id", "a"]),
+                self.sqlite_table.find(query, ["c", "_id", "a"]))
+            self.assertEqual(self.table.find_one(query),
+                             self.sqlite_table.find_one(query))
+            self.assertEqual(self.table.find_one(query, "b"),
+                             self.sqlite_table.find_one(query, "b"))
+
+    def test_aggregate_same_as_table(self):
+        for args in [{"sums": ["a", "c", "d", "e"], "count": True},
+                     {"group_by": "b", "sums": ["a", "c"], "count": True},
+                     {"group_by": ["a", "b"], "sums": ["c"],
+                      "query": {"c": {"$lt": 7}}},
+                     {"group_by": "d", "count": True}]:
+            self.assertDictEqual(self.table.aggregate(**args),
+                                 self.sqlite_table.aggregate(**args))
+
+    def test_indexes(self):
+        t = self.sqlite_table
+        t.create_index(["a", "b"])
+        t.create_index("c", kind="sorted")
+        self.assertDictEqual(t.index_groups(["a", "b"]),
+                             self.table.index_groups(["a", "b"]))
+        self.assertListEqual(t.find({"a": 1, "b": "0"}, "_id"), [4, 10, 16])
+        self.assertListEqual(t.find({"c": {"$gte": 9}}, "_id"), [18, 19])
+        t.drop_index(["a", "b"])
+        with self.assertRaises(KeyError):
+            t.drop_index(["a", "b"])
+        with self.assertRaises(ValueError):
+            t.create_index("a", kind="other")
+
+    def test_table_view(self):
+        view = TableView(self.sqlite_table, [5, 3, 9, 1])
+        table_view = TableView(self.table, [5, 3, 9, 1])
+        self.assertListEqual(view.find({}, "_id"), [5, 3, 9, 1])
+        self.assertDictEqual(view.find({"a": 0}), table_view.find({"a": 0}))
+        self.assertDictEqual(view.aggregate(sums=["c"]),
+                             table_view.aggregate(sums=["c"]))
+        with self.assertRaises(KeyError):
+            view[2]
+
+    def test_to_df(self):
+        df = self.sqlite_table.to_df()
+        self.assertEqual(df.index.name, "_id")
+        self.assertTrue(df.equals(self.table.to_df()))
+        self.assertDictEqual(Table.from_df(df).find({}), self.table.find({}))
+
+    def test_file_and_read_only(self):
+        t = SqliteTable(self.filepath)
+        t.put_many(self.records)
+        t.create_index("b")
+        t.commit()
+        t.put({"a": 100})
+        t.close()
+
+        # not committed changes are dropped
+        t = SqliteTable(self.filepath, read_only=True)
+        self.assertListEqual(t.find({}, "a"), self.table.find({}, "a"))
+        self.assertTrue(t._sql_indexes())
+        with self.assertRaises(IOError) as e:
+            t.put({"a": 1})
+        self.assertEqual(e.exception.args[0], "Table is for read only.")
+        with self.assertRaises(IOError):
+            t.put_many([{"a": 1}])
+        # existing index is not created again, new one is not allowed
+        t.create_index("b")
+        with self.assertRaises(IOError) as e:
+            t.create_index("a")
+        self.assertEqual(e.exception.args[0], "Table is for read only.")
+        self.assertListEqual(sorted(t.index_groups("a")), [0, 1, 2])
+        t.close()
+
+    def test_explain(self):
+        t = self.sqlite_table
+        plan = t.explain({"a": 1})
+        self.assertEqual(plan["method"], "scan")
+        self.assertEqual(plan["scanned"], 20)
+        self.assertEqual(plan["returned"], 6)
+        t.create_index("a")
+        plan = t.explain({"a": 1, "c": {"$gt": 3}})
+        self.assertEqual(plan["method"], "index")
+        self.assertEqual(plan["index"], ("a",))
+        self.assertEqual(plan["returned"], 4)
+        plan = TableView(t, [0, 1, 2]).explain({"b": "1"})
+        self.assertEqual(plan["method"], "subset")
+        self.assertEqual(plan["scanned"], 3)
+        self.assertEqual(plan["returned"], 1)
+
+
+class TestTableView(TestCase):
+    """
+    - test same results as copied table
+    - test get item
+    - test read only
+    - test db view
+    """
+    def setUp(self):
+        records = [{"a": i % 3, "b": str(i % 2), "c": i / 2}
+                   for i in range(20)]
+        records[5]["d"] = True
+        records[7].pop("a")
+        self.ids = [7, 3, 5, 12, 19, 3]
+        self.tables = [Table(), ColumnarTable()]
+        self.copied_table = Table()
+        for table in self.tables:
+            table.put_many(records, ids=list(range(20)))
+            table.create_index("a")
+        for _id in self.ids:
+            self.copied_table.put(records[_id], _id=_id)
+
+    def tearDown(self):
+        pass
+
+    def test_same_results_as_copied_table(self):
+        for table in self.tables:
+            view = TableView(table, self.ids)
+            for query in [{}, {"a": 1}, {"a": 1, "b": "1"}, {"d": True},
+                          {"c": {"$gt": 3}}, {"e": {"$exists": False}}]:
+                self.assertDictEqual(view.find(query),
+                                     self.copied_table.find(query))
+                self.assertListEqual(view.find(query, "_id"),
+                                     self.copied_table.find(query, "_id"))
+                self.assertEqual(view.find_one(query, ["_id", "c"]),
+                                 self.copied_table.find_one(query, ["_id", "c"]))
+                self.assertDictEqual(
+                    view.aggregate("b", ["a", "c"], True, query),
+                    self.copied_table.aggregate("b", ["a", "c"], True, query))
+
+    def test_get_item(self):
+        for table in self.tables:
+            view = TableView(table, self.ids)
+            self.assertDictEqual(view[7], {"b": "1", "c": 3.5})
+            with self.assertRaises(KeyError):
+                view[8]
+            # results are not shared with table
+            view[3]["a"] = 100
+            self.assertEqual(table[3]["a"], 0)
+
+    def test_read_only(self):
+        view = TableView(self.tables[0], self.ids)
+        with self.assertRaises(IOError):
+            view.put({"a": 1})
+        with self.assertRaises(IOError):
+            view.put_many([{"a": 1}])
+
+    def test_db_view(self):
+        db = MagicMock()
+        db.__getitem__.side_effect = {"first": self.tables[1]}.__getitem__
+        db_view = DbView(db, {"first": [3, 5], "second": [1]})
+        self.assertTrue(db_view.read_only)
+        view = db_view["first"]
+        self.assertIsInstance(view, TableView)
+        self.assertIs(db_view["first"], view)
+        self.assertListEqual(view.find({}, "_id"), [3, 5])
+        with self.assertRaises(KeyError):
+            db_view["third"]
+        db.__getitem__.assert_called_once_with("first")
+        self.assertIsNone(db_view.votes)
+        # votes are got when they are used for the first time
+        get_votes = MagicMock()
+        db_view = DbView(db, {}, votes=get_votes)
+        get_votes.assert_not_called()
+        self.assertIs(db_view.votes, get_votes.return_value)
+        self.assertIs(db_view.votes, get_votes.return_value)
+        get_votes.assert_called_once_with()
+
 
 class TestDbDriver(TestCase):
     """
@@ -409,7 +1699,21 @@ class TestDbDriver(TestCase):
     - test delete table
     - test load table names
     - test load table
+    - test load indexes
     - test dump tables
+    - test npt format
+    - test sqlite format
+    - test convert tables
+    - test dump changed tables only
+    - test preload
+    - test table projection
+    - test table to csv
+    - test int keys
+    - test memory budget
+    - test slow queries
+    - test wal
+    - test recover interrupted saving
+    - test version
 
     - test init not exists
     - test init nested directory
@@ -580,7 +1884,7 @@ class TestDbDriver(TestCase):
         mock_os_listdir.assert_called_once_with(self.directory)
 
         mock_db._load_excel.assert_not_called()
-        mock_db._load_csv.assert_not_called()
+        mock_db._load_csv_chunks.assert_not_called()
         mock_db._load.assert_not_called()
 
         self.assertDictEqual(mock_db._DbDriver__tables, {
@@ -596,17 +1900,18 @@ class TestDbDriver(TestCase):
 
         mock_db = MagicMock()
         mock_db.db_directory = self.directory
-        mock_df = MagicMock()
-        mock_db._load_csv.return_value = mock_df
+        mock_dfs = MagicMock()
+        mock_db._load_csv_chunks.return_value = mock_dfs
         mock_db._filepath.return_value = filepath
 
+        mock_db.progress = None
         mock_db.limit = None
         mock_db._DbDriver__read_only = True
         mock_db._DbDriver__tables = {}
 
         mock_table = MagicMock()
         MockTableClass = MagicMock()
-        MockTableClass.from_df.return_value = mock_table
+        MockTableClass.from_dfs.return_value = mock_table
 
         mock_os_path_size = MagicMock()
         mock_os_path_size.return_value = 1000
@@ -620,25 +1925,47 @@ class TestDbDriver(TestCase):
         # assert
         mock_db._filepath.assert_called_once_with(table_name)
         mock_db._load_excel.assert_not_called()
-        mock_db._load_csv.assert_called_once_with(filepath)
+        mock_db._load_csv_chunks.assert_called_once_with(
+            filepath, limit=None, progress=None, usecols=None,
+            keys=mock_db.keys)
         mock_os_path_size.assert_called_once_with(filepath)
 
-        MockTableClass.from_df.assert_called_once_with(
-            mock_df, limit=None, read_only=True)
+        MockTableClass.from_dfs.assert_called_once_with(
+            mock_dfs, read_only=True)
 
         self.assertDictEqual(mock_db._DbDriver__tables, {
             "labada": mock_table
         })
         self.assertIs(result, mock_table)
 
+    def test_load_indexes(self):
+        """ Unit test """
+        # arrange
+        mock_db = MagicMock()
+        mock_db.limit = 10
+        mock_table = MagicMock()
+
+        # act
+        DbDriver._load_indexes(mock_db, "labada", mock_table)
+
+        # assert
+        mock_db._index_filepath.assert_not_called()
+        mock_table._attach_indexes.assert_not_called()
+
     def test_dump_tables(self):
         """ Unit test """
         # arrange
         mock_table = MagicMock()
+        mock_table._dirty = True
+        mock_clean_table = MagicMock()
+        mock_clean_table._dirty = False
+        mock_clean_table._indexes_changed = False
         mock_db = MagicMock()
         mock_db._DbDriver__read_only = False
         mock_db._DbDriver__tables = {
-            "new_table": mock_table, "not_changed_table": None}
+            "new_table": mock_table, "not_loaded_table": None,
+            "not_changed_table": mock_clean_table}
+        mock_db._append_csv.return_value = False
         mock_db._DbDriver__dropped_tables = ["old_table", "missing_table"]
         mock_db._filepath.side_effect = [
             "./here/old_table.csv",
@@ -649,9 +1976,6 @@ class TestDbDriver(TestCase):
         mock_os = MagicMock()
         mock_os.path.exists.side_effect = [True, False]
 
-        mock_df = MagicMock()
-        mock_table.to_df.return_value = mock_df
-
         # act
         with patch("pkwscraper.lib.dbdriver.os", mock_os):
             DbDriver.dump_tables(mock_db)
@@ -666,7 +1990,15 @@ class TestDbDriver(TestCase):
         ])
         mock_os.remove.assert_called_once_with("./here/old_table.csv")
 
-        mock_df.to_csv.assert_called_once_with("./here/new_table.csv", sep=";")
+        mock_db._append_csv.assert_called_once_with(
+            "./here/new_table.csv", "new_table", mock_table)
+        mock_table.to_csv.assert_called_once_with("./here/new_table.csv")
+        mock_db._dump_indexes.assert_called_once_with("new_table", mock_table)
+        mock_table._mark_saved.assert_called_once_with()
+        mock_clean_table.to_df.assert_not_called()
+        mock_clean_table._mark_saved.assert_not_called()
+        mock_db._remove_indexes.assert_has_calls([
+            call("old_table"), call("missing_table")])
 
         self.assertListEqual(mock_db._DbDriver__dropped_tables, [])
 
@@ -778,18 +2110,29 @@ class TestDbDriver(TestCase):
     def test_load_csv(self):
         # arrange
         self._make_synthetic_data()
+        progress = MagicMock()
 
         # act
-        df_1 = DbDriver._load_csv(self.path_1)
-        df_2 = DbDriver._load_csv(self.path_2)
+        with patch("pkwscraper.lib.dbdriver.CSV_CHUNK_SIZE", 2):
+            dfs_1 = list(DbDriver._load_csv_chunks(self.path_1))
+            dfs_2 = list(DbDriver._load_csv_chunks(
+                self.path_2, progress=progress))
+            dfs_3 = list(DbDriver._load_csv_chunks(self.path_1, limit=1))
 
         # assert
-        self.assertEqual(len(df_1.columns), 2)
-        self.assertEqual(len(df_1), 3)
-        self.assertEqual(df_1.index.name, "_id")
-        self.assertEqual(len(df_2.columns), 2)
-        self.assertEqual(len(df_2), 3)
-        self.assertEqual(df_2.index.name, "_id")
+        self.assertEqual(len(dfs_1), 2)
+        self.assertEqual(len(dfs_1[0].columns), 2)
+        self.assertEqual(len(dfs_1[0]) + len(dfs_1[1]), 3)
+        self.assertEqual(dfs_1[0].index.name, "_id")
+        self.assertListEqual(dfs_1[1].index.tolist(), [103])
+        self.assertEqual(len(dfs_2[0].columns), 2)
+        self.assertListEqual(dfs_2[1].index.tolist(), [2])
+        self.assertEqual(dfs_2[1].index.name, "_id")
+        self.assertEqual(progress.call_count, 2)
+        file_size = os.path.getsize(self.path_2)
+        progress.assert_called_with(file_size, file_size)
+        self.assertEqual(len(dfs_3), 1)
+        self.assertEqual(len(dfs_3[0]), 1)
 
         # absterge
         self._clean_synthetic_data()
@@ -813,6 +2156,627 @@ class TestDbDriver(TestCase):
         # assert
         self.assertFalse(os.path.exists(self.directory))
 
+    def test_indexes_sidecar(self):
+        # arrange
+        db = DbDriver(db_directory=self.directory)
+        db.create_table("my_table")
+        ids = [db["my_table"].put({"a": i % 3, "b": str(i), "c": i / 2})
+               for i in range(9)]
+        db["my_table"].create_index("a")
+        db["my_table"].create_index(["a", "b"])
+        db["my_table"].create_index("c", kind="sorted")
+        db.create_table("no_indexes")
+        db["no_indexes"].put({"a": 1})
+        db.dump_tables()
+        index_filepath = os.path.join(self.directory, "my_table.idx")
+
+        # assert sidecars
+        self.assertTrue(os.path.exists(index_filepath))
+        self.assertFalse(os.path.exists(
+            os.path.join(self.directory, "no_indexes.idx")))
+
+        # load indexes from sidecar
+        db2 = DbDriver(db_directory=self.directory, read_only=True)
+        table = db2["my_table"]
+        self.assertIsNotNone(table._BaseTable__indexes_loader)
+        self.assertListEqual(table.find({"a": 1}, "_id"), ids[1::3])
+        self.assertSetEqual(set(table._BaseTable__indexes),
+                            {("a",), ("a", "b"), ("c",)})
+        self.assertListEqual(table.find({"c": {"$gte": 3.5}}, "_id"),
+                             ids[7:])
+        with np.load(index_filepath, allow_pickle=False) as npz_file:
+            self.assertIn("header", npz_file.files)
+
+        # sidecar that is not NumPy archive is ignored
+        with open(index_filepath, "rb") as f:
+            sidecar = f.read()
+        with open(index_filepath, "wb") as f:
+            pickle.dump({"size": 0}, f)
+        db2 = DbDriver(db_directory=self.directory, read_only=True)
+        self.assertIsNone(db2["my_table"]._BaseTable__indexes_loader)
+        with open(index_filepath, "wb") as f:
+            f.write(sidecar)
+
+        # stale sidecar is ignored
+        with open(db._filepath("my_table"), "a") as f:
+            f.write("\n")
+        db3 = DbDriver(db_directory=self.directory, read_only=True)
+        table = db3["my_table"]
+        self.assertIsNone(table._BaseTable__indexes_loader)
+        self.assertDictEqual(table._BaseTable__indexes, {})
+
+        # limited table does not use sidecar
+        db4 = DbDriver(db_directory=self.directory, limit=3)
+        self.assertIsNone(db4["my_table"]._BaseTable__indexes_loader)
+
+        # deleted table removes sidecar
+        db4.delete_table("my_table")
+        db4.dump_tables()
+        self.assertFalse(os.path.exists(index_filepath))
+
+        # clean up
+        shutil.rmtree(self.directory)
+
+    def test_columns_layout(self):
+        # arrange
+        self._make_synthetic_data()
+        with self.assertRaises(ValueError):
+            DbDriver(db_directory=self.directory, layout="cells")
+
+        # act
+        db = DbDriver(db_directory=self.directory, layout="columns")
+        db.create_table("new_table")
+
+        # assert
+        self.assertIsInstance(db["first_table"], ColumnarTable)
+        self.assertIsInstance(db["new_table"], ColumnarTable)
+        self.assertDictEqual(db["first_table"].find({}), {
+            101: {'num': 9,  'char': 'a'},
+            102: {'num': 16, 'char': 'b'},
+            103: {'num': 25, 'char': 'c'},
+        })
+        self.assertEqual(db["second_table"].find_one({"num": 49}, "_id"), 1)
+
+        db = DbDriver(db_directory=self.directory, layout="compact")
+        db.create_table("new_table")
+        self.assertIsInstance(db["first_table"], CompactTable)
+        self.assertIsInstance(db["new_table"], CompactTable)
+        self.assertDictEqual(db["first_table"][102], {'num': 16, 'char': 'b'})
+
+        # clean up
+        self._clean_synthetic_data()
+
+    def test_npt_format(self):
+        # arrange
+        os.makedirs(self.directory)
+        db = DbDriver(db_directory=self.directory, storage_format="npt")
+        db.create_table("my_table")
+        db["my_table"].put({"a": 1, "b": "x"}, _id="id_1")
+        db["my_table"].put({"a": "y", "c": 2.5}, _id="id_2")
+        db["my_table"].create_index("b")
+        with self.assertRaises(ValueError):
+            DbDriver(db_directory=self.directory, storage_format="xml")
+
+        # act
+        db.dump_tables()
+
+        # assert
+        self.assertListEqual(sorted(os.listdir(self.directory)),
+                             ["my_table.idx", "my_table.npt"])
+        for layout in ["rows", "columns"]:
+            db2 = DbDriver(db_directory=self.directory, layout=layout)
+            table = db2["my_table"]
+            self.assertDictEqual(table.find({}), {
+                "id_1": {"a": 1, "b": "x"},
+                "id_2": {"a": "y", "c": 2.5},
+            })
+            self.assertDictEqual(table.index_groups("b"), {"x": ["id_1"]})
+        db3 = DbDriver(db_directory=self.directory, limit=1)
+        self.assertEqual(len(db3["my_table"].find({})), 1)
+
+        # read-only tables are memory-mapped
+        db4 = DbDriver(db_directory=self.directory, read_only=True,
+                       layout="columns")
+        columns = db4["my_table"]._ColumnarTable__columns
+        self.assertIsInstance(columns["b"], TextColumn)
+        self.assertIsInstance(columns["c"].values, np.memmap)
+        self.assertEqual(db4["my_table"].find_one({"b": "x"}, "_id"), "id_1")
+        self.assertDictEqual(db4["my_table"]["id_2"], {"a": "y", "c": 2.5})
+        del db4, columns
+
+        # clean up
+        db.delete(db.get_deleting_access()[43:53])
+        self.assertFalse(os.path.exists(self.directory))
+
+    def test_sqlite_format(self):
+        # arrange
+        os.makedirs(self.directory)
+        db = DbDriver(db_directory=self.directory, storage_format="sqlite")
+        db.create_table("my_table")
+        db["my_table"].put({"a": 1, "b": "x", "d": True}, _id="id_1")
+        db["my_table"].put({"a": "y", "c": 2.5}, _id="id_2")
+        db["my_table"].create_index("b")
+
+        # act
+        db.dump_tables()
+
+        # assert
+        self.assertListEqual(os.listdir(self.directory), ["my_table.sqlite"])
+        self.assertIsInstance(db["my_table"], SqliteTable)
+        db2 = DbDriver(db_directory=self.directory, read_only=True)
+        table = db2["my_table"]
+        self.assertIsInstance(table, SqliteTable)
+        self.assertDictEqual(table.find({}), {
+            "id_1": {"a": 1, "b": "x", "d": True},
+            "id_2": {"a": "y", "c": 2.5},
+        })
+        self.assertDictEqual(table.index_groups("b"), {"x": ["id_1"]})
+        self.assertEqual(table.find_one({"c": {"$gt": 2}}, "_id"), "id_2")
+        db3 = DbDriver(db_directory=self.directory, limit=1)
+        self.assertEqual(len(db3["my_table"].find({})), 1)
+
+        # changes are seen in file after dumping only
+        db["my_table"].put({"a": 3}, _id="id_3")
+        self.assertEqual(len(table.find({})), 2)
+        db.dump_tables()
+        self.assertEqual(table["id_3"], {"a": 3})
+
+        # index of saved table is kept in file
+        table.close()
+        db = DbDriver(db_directory=self.directory)
+        db["my_table"].create_index("a")
+        db.dump_tables()
+        db["my_table"].close()
+        db = DbDriver(db_directory=self.directory)
+        db2 = DbDriver(db_directory=self.directory, read_only=True)
+        table = db2["my_table"]
+        self.assertSetEqual(set(table._sql_indexes()), {("a",), ("b",)})
+
+        # convert to csv and back
+        db.convert_tables("csv")
+        self.assertListEqual(os.listdir(self.directory), ["my_table.csv"])
+        db.convert_tables("sqlite")
+        self.assertListEqual(os.listdir(self.directory), ["my_table.sqlite"])
+        self.assertEqual(db["my_table"].find_one({"d": True}, "_id"), "id_1")
+        self.assertEqual(db["my_table"]["id_2"]["c"], 2.5)
+
+        # clean up
+        table.close()
+        db.delete(db.get_deleting_access()[43:53])
+        self.assertFalse(os.path.exists(self.directory))
+
+    def test_convert_tables(self):
+        # arrange
+        self._make_synthetic_data()
+        with self.assertRaises(IOError):
+            DbDriver(self.directory, read_only=True).convert_tables("npt")
+        with self.assertRaises(RuntimeError):
+            DbDriver(self.directory, limit=2).convert_tables("npt")
+        db = DbDriver(db_directory=self.directory)
+
+        # act
+        db.convert_tables("npt")
+
+        # assert
+        self.assertListEqual(sorted(os.listdir(self.directory)),
+                             ["first_table.npt", "second_table.npt"])
+        db2 = DbDriver(db_directory=self.directory, layout="columns")
+        self.assertDictEqual(db2["first_table"].find({}), {
+            101: {'num': 9,  'char': 'a'},
+            102: {'num': 16, 'char': 'b'},
+            103: {'num': 25, 'char': 'c'},
+        })
+
+        # convert back and clean up
+        db2 = DbDriver(db_directory=self.directory)
+        db2.convert_tables("csv")
+        self.assertListEqual(sorted(os.listdir(self.directory)),
+                             ["first_table.csv", "second_table.csv"])
+        self._clean_synthetic_data()
+
+    def test_dump_changed_tables_only(self):
+        # arrange
+        self._make_synthetic_data()
+        db = DbDriver(db_directory=self.directory)
+        db["second_table"]
+        db["first_table"].put({"num": 36, "char": "d"}, _id=104)
+        db["first_table"].put({"num": 49}, _id=105)
+
+        # act - unchanged table is not saved and new records are appended
+        db.dump_tables()
+
+        # assert
+        with open(self.path_2) as f:
+            self.assertEqual(f.read(), self.csv_content_2)
+        with open(self.path_1) as f:
+            self.assertEqual(
+                f.read(), self.csv_content_1 + "\n104;36;d\n105;49;\n")
+        self.assertDictEqual(DbDriver(self.directory)["first_table"][105],
+                             {"num": 49})
+
+        # act - new field and changed record need rewriting whole file
+        db["first_table"].put({"num": 1, "new_field": 2})
+        db["second_table"].put({"num": 0}, _id=1)
+        db.dump_tables()
+
+        # assert
+        db2 = DbDriver(db_directory=self.directory)
+        self.assertEqual(len(db2["first_table"].find({})), 6)
+        self.assertEqual(
+            db2["first_table"].find_one({"new_field": 2}, "num"), 1)
+        self.assertDictEqual(db2["second_table"][1], {"num": 0})
+        self.assertEqual(len(db2["second_table"].find({})), 3)
+
+        # act - new index saves only sidecar, table keeps its format
+        db3 = DbDriver(db_directory=self.directory, storage_format="npt")
+        db3["second_table"].create_index("num")
+        with open(self.path_2) as f:
+            csv_content_2 = f.read()
+        db3.dump_tables()
+
+        # assert
+        self.assertListEqual(sorted(os.listdir(self.directory)), [
+            "first_table.csv", "second_table.csv", "second_table.idx"])
+        with open(self.path_2) as f:
+            self.assertEqual(f.read(), csv_content_2)
+        db4 = DbDriver(db_directory=self.directory, read_only=True)
+        self.assertListEqual(db4["second_table"].find({"num": 0}, "_id"), [1])
+        self.assertIn(("num",), db4["second_table"]._BaseTable__indexes)
+
+        # clean up
+        os.remove(os.path.join(self.directory, "second_table.idx"))
+        self._clean_synthetic_data()
+
+    def test_table_to_csv(self):
+        # arrange
+        self._make_synthetic_data()
+        path = os.path.join(self.directory, "written_table.csv")
+        records = [{"a": 1, "b": 0.5, "c": "x;y", "d": True},
+                   {"a": 2, "c": 'say "hi"'}, {"b": 1.5, "e": "line\nbreak"}]
+
+        for table_class in [Table, CompactTable, ColumnarTable]:
+            table = table_class()
+            table.put_many(records, ids=[7, 8, 9])
+
+            # act
+            table.to_csv(path)
+
+            # assert
+            with open(path, newline="") as f:
+                content = f.read()
+            table.to_df().to_csv(path, sep=";")
+            with open(path, newline="") as f:
+                self.assertEqual(content, f.read())
+            table_2 = Table.from_dfs(DbDriver._load_csv_chunks(
+                path, limit=None, progress=None, usecols=None))
+            self.assertDictEqual(table_2.find({}), table.find({}))
+
+        # clean up
+        os.remove(path)
+        self._clean_synthetic_data()
+
+    def test_int_keys(self):
+        # arrange
+        self._make_synthetic_data()
+        with self.assertRaises(ValueError):
+            DbDriver(db_directory=self.directory, keys="serial")
+
+        for layout in ["rows", "columns", "compact"]:
+            db = DbDriver(db_directory=self.directory, layout=layout,
+                          keys="int")
+            db.create_table("candidates")
+            db.create_table("results")
+
+            # act
+            candidates_ids = db["candidates"].put_many(
+                [{"name": "A"}, {"name": "B"}])
+            result_id = db["results"].put(
+                {"unit": db["first_table"].find_one({}, "_id"),
+                 candidates_ids[0]: 5, candidates_ids[1]: 7})
+            new_id = db["first_table"].put({"num": 81, "char": "i"})
+            db.dump_tables()
+
+            # assert
+            self.assertListEqual(candidates_ids, [0, 1])
+            self.assertEqual(result_id, 0)
+            self.assertEqual(new_id, 104)
+            db = DbDriver(db_directory=self.directory, layout=layout,
+                          read_only=True, keys="int")
+            self.assertListEqual(db["candidates"].find({}, "_id"), [0, 1])
+            self.assertDictEqual(db["results"][0], {"unit": 101, 0: 5, 1: 7})
+            self.assertDictEqual(db["results"].aggregate(sums=[0, 1]),
+                                 {0: 5, 1: 7})
+            self.assertListEqual(db["first_table"].find({}, "_id"),
+                                 [101, 102, 103, 104])
+            db = DbDriver(db_directory=self.directory, layout=layout,
+                          read_only=True, keys="int")
+            self.assertListEqual(db.table("results", columns=[1]).find(
+                {}, fields=[1, "unit"]), [[7, 101]])
+            # kind of keys is noted in DB
+            db = DbDriver(db_directory=self.directory, layout=layout,
+                          read_only=True)
+            self.assertEqual(db.keys, "int")
+            self.assertDictEqual(db["results"][0], {"unit": 101, 0: 5, 1: 7})
+            # names of fields are not converted in DB with UUID keys
+            db = DbDriver(db_directory=self.directory, layout=layout,
+                          read_only=True, keys="uuid")
+            self.assertDictEqual(db["results"][0],
+                                 {"unit": 101, "0": 5, "1": 7})
+
+            # clean up
+            os.remove(os.path.join(self.directory, "candidates.csv"))
+            os.remove(os.path.join(self.directory, "results.csv"))
+            os.remove(os.path.join(self.directory, "db.json"))
+            self.assertEqual(DbDriver(db_directory=self.directory).keys,
+                             "uuid")
+            with open(self.path_1, 'w') as f:
+                f.write(self.csv_content_1)
+
+        self._clean_synthetic_data()
+
+    def test_memory_budget(self):
+        # arrange
+        self._make_synthetic_data()
+        db = DbDriver(db_directory=self.directory, memory_budget=1)
+        tables = db._DbDriver__tables
+
+        # act - least recently used table is unloaded
+        db["first_table"]
+        db["second_table"]
+
+        # assert
+        self.assertIsNone(tables["first_table"])
+        self.assertIsNotNone(tables["second_table"])
+        self.assertEqual(db["first_table"][102], {"num": 16, "char": "b"})
+        self.assertIsNone(tables["second_table"])
+
+        # table still used is taken back instead of loading again
+        first_table = db["first_table"]
+        db["second_table"]
+        self.assertIsNone(tables["first_table"])
+        self.assertIs(db["first_table"], first_table)
+
+        # changed table is not unloaded until it is saved
+        first_table.put({"num": 81, "char": "i"}, _id=104)
+        db["second_table"]
+        self.assertIs(tables["first_table"], first_table)
+
+        # changes of unloaded table are saved
+        second_table = db["second_table"]
+        db.dump_tables()
+        self.assertIsNone(tables["first_table"])
+        db["first_table"]
+        second_table.put({"num": 100, "char": "j"}, _id=3)
+        db.dump_tables()
+        db = DbDriver(db_directory=self.directory, read_only=True)
+        self.assertEqual(db["first_table"][104], {"num": 81, "char": "i"})
+        self.assertEqual(db["second_table"][3], {"num": 100, "char": "j"})
+
+        # clean up
+        self._clean_synthetic_data()
+
+    def test_slow_queries(self):
+        # arrange
+        self._make_synthetic_data()
+        db = DbDriver(db_directory=self.directory, slow_query_time=0)
+
+        # act
+        for num in [9, 16, 1]:
+            db["first_table"].find_one({"num": num})
+        db["first_table"].find({"num": {"$gt": 10}}, "_id")
+        db["second_table"].find({})
+        DbDriver(db_directory=self.directory)["first_table"].find({})
+
+        # assert
+        self.assertEqual(len(db.slow_queries), 5)
+        self.assertDictEqual(
+            {key: db.slow_queries[0][key]
+             for key in ["table", "method", "query", "plan", "returned"]},
+            {"table": "first_table", "method": "find_one",
+             "query": {"num": 9}, "plan": "scan", "returned": 1})
+        summary = db.slow_queries_summary()
+        self.assertListEqual(
+            sorted((kind["table"], kind["method"], kind["query"],
+                    kind["count"]) for kind in summary), [
+                ("first_table", "find", (("num", "$gt"),), 1),
+                ("first_table", "find_one", (("num",),), 3),
+                ("second_table", "find", (), 1)])
+        self.assertListEqual(
+            [kind["time"] for kind in summary],
+            sorted([kind["time"] for kind in summary], reverse=True))
+
+        # clean up
+        self._clean_synthetic_data()
+
+    def test_wal(self):
+        # arrange
+        self._make_synthetic_data()
+        db = DbDriver(db_directory=self.directory, wal=True)
+        db["first_table"].put({"num": 81, "char": "i"}, _id=104)
+        db.create_table("third_table")
+        db["third_table"].put_many([{"a": 1}, {"a": 2, 5: np.int64(3)}],
+                                   ids=[1, 2])
+        db.delete_table("second_table")
+        wal_path = os.path.join(self.directory, "changes.wal")
+        with open(wal_path, "ab") as f:
+            # last change cut by crash
+            f.write(b'["put", "first_table", [105]')
+
+        # act - DB is opened again without saving
+        del db
+        db = DbDriver(db_directory=self.directory, wal=True)
+
+        # assert
+        self.assertEqual(db["first_table"][104], {"num": 81, "char": "i"})
+        self.assertDictEqual(db["third_table"].find({}), {
+            1: {"a": 1}, 2: {"a": 2, 5: 3}})
+        self.assertNotIn("second_table", db._DbDriver__tables)
+        self.assertIsNone(db["first_table"].find_one({"_id": 105}))
+        self.assertFalse(db.is_saved("first_table"))
+        self.assertFalse(db.is_saved("second_table"))
+        db_read = DbDriver(db_directory=self.directory, read_only=True)
+        self.assertIsNone(db_read["first_table"].find_one({"num": 81}))
+
+        # saving clears the log
+        db.dump_tables()
+        self.assertEqual(os.path.getsize(wal_path), 0)
+        self.assertTrue(db.is_saved("first_table"))
+        db = DbDriver(db_directory=self.directory, wal=True)
+        self.assertTrue(db.is_saved("third_table"))
+        self.assertEqual(len(db["third_table"].find({})), 2)
+
+        # columnar tables log records like other tables
+        db["third_table"].put({"_id": 3, "a": 4})
+        db_columns = DbDriver(db_directory=self.directory, wal=True,
+                              layout="columns")
+        self.assertIsInstance(db_columns["third_table"], ColumnarTable)
+        db_columns["third_table"].put({"_id": 4, "a": 5})
+        with open(wal_path) as f:
+            changes = [json.loads(line) for line in f]
+        self.assertListEqual(changes, [
+            ["put", "third_table", [3], [[["a", 4]]]],
+            ["put", "third_table", [4], [[["a", 5]]]],
+        ])
+        del db, db_columns
+        db = DbDriver(db_directory=self.directory, wal=True,
+                      layout="columns")
+        self.assertEqual(len(db["third_table"].find({})), 4)
+        self.assertDictEqual(db["third_table"][3], {"a": 4})
+        self.assertDictEqual(db["third_table"][4], {"a": 5})
+        db.dump_tables()
+
+        # clean up
+        db.delete(db.get_deleting_access()[43:53])
+        self.assertFalse(os.path.exists(self.directory))
+
+    def test_recover_interrupted_saving(self):
+        # arrange
+        self._make_synthetic_data()
+        db = DbDriver(db_directory=self.directory, storage_format="npt")
+        db.create_table("npt_table")
+        db["npt_table"].put({"a": 1}, _id=1)
+        db.dump_tables()
+        npt_path = os.path.join(self.directory, "npt_table.npt")
+        # table moved aside before new one was in place
+        os.rename(npt_path, npt_path + ".old")
+        os.makedirs(npt_path + ".new")
+        # files not made by saving tables are not touched
+        for filename in ["notes.new", "backup.old"]:
+            with open(os.path.join(self.directory, filename), "w") as f:
+                f.write("user file")
+        # rows partially appended to csv
+        with open(self.path_1 + ".append", "w") as f:
+            f.write(str(os.path.getsize(self.path_1)))
+        with open(self.path_1, "a") as f:
+            f.write("\n104;3")
+
+        # act
+        db = DbDriver(db_directory=self.directory)
+
+        # assert
+        self.assertListEqual(sorted(os.listdir(self.directory)), [
+            "backup.old", "first_table.csv", "notes.new", "npt_table.npt",
+            "second_table.csv"])
+        with open(self.path_1) as f:
+            self.assertEqual(f.read(), self.csv_content_1)
+        self.assertDictEqual(db["npt_table"].find({}), {1: {"a": 1}})
+
+        # clean up
+        shutil.rmtree(npt_path)
+        for filename in ["notes.new", "backup.old"]:
+            os.remove(os.path.join(self.directory, filename))
+        self._clean_synthetic_data()
+
+    def test_version(self):
+        # arrange
+        self._make_synthetic_data()
+        db = DbDriver(db_directory=self.directory)
+        # act
+        version_1 = db.version()
+        version_2 = DbDriver(self.directory, read_only=True).version()
+        db["first_table"].put({"num": 81, "char": "i"})
+        version_3 = db.version()
+        db.dump_tables()
+        version_4 = db.version()
+        # assert
+        self.assertEqual(len(version_1), 64)
+        self.assertEqual(version_1, version_2)
+        # not saved changes do not count
+        self.assertEqual(version_1, version_3)
+        self.assertNotEqual(version_1, version_4)
+        # clean up
+        db.delete(db.get_deleting_access()[43:53])
+        self.assertFalse(os.path.exists(self.directory))
+
+    def test_preload(self):
+        # arrange
+        self._make_synthetic_data()
+        with self.assertRaises(ValueError):
+            DbDriver(self.directory).preload(executor="cluster")
+
+        for layout in ["rows", "columns"]:
+            for executor in ["process", "thread"]:
+                db = DbDriver(db_directory=self.directory, layout=layout)
+                loaded_table = db["second_table"]
+
+                # act
+                db.preload(workers=2, executor=executor)
+
+                # assert
+                tables = db._DbDriver__tables
+                self.assertIs(tables["second_table"], loaded_table)
+                self.assertIsNotNone(tables["first_table"])
+                self.assertDictEqual(tables["first_table"].find({}), {
+                    101: {'num': 9,  'char': 'a'},
+                    102: {'num': 16, 'char': 'b'},
+                    103: {'num': 25, 'char': 'c'},
+                })
+                self.assertFalse(tables["first_table"]._dirty)
+
+        db = DbDriver(db_directory=self.directory, limit=1)
+        db.preload(["first_table"], workers=1)
+        self.assertIsNone(db._DbDriver__tables["second_table"])
+        self.assertEqual(len(db["first_table"].find({})), 1)
+        with self.assertRaises(KeyError):
+            db.preload(["missing_table"])
+
+        # clean up
+        self._clean_synthetic_data()
+
+    def test_table_projection(self):
+        # arrange
+        self._make_synthetic_data()
+        db = DbDriver(db_directory=self.directory)
+
+        # act
+        table = db.table("first_table", columns=["num"])
+        second_table = db.table("second_table", columns=["char"])
+
+        # assert
+        self.assertIs(db["first_table"], table)
+        self.assertDictEqual(table._Table__data[101].to_dict(), {"num": 9})
+        self.assertListEqual(table.find({}, "num"), [9, 16, 25])
+        self.assertListEqual(table.find({"num": 16}, ["_id"]), [[102]])
+        self.assertEqual(table.find_one({"char": "c"}, "num"), 25)
+        self.assertDictEqual(table._Table__data[101].to_dict(),
+                             {"num": 9, "char": "a"})
+        self.assertListEqual(second_table.find({}, ["_id", "char"]),
+                             [[0, "d"], [1, "e"], [2, "f"]])
+        self.assertDictEqual(second_table[1], {"num": 49, "char": "e"})
+
+        # columns layout and widening by `table` method
+        db = DbDriver(db_directory=self.directory, layout="columns")
+        table = db.table("first_table", columns=[])
+        self.assertListEqual(list(table._ColumnarTable__columns), [])
+        self.assertListEqual(table.find({}, "_id"), [101, 102, 103])
+        db.table("first_table", columns=["char"])
+        self.assertListEqual(list(table._ColumnarTable__columns), ["char"])
+        self.assertDictEqual(table.find({"num": 9}), {
+            101: {'num': 9,  'char': 'a'}})
+
+        # clean up
+        self._clean_synthetic_data()
+
     def test_whole(self):
         """ Main integration test """
         # arrange
@@ -71,11 +71,13 @@ class TestElections(TestCase):
         rescribed_dir = ele.rescribed_dir
         preprocessed_dir = ele.preprocessed_dir
         visualized_dir = ele.visualized_dir
+        cached_dir = ele.cached_dir
         self.assertEqual(raw_dir, RAW_DATA_DIRECTORY)
         self.assertEqual(rescribed_dir, RESCRIBED_DATA_DIRECTORY)
         self.assertEqual(preprocessed_dir, PREPROCESSED_DATA_DIRECTORY)
         self.assertEqual(
             visualized_dir, "./pkwscraper/data/sejm/2015/visualized/")
+        self.assertEqual(cached_dir, "./pkwscraper/data/sejm/2015/cached/")
 
     def test_base_url_path(self):
         ele = Elections("Sejm", "2015")
@@ -0,0 +1,204 @@
+from functools import partial
+import os
+import tempfile
+import time
+from unittest import main, skip, TestCase
+from unittest.mock import call, MagicMock, patch
+
+from pkwscraper.lib.results_cache import function_fingerprint, ResultsCache
+
+
+def helper(x):
+    return x + 1
+
+
+def function_with_helper(db):
+    return helper(db)
+
+
+def function_with_args(db, factor, offset=0):
+    return factor * db + offset
+
+
+class CallableObject:
+    def __init__(self, factor):
+        self.factor = factor
+
+    def __call__(self, db):
+        return self.factor * db
+
+
+class TestFunctionFingerprint(TestCase):
+    """
+    - test same code
+    - test different code
+    - test bound arguments
+    - test closure
+    - test global helper function
+    - test callable object
+    """
+    def test_same_code(self):
+        # arrange
+        def function_1(db):
+            return len(db["gminy"].find({}))
+
+        def function_2(db):
+            return len(db["gminy"].find({}))
+        # act
+        fingerprint_1 = function_fingerprint(function_1)
+        fingerprint_2 = function_fingerprint(function_2)
+        # assert
+        self.assertEqual(len(fingerprint_1), 64)
+        self.assertEqual(fingerprint_1, fingerprint_2)
+        self.assertEqual(fingerprint_1, function_fingerprint(function_1))
+
+    def test_different_code(self):
+        fingerprint_1 = function_fingerprint(lambda db: len(db["gminy"]))
+        fingerprint_2 = function_fingerprint(lambda db: len(db["powiaty"]))
+        fingerprint_3 = function_fingerprint(lambda db: sum(db["gminy"]))
+        self.assertEqual(len({fingerprint_1, fingerprint_2, fingerprint_3}), 3)
+
+    def test_bound_arguments(self):
+        fingerprints = [
+            function_fingerprint(partial(function_with_args, factor=2)),
+            function_fingerprint(partial(function_with_args, factor=3)),
+            function_fingerprint(partial(function_with_args, factor=2,
+                                         offset=1)),
+            function_fingerprint(function_with_args),
+        ]
+        self.assertEqual(len(set(fingerprints)), 4)
+        self.assertEqual(
+            function_fingerprint(partial(function_with_args, factor=2)),
+            fingerprints[0])
+
+    def test_closure(self):
+        def make_function(factor):
+            return lambda db: factor * db
+        self.assertEqual(function_fingerprint(make_function(2)),
+                         function_fingerprint(make_function(2)))
+        self.assertNotEqual(function_fingerprint(make_function(2)),
+                            function_fingerprint(make_function(5)))
+
+    def test_global_helper_function(self):
+        # arrange
+        fingerprint_1 = function_fingerprint(function_with_helper)
+        global helper
+        original_helper = helper
+        helper = lambda x: x + 2
+        # act
+        try:
+            fingerprint_2 = function_fingerprint(function_with_helper)
+        finally:
+            helper = original_helper
+        # assert
+        self.assertNotEqual(fingerprint_1, fingerprint_2)
+        self.assertEqual(fingerprint_1,
+                         function_fingerprint(function_with_helper))
+
+    def test_callable_object(self):
+        self.assertEqual(function_fingerprint(CallableObject(2)),
+                         function_fingerprint(CallableObject(2)))
+        self.assertNotEqual(function_fingerprint(CallableObject(2)),
+                            function_fingerprint(CallableObject(4)))
+
+
+class TestResultsCache(TestCase):
+    """
+    - test get and update
+    - test keys
+    - test eviction
+    - test invalidate
+    - test broken file
+    """
+    def setUp(self):
+        self.temp_directory = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.temp_directory.name, "cached")
+        self.function_1 = lambda db: 1
+        self.function_2 = lambda db: 2
+
+    def tearDown(self):
+        self.temp_directory.cleanup()
+
+    def test_get_and_update(self):
+        # arrange
+        cache = ResultsCache(self.directory)
+        key = ("sejm", 2015, "gminy", "v1")
+        # act
+        values_1 = cache.get(self.function_1, key)
+        cache.update(self.function_1, key, {"a": 1.5, "b": (1, 2)})
+        with patch("pkwscraper.lib.results_cache.os.replace",
+                   wraps=os.replace) as replace:
+            cache.update(self.function_1, key, {"c": None})
+        values_2 = ResultsCache(self.directory).get(self.function_1, key)
+        # assert
+        temp_path = replace.call_args[0][0]
+        self.assertTrue(temp_path.endswith(f".{os.getpid()}.new"))
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+        self.assertDictEqual(values_1, {})
+        self.assertDictEqual(values_2, {"a": 1.5, "b": (1, 2), "c": None})
+        self.assertDictEqual(cache.get(self.function_2, key), {})
+        self.assertGreater(cache.size(), 0)
+
+    def test_keys(self):
+        cache = ResultsCache(self.directory)
+        cache.update(self.function_1, ("gminy", "v1"), {"a": 1})
+        cache.update(self.function_1, ("gminy", "v2"), {"a": 2})
+        self.assertDictEqual(cache.get(self.function_1, ("gminy", "v1")),
+                             {"a": 1})
+        self.assertDictEqual(cache.get(self.function_1, ("gminy", "v2")),
+                             {"a": 2})
+        self.assertDictEqual(cache.get(self.function_1, ("powiaty", "v1")),
+                             {})
+
+    def test_eviction(self):
+        # arrange
+        cache = ResultsCache(self.directory, max_size=None)
+        values = {i: float(i) for i in range(100)}
+        for i in range(3):
+            cache.update(self.function_1, i, values)
+        file_size = cache.size() // 3
+        # make first file the most recently used
+        past = time.time() - 100
+        for filepath in cache._files():
+            os.utime(filepath, (past, past))
+        cache.get(self.function_1, 0)
+        # act
+        cache.max_size = 2 * file_size
+        cache.update(self.function_1, 3, values)
+        # assert
+        self.assertLessEqual(cache.size(), 2 * file_size)
+        self.assertEqual(len(cache.get(self.function_1, 0)), 100)
+        self.assertEqual(len(cache.get(self.function_1, 3)), 100)
+        self.assertDictEqual(cache.get(self.function_1, 1), {})
+        self.assertDictEqual(cache.get(self.function_1, 2), {})
+
+    def test_invalidate(self):
+        # arrange
+        cache = ResultsCache(self.directory)
+        for key in ["x", "y"]:
+            cache.update(self.function_1, key, {"a": 1})
+            cache.update(self.function_2, key, {"a": 2})
+        # act & assert
+        cache.invalidate(self.function_1)
+        self.assertDictEqual(cache.get(self.function_1, "x"), {})
+        self.assertDictEqual(cache.get(self.function_1, "y"), {})
+        self.assertDictEqual(cache.get(self.function_2, "y"), {"a": 2})
+        cache.invalidate()
+        self.assertDictEqual(cache.get(self.function_2, "y"), {})
+        self.assertEqual(cache.size(), 0)
+
+    def test_broken_file(self):
+        # arrange
+        cache = ResultsCache(self.directory)
+        cache.update(self.function_1, "x", {"a": 1})
+        filepath = cache._filepath(self.function_1, "x")
+        with open(filepath, "wb") as f:
+            f.write(b"\x80\x05\x95")
+        # act & assert
+        self.assertDictEqual(cache.get(self.function_1, "x"), {})
+        cache.update(self.function_1, "x", {"b": 2})
+        self.assertDictEqual(cache.get(self.function_1, "x"), {"b": 2})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import os
+import tempfile
+from unittest import main, skip, TestCase
+from unittest.mock import call, MagicMock, patch
+
+from pkwscraper.lib.controller import DbReferences
+from pkwscraper.lib.dbdriver import Table
+from pkwscraper.lib.vote_cube import UnitVotes, VoteCube
+
+
+class TestVoteCube(TestCase):
+    """
+    - test candidate votes
+    - test list votes
+    - test total votes
+    - test unit votes
+    - test roll up
+    - test duplicated polling district
+    - test save and load
+    """
+    def setUp(self):
+        records = {
+            "województwa": {"V1": {}, "V2": {}},
+            "okręgi": {
+                "O1": {"number": 1, "powiat_list": '["P1", "P2"]'},
+                "O2": {"number": 2, "powiat_list": '["P3"]'},
+                "O3": {"number": 3, "powiat_list": '["P4"]'},
+            },
+            "powiaty": {"P1": {"parent": "V1"}, "P2": {"parent": "V1"},
+                        "P3": {"parent": "V2"}, "P4": {"parent": "V2"}},
+            "gminy": {"G1": {"parent": "P2"}, "G2": {"parent": "P1"},
+                      "G3": {"parent": "P1"}, "G4": {"parent": "P3"},
+                      "G5": {"parent": "P4"}},
+            "obwody": {
+                "B1": {"gmina": "G2", "constituency": "O1"},
+                "B2": {"gmina": "G1", "constituency": "O1"},
+                "B3": {"gmina": "G2", "constituency": "O1"},
+                "B4": {"gmina": "G4", "constituency": "O2"},
+                "B5": {"gmina": "G5", "constituency": "O3"},
+                # district split between constituencies
+                "B6": {"gmina": "G4", "constituency": "O1"},
+            },
+            "protokoły": {"R1": {"obwod": "B3"}, "R2": {"obwod": "B1"},
+                          "R3": {"obwod": "B2"}, "R4": {"obwod": "B4"},
+                          "R5": {"obwod": "B5"}},
+            "listy": {"L1": {}, "L2": {}},
+            "kandydaci": {
+                "C1": {"constituency": "O1", "list": "L1"},
+                "C2": {"constituency": "O1", "list": "L2"},
+                "C3": {"constituency": "O1", "list": "L2"},
+                "C4": {"constituency": "O2", "list": "L1"},
+                "C5": {"constituency": "O3", "list": "L2"},
+                "C6": {"constituency": "O3", "list": "L1"},
+            },
+            "mandaty": {"M1": {"candidate": "C2"},
+                        "M2": {"candidate": "C4"}},
+            "wyniki_1": {
+                # only the last record of polling district is used
+                "W6": {"obwod": "B1", "C1": 100, "C2": 100, "C3": 100},
+                "W1": {"obwod": "B1", "C1": 10, "C2": 5, "C3": 1},
+                "W2": {"obwod": "B2", "C1": 7, "C2": 0, "C3": 2},
+                "W3": {"obwod": "B3", "C1": 3, "C2": 20, "C3": 4},
+                "W7": {"obwod": "B6", "C1": 1, "C2": 2, "C3": 0},
+            },
+            "wyniki_2": {"W4": {"obwod": "B4", "C4": 30}},
+            # crossed out candidate has no votes
+            "wyniki_3": {"W5": {"obwod": "B5", "C5": 8, "C6": None}},
+        }
+        tables = {}
+        self.tables = tables
+        for name, table_records in records.items():
+            tables[name] = Table()
+            for _id, record in table_records.items():
+                tables[name].put(record, _id=_id)
+        self.source_db = MagicMock()
+        self.source_db.__getitem__.side_effect = tables.__getitem__
+        self.source_db.table.side_effect = \
+            lambda name, columns=None: tables[name]
+        with patch("builtins.print"):
+            self.db_refs = DbReferences(self.source_db, "gminy")
+        self.vote_cube = VoteCube.from_db(
+            self.source_db, self.db_refs, db_version="v1")
+
+    def tearDown(self):
+        pass
+
+    def test_candidate_votes(self):
+        # act
+        votes_B1 = self.vote_cube.candidate_votes("obwod", "B1")
+        votes_G2 = self.vote_cube.candidate_votes("gminy", "G2")
+        votes_G3 = self.vote_cube.candidate_votes("gmina", "G3")
+        votes_G5 = self.vote_cube.candidate_votes("gminy", "G5")
+        # assert
+        self.assertDictEqual(votes_B1, {"C1": 10, "C2": 5, "C3": 1})
+        self.assertDictEqual(votes_G2, {"C1": 13, "C2": 25, "C3": 5})
+        self.assertDictEqual(votes_G3, {})
+        self.assertDictEqual(votes_G5, {"C5": 8})
+
+    def test_list_votes(self):
+        # act
+        votes_G1 = self.vote_cube.list_votes("gminy", "G1")
+        votes_O3 = self.vote_cube.list_votes("okręgi", "O3")
+        votes_V1 = self.vote_cube.list_votes("voivodship", "V1")
+        votes_V2 = self.vote_cube.list_votes("województwa", "V2")
+        # assert
+        self.assertDictEqual(votes_G1, {"L1": 7, "L2": 2})
+        self.assertDictEqual(votes_O3, {"L2": 8})
+        self.assertDictEqual(votes_V1, {"L1": 21, "L2": 34})
+        self.assertDictEqual(votes_V2, {"L1": 30, "L2": 8})
+
+    def test_total_votes(self):
+        self.assertEqual(self.vote_cube.total_votes("obwody", "B3"), 27)
+        self.assertEqual(self.vote_cube.total_votes("powiaty", "P1"), 43)
+        self.assertEqual(self.vote_cube.total_votes("powiaty", "P2"), 9)
+        self.assertEqual(self.vote_cube.total_votes("okreg", "O1"), 55)
+        self.assertEqual(self.vote_cube.total_votes("gminy", "G3"), 0)
+        with self.assertRaises(KeyError):
+            self.vote_cube.total_votes("gminy", "G9")
+
+    def test_unit_votes(self):
+        # act
+        unit_votes = self.vote_cube.unit_votes("powiaty", "P3")
+        # assert
+        self.assertIsInstance(unit_votes, UnitVotes)
+        self.assertDictEqual(unit_votes.candidates(),
+                             {"C1": 1, "C2": 2, "C3": 0, "C4": 30})
+        self.assertDictEqual(unit_votes.lists(), {"L1": 31, "L2": 2})
+        self.assertEqual(unit_votes.total(), 33)
+
+    def test_roll_up(self):
+        # arrange
+        pairs = [("obwod", "gmina"), ("gmina", "powiat"),
+                 ("obwod", "okreg"), ("okreg", "voivodship")]
+        # act & assert
+        for level, parent_level in pairs:
+            for parent_id in self.db_refs.get_ids(parent_level):
+                expected = {}
+                for _id in self.db_refs.get_relation(
+                        parent_level, level, parent_id):
+                    votes = self.vote_cube.candidate_votes(level, _id)
+                    for candidate_id, value in votes.items():
+                        expected[candidate_id] = \
+                            expected.get(candidate_id, 0) + value
+                result = self.vote_cube.candidate_votes(
+                    parent_level, parent_id)
+                self.assertDictEqual(result, expected)
+
+    def test_duplicated_polling_district(self):
+        # arrange
+        wyniki_ids = self.db_refs.get_wyniki("G2")["wyniki_1"]
+        expected = {}
+        for wyniki_id in wyniki_ids:
+            for candidate in ["C1", "C2", "C3"]:
+                expected[candidate] = expected.get(candidate, 0) + \
+                    self.tables["wyniki_1"][wyniki_id][candidate]
+        # act
+        votes_B1 = self.vote_cube.candidate_votes("obwody", "B1")
+        votes_G2 = self.vote_cube.candidate_votes("gminy", "G2")
+        # assert
+        self.assertListEqual(sorted(wyniki_ids), ["W1", "W3"])
+        self.assertDictEqual(votes_B1, {"C1": 10, "C2": 5, "C3": 1})
+        self.assertDictEqual(votes_G2, expected)
+        self.assertEqual(self.vote_cube.total_votes("okręgi", "O1"), 55)
+
+    def test_save_and_load(self):
+        # arrange
+        temp_directory = tempfile.TemporaryDirectory()
+        filepath = os.path.join(temp_directory.name, "vote_cube.npz")
+        # act
+        self.vote_cube.save(filepath)
+        loaded_cube = VoteCube.load(filepath)
+        files = os.listdir(temp_directory.name)
+        temp_directory.cleanup()
+        # assert
+        self.assertListEqual(files, ["vote_cube.npz"])
+        self.assertEqual(self.vote_cube.db_version, "v1")
+        self.assertEqual(loaded_cube.db_version, "v1")
+        for array in loaded_cube.arrays.values():
+            self.assertNotEqual(array.dtype, object)
+        for level, _id in [("obwody", "B2"), ("gminy", "G2"),
+                           ("powiaty", "P4"), ("okręgi", "O1"),
+                           ("województwa", "V1")]:
+            self.assertDictEqual(loaded_cube.candidate_votes(level, _id),
+                                 self.vote_cube.candidate_votes(level, _id))
+            self.assertDictEqual(loaded_cube.list_votes(level, _id),
+                                 self.vote_cube.list_votes(level, _id))
+            self.assertEqual(loaded_cube.total_votes(level, _id),
+                             self.vote_cube.total_votes(level, _id))
+
+
+if __name__ == "__main__":
+    main()